@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 by frePPLe bv
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""
+Benchmark of the frePPLe export of odoo data.
+
+Runs the complete export on a synthetic dataset and reports for each
+export section the time, the number of SQL queries and data reads, the
+rows read, the size of the XML and the peak python memory.
+
+Usage:
+  python benchmark/bench_export.py -c odoo.conf --generate --scale 10k 100k
+"""
+
+import argparse
+import json
+import logging
+import tracemalloc
+
+import datagen
+
+logger = logging.getLogger(__name__)
+
+
+def run_export(env, company, workers=1):
+    """
+    Runs the export, and returns the statistics of each section.
+    """
+    from odoo.addons.frepple.controllers.outbound import exporter, Odoo_generator
+
+    class benchmark_exporter(exporter):
+        def export_section(self, name, section):
+            # Record the peak memory of every section
+            tracemalloc.reset_peak()
+            mem = tracemalloc.get_traced_memory()[0]
+            yield from super().export_section(name, section)
+            for s in reversed(self.stats):
+                if s["section"] == name:
+                    s["memory"] = tracemalloc.get_traced_memory()[1] - mem
+                    break
+
+    xp = benchmark_exporter(
+        Odoo_generator(env),
+        None,
+        uid=env.uid,
+        database=env.cr.dbname,
+        company=company,
+        mode=1,
+        workers=workers,
+    )
+    tracemalloc.start()
+    try:
+        size = 0
+        for i in xp.run():
+            size += len(i)
+    finally:
+        tracemalloc.stop()
+    env.cr.rollback()
+    return size, xp.stats
+
+
+def report(scale, size, stats):
+    print("\nScale %s: %s characters of XML" % (scale, size))
+    print(
+        "%-24s %9s %8s %6s %9s %11s %12s"
+        % ("section", "time (s)", "queries", "reads", "rows", "size", "memory (kB)")
+    )
+    for s in stats:
+        print(
+            "%-24s %9.3f %8d %6d %9d %11d %12d"
+            % (
+                s["section"],
+                s["duration"],
+                s["queries"],
+                s["calls"],
+                s["rows"],
+                s["size"],
+                s.get("memory", 0) // 1024,
+            )
+        )
+    print(
+        "%-24s %9.3f %8d %6d %9d %11d"
+        % (
+            "total",
+            sum(s["duration"] for s in stats),
+            sum(s["queries"] for s in stats),
+            sum(s["calls"] for s in stats),
+            sum(s["rows"] for s in stats),
+            sum(s["size"] for s in stats),
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the frePPLe export")
+    datagen.add_arguments(parser)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of export threads. The memory figures are only accurate with 1.",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Number of exports at each scale"
+    )
+    parser.add_argument("--json", help="Write the results to this json file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    results = {}
+    for scale in args.scale:
+        database = "%s_%s" % (args.database, scale)
+        with datagen.connect(
+            args,
+            database,
+            counts=datagen.get_counts(args, scale) if args.generate else None,
+        ) as env:
+            for run in range(args.repeat):
+                size, stats = run_export(env, env.company.name, workers=args.workers)
+                report(scale, size, stats)
+                results.setdefault(scale, []).append(stats)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
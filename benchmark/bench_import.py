@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 by frePPLe bv
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""
+Benchmark of the import of a frePPLe plan in odoo.
+
+Generates a synthetic plan file with purchase, distribution, manufacturing
+and work order proposals that reference the records of a benchmark
+database, imports it and reports the throughput, the number of SQL
+statements per record and the peak memory of the process.
+The import is rolled back, unless the --commit argument is passed.
+
+Usage:
+  python benchmark/bench_import.py -c odoo.conf --generate --scale 10k --po 15000
+"""
+
+import argparse
+from datetime import datetime, timedelta
+import io
+import logging
+import random
+import resource
+from time import perf_counter
+from types import SimpleNamespace
+from xml.sax.saxutils import quoteattr
+
+import datagen
+
+logger = logging.getLogger(__name__)
+
+
+class FakeRequest:
+    """
+    The attributes of an odoo http request used by the importer.
+    """
+
+    def __init__(self, env, data, actual_user=None):
+        self.env = env
+        self.uid = env.uid
+        self.httprequest = SimpleNamespace(
+            files={"frePPLe plan": io.BytesIO(data)},
+            form={"actual_user": actual_user} if actual_user else {},
+        )
+
+
+def generate_plan(env, po=0, do=0, mo=0, wo=0, seed=1):
+    """
+    Returns a frePPLe plan file with the requested number of proposals.
+    """
+    rnd = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    fmt = "%Y-%m-%d %H:%M:%S"
+
+    def dates():
+        start = now + timedelta(days=rnd.randint(0, 90), hours=rnd.randint(0, 23))
+        return (
+            start.strftime(fmt),
+            (start + timedelta(days=rnd.randint(1, 10))).strftime(fmt),
+        )
+
+    warehouses = env["stock.warehouse"].search([("company_id", "=", env.company.id)])
+    if not warehouses:
+        raise Exception("No warehouse found")
+    supplierinfo = env["product.supplierinfo"].search(
+        [("partner_id", "!=", False)], limit=1000
+    )
+    boms = env["mrp.bom"].search([("type", "=", "normal")], limit=1000)
+    workorders = env["mrp.workorder"].search(
+        [("state", "in", ["pending", "waiting", "ready"])], limit=max(wo, 1)
+    )
+    if po and not supplierinfo:
+        raise Exception("No supplier info found for purchase orders")
+    if (mo or do) and not boms:
+        raise Exception("No bill of material found for manufacturing orders")
+    if do and len(warehouses) < 2:
+        logger.warning("Distribution orders need 2 warehouses")
+        do = 0
+    if wo and not workorders:
+        logger.warning("No open work orders found")
+        wo = 0
+
+    out = [
+        '<?xml version="1.0" encoding="UTF-8" ?>\n'
+        '<plan xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n'
+        "<operationplans>\n"
+    ]
+    for i in range(po):
+        info = rnd.choice(supplierinfo)
+        product = rnd.choice(info.product_tmpl_id.product_variant_ids)
+        start, end = dates()
+        out.append(
+            '<operationplan ordertype="PO" reference="bench-PO-%s" item=%s item_id="%s,%s" '
+            'supplier=%s location_id="%s" start="%s" end="%s" quantity="%s" status="proposed"/>\n'
+            % (
+                i,
+                quoteattr(product.display_name),
+                product.uom_po_id.id,
+                product.id,
+                quoteattr("%s %s" % (info.partner_id.name, info.partner_id.id)),
+                rnd.choice(warehouses).id,
+                start,
+                end,
+                rnd.randint(1, 1000),
+            )
+        )
+    for i in range(do):
+        product = rnd.choice(boms).product_tmpl_id.product_variant_ids[0]
+        origin, destination = rnd.sample(list(warehouses), 2)
+        start, end = dates()
+        out.append(
+            '<operationplan ordertype="DO" reference="bench-DO-%s" item=%s item_id="%s,%s" '
+            'origin=%s destination=%s start="%s" end="%s" quantity="%s" status="proposed"/>\n'
+            % (
+                i,
+                quoteattr(product.display_name),
+                product.uom_id.id,
+                product.id,
+                quoteattr(origin.code),
+                quoteattr(destination.code),
+                start,
+                end,
+                rnd.randint(1, 100),
+            )
+        )
+    for i in range(mo):
+        bom = rnd.choice(boms)
+        product = bom.product_tmpl_id.product_variant_ids[0]
+        start, end = dates()
+        out.append(
+            '<operationplan ordertype="MO" reference="bench-MO-%s" item=%s item_id="%s,%s" '
+            'operation=%s location_id="%s" start="%s" end="%s" quantity="%s" status="proposed">\n'
+            % (
+                i,
+                quoteattr(product.display_name),
+                product.uom_id.id,
+                product.id,
+                quoteattr("%s %s" % (bom.display_name, bom.id)),
+                rnd.choice(warehouses).id,
+                start,
+                end,
+                rnd.randint(1, 100),
+            )
+        )
+        for op in bom.operation_ids:
+            out.append(
+                '<workorder operation=%s start="%s" end="%s">'
+                '<resource id="%s" name=%s quantity="1"/></workorder>\n'
+                % (
+                    quoteattr("%s - %s" % (op.name, op.id)),
+                    start,
+                    end,
+                    op.workcenter_id.id,
+                    quoteattr(op.workcenter_id.name),
+                )
+            )
+        out.append("</operationplan>\n")
+    for i in range(wo):
+        w = workorders[i % len(workorders)]
+        start, end = dates()
+        out.append(
+            '<operationplan ordertype="WO" reference=%s owner=%s item_id="%s,%s" '
+            'start="%s" end="%s" quantity="%s" status="approved">'
+            '<resource id="%s" name=%s/></operationplan>\n'
+            % (
+                quoteattr(w.display_name),
+                quoteattr(w.production_id.name),
+                w.production_id.product_uom_id.id,
+                w.production_id.product_id.id,
+                start,
+                end,
+                w.production_id.product_qty,
+                w.workcenter_id.id,
+                quoteattr(w.workcenter_id.name),
+            )
+        )
+    out.append("</operationplans>\n</plan>\n")
+    return "".join(out).encode("utf-8")
+
+
+def run_import(env, data, mode=1, actual_user=None):
+    """
+    Imports a plan file, and returns the duration and the number of SQL statements.
+    """
+    from odoo.addons.frepple.controllers.inbound import importer
+
+    queries = env.cr.sql_log_count
+    start = perf_counter()
+    msg = importer(
+        FakeRequest(env, data, actual_user),
+        database=env.cr.dbname,
+        company=env.company,
+        mode=mode,
+    ).run()
+    env.flush_all()
+    return perf_counter() - start, env.cr.sql_log_count - queries, msg
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the frePPLe plan import")
+    datagen.add_arguments(parser)
+    parser.add_argument("--po", type=int, default=1000, help="Purchase orders")
+    parser.add_argument("--do", type=int, default=0, help="Distribution orders")
+    parser.add_argument("--mo", type=int, default=1000, help="Manufacturing orders")
+    parser.add_argument("--wo", type=int, default=0, help="Work order updates")
+    parser.add_argument(
+        "--mode",
+        type=int,
+        choices=[1, 2, 3],
+        default=1,
+        help="1: complete plan, 2: incremental export, 3: next page of an export",
+    )
+    parser.add_argument("--user", help="Login of the user publishing in mode 2")
+    parser.add_argument("--plan", help="Also write the generated plan to this file")
+    parser.add_argument(
+        "--commit",
+        default=False,
+        action="store_true",
+        help="Commit the import instead of rolling it back",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    for scale in args.scale:
+        database = "%s_%s" % (args.database, scale)
+        with datagen.connect(
+            args,
+            database,
+            counts=datagen.get_counts(args, scale) if args.generate else None,
+        ) as env:
+            data = generate_plan(
+                env, po=args.po, do=args.do, mo=args.mo, wo=args.wo, seed=args.seed
+            )
+            if args.plan:
+                with open(args.plan, "wb") as f:
+                    f.write(data)
+            records = data.count(b"<operationplan ")
+            duration, queries, msg = run_import(
+                env, data, mode=args.mode, actual_user=args.user
+            )
+            if args.commit:
+                env.cr.commit()
+            else:
+                env.cr.rollback()
+            print("\nScale %s, mode %s: %s proposals" % (scale, args.mode, records))
+            print(msg)
+            print("Duration:              %.3f s" % duration)
+            print(
+                "Records per second:    %.1f" % (records / duration if duration else 0)
+            )
+            print("SQL statements:        %s" % queries)
+            print("SQL per record:        %.1f" % (queries / records if records else 0))
+            print(
+                "Peak RSS:              %s MB"
+                % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024)
+            )
@@ -0,0 +1,425 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 by frePPLe bv
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""
+Generator of a synthetic, large company dataset in an odoo database.
+
+The dataset is used by the benchmarks of the frePPLe connector. It contains
+products with variants, multi-level bills of material with routings, work
+centers, suppliers, customers, open sales orders, purchase orders and
+manufacturing orders, and inventory with lots.
+
+Only use it on a dedicated test database!
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import logging
+import random
+
+import odoo
+from odoo.tools import config
+
+logger = logging.getLogger(__name__)
+
+# Number of records of each type for the predefined scales.
+# The total number of records (including order lines, stock moves, work
+# orders, ...) is roughly the name of the scale.
+scales = {
+    "10k": {
+        "products": 500,
+        "variants": 2,
+        "bom_depth": 3,
+        "bom_width": 3,
+        "workcenters": 20,
+        "suppliers": 50,
+        "customers": 200,
+        "sales_orders": 500,
+        "purchase_orders": 250,
+        "manufacturing_orders": 250,
+        "quants": 1000,
+        "lots": 250,
+    },
+    "100k": {
+        "products": 5000,
+        "variants": 2,
+        "bom_depth": 4,
+        "bom_width": 4,
+        "workcenters": 100,
+        "suppliers": 250,
+        "customers": 2000,
+        "sales_orders": 5000,
+        "purchase_orders": 2500,
+        "manufacturing_orders": 2500,
+        "quants": 10000,
+        "lots": 2500,
+    },
+    "1M": {
+        "products": 50000,
+        "variants": 2,
+        "bom_depth": 5,
+        "bom_width": 4,
+        "workcenters": 500,
+        "suppliers": 1000,
+        "customers": 20000,
+        "sales_orders": 50000,
+        "purchase_orders": 25000,
+        "manufacturing_orders": 25000,
+        "quants": 100000,
+        "lots": 25000,
+    },
+}
+
+# Number of records created and confirmed in a single call
+batch_size = 500
+
+
+def add_arguments(parser):
+    """
+    Adds the command line arguments of the odoo connection and the dataset.
+    """
+    parser.add_argument("-c", "--config", help="Odoo configuration file")
+    parser.add_argument(
+        "-d", "--database", help="Odoo database prefix", default="frepple_bench"
+    )
+    parser.add_argument(
+        "--scale",
+        nargs="+",
+        choices=sorted(scales),
+        default=["10k"],
+        help="Dataset sizes to run. Each scale uses database <database>_<scale>",
+    )
+    parser.add_argument(
+        "--generate",
+        default=False,
+        action="store_true",
+        help="Create the database and generate the dataset if it doesn't exist",
+    )
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    for key in scales["10k"]:
+        parser.add_argument(
+            "--%s" % key.replace("_", "-"),
+            type=int,
+            dest=key,
+            help="Override the number of %s of the scale" % key.replace("_", " "),
+        )
+
+
+def get_counts(args, scale):
+    counts = dict(scales[scale])
+    for key in counts:
+        if getattr(args, key, None) is not None:
+            counts[key] = getattr(args, key)
+    return counts
+
+
+@contextmanager
+def connect(args, database, counts=None):
+    """
+    Returns an odoo environment on the database.
+    When the database doesn't exist and a dataset size is passed, the database
+    is created with the frepple addon installed and the dataset is generated.
+    """
+    config.parse_config(["-c", args.config] if args.config else [])
+    if not odoo.service.db.exp_db_exist(database):
+        if counts is None:
+            raise Exception("Database %s doesn't exist" % database)
+        logger.info("Creating database %s" % database)
+        odoo.service.db._create_empty_database(database)
+        config["init"] = {"frepple": 1}
+        odoo.modules.registry.Registry.new(database, update_module=True)
+        config["init"] = {}
+        with odoo.registry(database).cursor() as cr:
+            generate(
+                odoo.api.Environment(cr, odoo.SUPERUSER_ID, {}),
+                counts,
+                seed=args.seed,
+            )
+    with odoo.registry(database).cursor() as cr:
+        yield odoo.api.Environment(cr, odoo.SUPERUSER_ID, {})
+
+
+def batches(values):
+    for i in range(0, len(values), batch_size):
+        yield values[i : i + batch_size]
+
+
+def create(env, model, vals_list):
+    """
+    Creates records in batches, and commits after each batch.
+    """
+    recs = env[model]
+    for vals in batches(vals_list):
+        recs |= env[model].create(vals)
+        env.cr.commit()
+    return recs
+
+
+def generate(env, counts, seed=1):
+    """
+    Generates the dataset in the database.
+    """
+    rnd = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    company = env.company
+    warehouse = env["stock.warehouse"].search(
+        [("company_id", "=", company.id)], limit=1
+    )
+    # A second warehouse, as destination of distribution orders
+    env["stock.warehouse"].create(
+        {"name": "Bench distribution center", "code": "BDC", "company_id": company.id}
+    )
+    route_buy = env.ref("purchase_stock.route_warehouse0_buy", False)
+    route_manufacture = env.ref("mrp.route_warehouse0_manufacture", False)
+
+    logger.info("Generating work centers")
+    workcenters = create(
+        env,
+        "mrp.workcenter",
+        [
+            {"name": "Bench work center %05d" % i, "time_efficiency": 100}
+            for i in range(counts["workcenters"])
+        ],
+    )
+
+    logger.info("Generating suppliers and customers")
+    suppliers = create(
+        env,
+        "res.partner",
+        [
+            {"name": "Bench supplier %05d" % i, "supplier_rank": 1}
+            for i in range(counts["suppliers"])
+        ],
+    )
+    customers = create(
+        env,
+        "res.partner",
+        [
+            {"name": "Bench customer %06d" % i, "customer_rank": 1}
+            for i in range(counts["customers"])
+        ],
+    )
+
+    logger.info("Generating products")
+    attribute = env["product.attribute"].create(
+        {
+            "name": "Bench size",
+            "create_variant": "always",
+            "value_ids": [
+                (0, 0, {"name": "Size %s" % i}) for i in range(counts["variants"])
+            ],
+        }
+    )
+    # The products are spread evenly over the levels of the bill of materials.
+    # The products of the last level are purchased, the others are manufactured.
+    depth = max(counts["bom_depth"], 1)
+    levels = [[] for i in range(depth + 1)]
+    templates = []
+    for i in range(counts["products"]):
+        level = i % (depth + 1)
+        route = route_buy if level == depth else route_manufacture
+        templates.append(
+            {
+                "name": "Bench product %06d" % i,
+                "default_code": "BENCH%06d" % i,
+                "type": "product",
+                "sale_ok": level == 0,
+                "purchase_ok": level == depth,
+                "tracking": "lot" if (i // (depth + 1)) % 4 == 0 else "none",
+                "route_ids": [(6, 0, [route.id])] if route else [],
+                "attribute_line_ids": (
+                    [
+                        (
+                            0,
+                            0,
+                            {
+                                "attribute_id": attribute.id,
+                                "value_ids": [(6, 0, attribute.value_ids.ids)],
+                            },
+                        )
+                    ]
+                    if counts["variants"] > 1
+                    else []
+                ),
+            }
+        )
+    templates = create(env, "product.template", templates)
+    for i, tmpl in enumerate(templates):
+        levels[i % (depth + 1)].append(tmpl)
+
+    logger.info("Generating supplier info")
+    create(
+        env,
+        "product.supplierinfo",
+        [
+            {
+                "partner_id": rnd.choice(suppliers).id,
+                "product_tmpl_id": tmpl.id,
+                "min_qty": rnd.choice([0, 10, 100]),
+                "price": rnd.randint(1, 100),
+                "delay": rnd.randint(1, 30),
+            }
+            for tmpl in levels[depth]
+        ],
+    )
+
+    logger.info("Generating bills of material")
+    boms = []
+    for level in range(depth):
+        for tmpl in levels[level]:
+            components = rnd.sample(
+                levels[level + 1], min(counts["bom_width"], len(levels[level + 1]))
+            )
+            boms.append(
+                {
+                    "product_tmpl_id": tmpl.id,
+                    "product_qty": 1,
+                    "type": "normal",
+                    "bom_line_ids": [
+                        (
+                            0,
+                            0,
+                            {
+                                "product_id": rnd.choice(c.product_variant_ids).id,
+                                "product_qty": rnd.randint(1, 5),
+                            },
+                        )
+                        for c in components
+                    ],
+                    "operation_ids": [
+                        (
+                            0,
+                            0,
+                            {
+                                "name": "Bench operation %s" % j,
+                                "workcenter_id": rnd.choice(workcenters).id,
+                                "time_cycle_manual": rnd.randint(1, 120),
+                            },
+                        )
+                        for j in range(rnd.randint(1, 3))
+                    ],
+                }
+            )
+    boms = create(env, "mrp.bom", boms)
+
+    sellable = [p for tmpl in levels[0] for p in tmpl.product_variant_ids]
+    purchased = [p for tmpl in levels[depth] for p in tmpl.product_variant_ids]
+    manufactured = [p for bom in boms for p in bom.product_tmpl_id.product_variant_ids]
+
+    logger.info("Generating sales orders")
+    for vals in batches(
+        [
+            {
+                "partner_id": rnd.choice(customers).id,
+                "warehouse_id": warehouse.id,
+                "commitment_date": now + timedelta(days=rnd.randint(1, 120)),
+                "order_line": [
+                    (
+                        0,
+                        0,
+                        {
+                            "product_id": rnd.choice(sellable).id,
+                            "product_uom_qty": rnd.randint(1, 50),
+                        },
+                    )
+                    for j in range(rnd.randint(1, 5))
+                ],
+            }
+            for i in range(counts["sales_orders"])
+        ]
+    ):
+        env["sale.order"].create(vals).action_confirm()
+        env.cr.commit()
+
+    logger.info("Generating purchase orders")
+    for vals in batches(
+        [
+            {
+                "partner_id": rnd.choice(suppliers).id,
+                "picking_type_id": warehouse.in_type_id.id,
+                "order_line": [
+                    (
+                        0,
+                        0,
+                        {
+                            "product_id": rnd.choice(purchased).id,
+                            "product_qty": rnd.randint(10, 500),
+                            "date_planned": now + timedelta(days=rnd.randint(1, 60)),
+                        },
+                    )
+                    for j in range(rnd.randint(1, 5))
+                ],
+            }
+            for i in range(counts["purchase_orders"])
+        ]
+    ):
+        env["purchase.order"].create(vals).button_confirm()
+        env.cr.commit()
+
+    logger.info("Generating manufacturing orders")
+    for vals in batches(
+        [
+            {
+                "product_id": product.id,
+                "product_qty": rnd.randint(1, 100),
+                "date_start": now + timedelta(days=rnd.randint(0, 60)),
+                "picking_type_id": warehouse.manu_type_id.id,
+            }
+            for product in (
+                rnd.choice(manufactured) for i in range(counts["manufacturing_orders"])
+            )
+        ]
+    ):
+        env["mrp.production"].create(vals).action_confirm()
+        env.cr.commit()
+
+    logger.info("Generating inventory")
+    tracked = [p for p in purchased if p.tracking == "lot"]
+    lots = create(
+        env,
+        "stock.lot",
+        [
+            {
+                "name": "BENCH-LOT-%06d" % i,
+                "product_id": product.id,
+                "company_id": company.id,
+            }
+            for i, product in enumerate(
+                rnd.choice(tracked) for i in range(counts["lots"] if tracked else 0)
+            )
+        ],
+    )
+    quant = env["stock.quant"]
+    untracked = [p for p in purchased if p.tracking == "none"] or purchased
+    for i in range(counts["quants"]):
+        lot = lots[i] if i < len(lots) else None
+        quant._update_available_quantity(
+            lot.product_id if lot else rnd.choice(untracked),
+            warehouse.lot_stock_id,
+            rnd.randint(1, 1000),
+            lot_id=lot,
+        )
+        if i % batch_size == batch_size - 1:
+            env.cr.commit()
+    env.cr.commit()
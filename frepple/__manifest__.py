@@ -24,6 +24,7 @@
         "views/product_supplierinfo_inherit.xml",
         "views/sale_views.xml",
         "views/quote_views.xml",
+        "views/export_stat_views.xml",
     ],
     "test": [],
     "installable": True,
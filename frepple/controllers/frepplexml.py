@@ -23,7 +23,9 @@
 #
 
 import base64
+import gzip
 import hashlib
+from itertools import chain
 import hmac
 import json
 import logging
@@ -32,12 +34,13 @@ import os
 from pathlib import Path
 import time
 import traceback
+import uuid
 from tempfile import NamedTemporaryFile
+import zlib
 from werkzeug.exceptions import MethodNotAllowed, InternalServerError
 from werkzeug.wrappers import Response
 
 
-from odoo import http
 from odoo.addons.frepple.controllers.outbound import exporter, Odoo_generator
 from odoo.addons.frepple.controllers.inbound import importer
 
@@ -142,6 +145,188 @@ class XMLController(odoo.http.Controller):
             req.session.context["lang"] = language
         return uid
 
+    # Size of the chunks sent to the client
+    chunk_size = 65536
+
+    def stream_export(
+        self,
+        database,
+        uid,
+        context,
+        compress,
+        debug_file,
+        session=None,
+        **kwargs,
+    ):
+        """
+        Generator producing the response of an export.
+
+        The data is sent to the client while it is being generated. Because the
+        response is streamed after the request handler finished, the export uses
+        its own database cursor.
+        Errors raised before the first chunk is generated are propagated to the
+        caller. Later errors end the response with an error message.
+        When the export is a page of an export session, the page is registered
+        as done after all data is generated.
+        """
+        with odoo.registry(database).cursor() as cr:
+            xp = exporter(
+                Odoo_generator(odoo.api.Environment(cr, uid, context)),
+                None,
+                uid=uid,
+                database=database,
+                **kwargs,
+            )
+            compressor = (
+                zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+            )
+            tmpfile = None
+            if debug_file:
+                # Keep a copy of the data for debugging purposes
+                xml_folder = os.path.join(str(Path.home()), "logs", "frepple")
+                os.makedirs(xml_folder, exist_ok=True)
+                tmpfile = NamedTemporaryFile(
+                    mode="w+t",
+                    delete=False,
+                    dir=xml_folder,
+                    prefix="odoo_%s_%s_" % (database, kwargs.get("company", None)),
+                    suffix=".xml",
+                )
+            # Set when the first chunk is sent to the client
+            started = False
+            try:
+                for chunk in self.chunked(xp.run()):
+                    if tmpfile:
+                        tmpfile.write(chunk)
+                    chunk = chunk.encode("utf-8")
+                    started = True
+                    yield compressor.compress(chunk) if compressor else chunk
+            except Exception as e:
+                if not started:
+                    # Nothing is sent yet. The caller still returns an error status.
+                    raise
+                # It's too late to send an error status. We end with an error
+                # message that leaves the XML document incomplete.
+                logger.exception("Error generating frePPLe XML data")
+                cr.rollback()
+                chunk = (
+                    "\n<!-- Error generating frePPLe XML data: %s -->\n"
+                    % str(e).replace("--", "- -")
+                ).encode("utf-8")
+                yield compressor.compress(chunk) if compressor else chunk
+            else:
+                if session:
+                    xp.generator.env["frepple.export.session"].sudo().browse(
+                        session
+                    ).mark_done(kwargs["pages"])
+            finally:
+                if tmpfile:
+                    tmpfile.close()
+            if compressor:
+                yield compressor.flush()
+
+    def export_session(
+        self, database, uid, context, company_id, session, page, **kwargs
+    ):
+        """
+        Handles the requests of a paged export.
+
+        With session "new" a session is started for an export with the given
+        arguments. With the token of a session and no page the status of the
+        session is returned. In both cases the response is a json object with
+        the session token, the list of pages, and the indices of the pages that
+        are done and remaining.
+        With a page index the arguments of the session are returned, to be used
+        to export that page.
+        """
+        with odoo.registry(database).cursor() as cr:
+            env = odoo.api.Environment(cr, uid, context)
+            sessions = env["frepple.export.session"].sudo()
+            if session == "new":
+                if page is not None:
+                    return Response("A new export session has no pages yet", 400)
+                # The pages of a session are consistent complete sections.
+                kwargs.pop("incremental", None)
+                kwargs.pop("sync_token", None)
+                kwargs.pop("sync_ack", None)
+                pages = exporter(
+                    Odoo_generator(env), None, uid=uid, database=database, **kwargs
+                ).get_pages(split=True)
+                rec = sessions.start(uid, company_id, pages, kwargs)
+            else:
+                rec = sessions.find(uid, session)
+                if not rec:
+                    return Response("Unknown export session", 404)
+            if page is None:
+                return self.json_response(rec.get_status())
+            pages = json.loads(rec.pages)
+            try:
+                page = int(page)
+                if page < 0:
+                    raise ValueError
+                page = pages[page]
+            except (ValueError, IndexError):
+                return Response("Invalid page argument", 400)
+            return dict(rec.get_arguments(), pages=[page], session=rec.id)
+
+    def json_response(self, data, status=200):
+        return Response(
+            json.dumps(data),
+            status,
+            mimetype="application/json",
+            headers=[("Cache-Control", "no-cache, no-store, must-revalidate")],
+        )
+
+    def export_job(
+        self, database, uid, context, company_id, job, download, compress, **kwargs
+    ):
+        """
+        Handles the requests of a background export.
+
+        With job "new" the export is queued, and the status of the new job is
+        returned. With the token of a job the status of the job is returned, or
+        its result when the download argument is passed.
+        """
+        with odoo.registry(database).cursor() as cr:
+            env = odoo.api.Environment(cr, uid, context)
+            jobs = env["frepple.export.job"].sudo()
+            if job == "new":
+                return self.json_response(
+                    jobs.queue(uid, company_id, kwargs).get_status(), 202
+                )
+            rec = jobs.find(uid, job)
+            if not rec:
+                return Response("Unknown export job", 404)
+            if not download:
+                return self.json_response(rec.get_status())
+            if rec.state != "done" or not rec.attachment_id:
+                return Response("Export job has no result", 409)
+            data = rec.attachment_id.raw
+            res = Response(
+                data if compress else gzip.decompress(data),
+                mimetype="application/xml;charset=utf8",
+            )
+            if compress:
+                res.headers["Content-Encoding"] = "gzip"
+            res.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+            return res
+
+    def chunked(self, data):
+        """
+        Groups the small strings generated by the exporter into larger chunks.
+        """
+        buffer = []
+        size = 0
+        for i in data:
+            buffer.append(i)
+            size += len(i)
+            if size >= self.chunk_size:
+                yield "".join(buffer)
+                buffer = []
+                size = 0
+        if buffer:
+            yield "".join(buffer)
+
     @odoo.http.route(
         "/frepple/xml", type="http", auth="none", methods=["POST", "GET"], csrf=False
     )
@@ -203,47 +388,85 @@ class XMLController(odoo.http.Controller):
         if req.httprequest.method == "GET":
             # Generate data
             try:
-                xp = exporter(
-                    Odoo_generator(req.env),
-                    req,
-                    uid=uid,
-                    database=database,
-                    company=company_name,
-                    mode=int(kwargs.get("mode", 1)),
-                    timezone=kwargs.get("timezone", None),
-                    singlecompany=kwargs.get("singlecompany", "false").lower()
+                compress = "gzip" in req.httprequest.headers.get("Accept-Encoding", "")
+                debug_file = str(
+                    req.env["ir.config_parameter"]
+                    .sudo()
+                    .get_param("frepple.export_debug_file", False)
+                ).lower() in ("1", "true")
+                try:
+                    workers = int(
+                        req.env["ir.config_parameter"]
+                        .sudo()
+                        .get_param("frepple.export_workers", 1)
+                    )
+                except ValueError:
+                    workers = 1
+                export_args = {
+                    "company": company_name,
+                    "mode": int(kwargs.get("mode", 1)),
+                    "timezone": kwargs.get("timezone", None),
+                    "singlecompany": kwargs.get("singlecompany", "false").lower()
                     == "true",
-                    version=version,
-                    delta=float(kwargs.get("delta", 999)),
-                    language=language,
-                    apps=apps,
+                    "version": version,
+                    "delta": float(kwargs.get("delta", 999)),
+                    "language": language,
+                    "apps": apps,
+                    "incremental": kwargs.get("incremental", "false").lower() == "true",
+                }
+                if export_args["incremental"]:
+                    # The client confirms it loaded an incremental export by
+                    # passing its token as the ack argument of the next request
+                    export_args["sync_token"] = uuid.uuid4().hex
+                    export_args["sync_ack"] = kwargs.get("ack", None)
+                if kwargs.get("async", "0").lower() in ("1", "true") or kwargs.get(
+                    "job", None
+                ):
+                    # Background export
+                    return self.export_job(
+                        database,
+                        uid,
+                        dict(req.env.context),
+                        company.id if company else None,
+                        kwargs.get("job", "new"),
+                        kwargs.get("download", "0").lower() in ("1", "true"),
+                        compress,
+                        **export_args,
+                    )
+                if kwargs.get("session", None):
+                    # Paged export
+                    export_args = self.export_session(
+                        database,
+                        uid,
+                        dict(req.env.context),
+                        company.id if company else None,
+                        kwargs["session"],
+                        kwargs.get("page", None),
+                        **export_args,
+                    )
+                    if isinstance(export_args, Response):
+                        return export_args
+                data = self.stream_export(
+                    database,
+                    uid,
+                    dict(req.env.context),
+                    compress,
+                    debug_file,
+                    workers=workers,
+                    **export_args,
                 )
-                # last empty double quote is to let python understand frepple is a folder.
-                xml_folder = os.path.join(str(Path.home()), "logs", "frepple", "")
-                os.makedirs(os.path.dirname(xml_folder), exist_ok=True)
-
-                # delete any old xml file in that folder
-                for file_name in os.listdir(xml_folder):
-                    # construct full file path
-                    file = xml_folder + file_name
-                    if os.path.isfile(file):
-                        os.remove(file)
-
-                with NamedTemporaryFile(
-                    mode="w+t", delete=False, dir=xml_folder
-                ) as tmpfile:
-                    for i in xp.run():
-                        tmpfile.write(i)
-                    filename = tmpfile.name
-
-                res = http.Stream(
-                    type="path",
-                    path=filename,
-                    download_name="odoo_data_for_frepple",
-                ).get_response(
+                # Generate the first chunk already, such that errors during the
+                # initialization are still reported with a proper status code
+                first = next(data)
+                res = Response(
+                    chain([first], data),
                     mimetype="application/xml;charset=utf8",
-                    as_attachment=False,
+                    direct_passthrough=True,
                 )
+                if compress:
+                    res.headers["Content-Encoding"] = "gzip"
+                if export_args.get("sync_token", None):
+                    res.headers["X-frePPLe-Sync-Token"] = export_args["sync_token"]
                 res.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
                 res.headers["Pragma"] = "no-cache"
                 res.headers["Expires"] = "0"
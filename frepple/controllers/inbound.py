@@ -24,6 +24,7 @@
 
 import odoo
 import logging
+import traceback
 from xml.etree.cElementTree import iterparse
 from datetime import datetime
 from pytz import timezone, UTC
@@ -71,22 +72,502 @@ class importer(object):
         else:
             self.actual_user = None
 
+    def create_purchase_orders(self, proposals, env, hasRequisition, msg):
+        """
+        Creates purchase orders for the proposals of the plan, using bulk
+        reads and creates.
+
+        All proposals for the same supplier are grouped into one purchase order.
+        In incremental exports (mode 2) the proposals for the same product are
+        also aggregated into one purchase order line, with the sum of the
+        quantities and the earliest date.
+
+        The purchase orders are created in a single batch. When that fails, they
+        are created again for every supplier separately.
+        Returns the number of processed proposals.
+        """
+        proc_order = env["purchase.order"]
+        proc_orderline = env["purchase.order.line"]
+
+        # Group the proposals by supplier, and aggregate them in mode 2
+        suppliers = {}
+        for rec in proposals:
+            sup = suppliers.setdefault(
+                rec["supplier_id"],
+                {
+                    "lines": {},
+                    "remark": rec["remark"],
+                    "location_id": rec["location_id"],
+                    "min_planned": rec["date_planned"],
+                    "min_ordered": rec["date_ordered"],
+                    "count": 0,
+                },
+            )
+            sup["count"] += 1
+            if rec["date_planned"] and (
+                not sup["min_planned"] or rec["date_planned"] < sup["min_planned"]
+            ):
+                sup["min_planned"] = rec["date_planned"]
+            if rec["date_ordered"] and (
+                not sup["min_ordered"] or rec["date_ordered"] < sup["min_ordered"]
+            ):
+                sup["min_ordered"] = rec["date_ordered"]
+            key = rec["item_id"] if self.mode == 2 else len(sup["lines"])
+            line = sup["lines"].get(key, None)
+            if line:
+                line["quantity"] += rec["quantity"]
+                if rec["date_planned"] and (
+                    not line["date_planned"]
+                    or rec["date_planned"] < line["date_planned"]
+                ):
+                    line["date_planned"] = rec["date_planned"]
+            else:
+                sup["lines"][key] = dict(rec)
+
+        # Prefetch products, units of measure, partners and supplier info
+        products = {
+            i.id: i
+            for i in env["product.product"].browse(
+                list({rec["item_id"] for rec in proposals})
+            )
+        }
+        uoms = {
+            i.id: i
+            for i in env["uom.uom"].browse(list({rec["uom_id"] for rec in proposals}))
+        }
+        partners = {i.id: i for i in env["res.partner"].browse(list(suppliers))}
+        supplierinfo = {}
+        for i in env["product.supplierinfo"].search(
+            [
+                ("partner_id", "in", list(suppliers)),
+                (
+                    "product_tmpl_id",
+                    "in",
+                    list({i.product_tmpl_id.id for i in products.values()}),
+                ),
+            ],
+            order="min_qty desc",
+        ):
+            supplierinfo.setdefault((i.partner_id.id, i.product_tmpl_id.id), []).append(
+                i
+            )
+
+        # Prefetch the receipt operation types of the warehouses
+        picking_types = {}
+        for i in env["stock.picking.type"].search(
+            [
+                ("code", "=", "incoming"),
+                (
+                    "warehouse_id",
+                    "in",
+                    [
+                        sup["location_id"]
+                        for sup in suppliers.values()
+                        if sup["location_id"]
+                    ]
+                    + [False],
+                ),
+            ]
+        ):
+            picking_types.setdefault(i.warehouse_id.id, i.id)
+
+        # Prefetch the blanket orders of the products and suppliers
+        requisition_dic = {}
+        if hasRequisition:
+            for i in env["purchase.requisition.line"].search(
+                [
+                    "&",
+                    "&",
+                    "&",
+                    "&",
+                    "|",
+                    ("requisition_id.date_end", "=", False),
+                    ("requisition_id.date_end", ">=", datetime.now()),
+                    ("requisition_id.type_id.name", "=", "Blanket Order"),
+                    ("requisition_id.state", "=", "ongoing"),
+                    ("product_id", "in", list(products)),
+                    ("requisition_id.vendor_id", "in", list(suppliers)),
+                ]
+            ):
+                requisition_dic.setdefault(
+                    (i.product_id.id, i.requisition_id.vendor_id.id), i.requisition_id
+                )
+
+        def create(items):
+            # Create the purchase orders
+            po_list = []
+            for supplier_id, sup in items:
+                po_args = {
+                    "company_id": self.company.id,
+                    "partner_id": supplier_id,
+                    "origin": sup["remark"],
+                    "payment_term_id": partners[
+                        supplier_id
+                    ].property_supplier_payment_term_id.id,
+                }
+                picking_type_id = picking_types.get(
+                    sup["location_id"], picking_types.get(False, None)
+                )
+                if picking_type_id:
+                    po_args["picking_type_id"] = picking_type_id
+                # Is there a blanket order for a product of this supplier ?
+                for line in sup["lines"].values():
+                    if (line["item_id"], supplier_id) in requisition_dic:
+                        po_args["requisition_id"] = requisition_dic[
+                            (line["item_id"], supplier_id)
+                        ].id
+                        break
+                po_list.append(po_args)
+            pos = proc_order.create(po_list)
+
+            # Create the purchase order lines, letting odoo compute all the fields
+            # (taxes, name, description...)
+            line_list = []
+            for po, (supplier_id, sup) in zip(pos, items):
+                for line in sup["lines"].values():
+                    product = products[line["item_id"]]
+                    supplier = proc_orderline.env["product.supplierinfo"]
+                    for i in supplierinfo.get(
+                        (po.partner_id.id, product.product_tmpl_id.id), []
+                    ):
+                        if i.min_qty <= line["quantity"]:
+                            supplier = i
+                            break
+                    d = proc_orderline._prepare_purchase_order_line(
+                        product,
+                        line["quantity"],
+                        uoms[line["uom_id"]],
+                        self.company,
+                        supplier,
+                        po,
+                    )
+                    d["date_planned"] = line["date_planned"]
+                    line_list.append(d)
+            proc_orderline.create(line_list)
+
+            # Update PO RFQ order_deadline and receipt date
+            for po, (supplier_id, sup) in zip(pos, items):
+                if sup["min_planned"]:
+                    po.date_planned = sup["min_planned"]
+                if sup["min_ordered"]:
+                    po.date_order = sup["min_ordered"]
+
+        try:
+            with env.cr.savepoint():
+                create(list(suppliers.items()))
+            return len(proposals)
+        except Exception as e:
+            logger.info(traceback.format_exc())
+            logger.error("Exception %s" % e)
+
+        # Create the purchase orders of every supplier separately, such that
+        # an error only loses the proposals of that supplier
+        count = 0
+        for supplier_id, sup in suppliers.items():
+            try:
+                with env.cr.savepoint():
+                    create([(supplier_id, sup)])
+                count += sup["count"]
+            except Exception as e:
+                logger.info(traceback.format_exc())
+                logger.error("Exception %s" % e)
+                msg.append(str(e))
+        return count
+
+    def update_manufacturing_orders(self, mo_proposals, wo_updates, env, context, msg):
+        """
+        Creates and updates the manufacturing orders and work orders of the
+        plan, using bulk reads and creates.
+
+        New manufacturing orders are created in a batch per operation type.
+        When a batch fails, its manufacturing orders are created one by one.
+        Existing manufacturing orders and work orders are read with a single
+        search by name.
+        Returns the number of created and updated manufacturing orders.
+        """
+        mfg_order = env["mrp.production"]
+        mfg_workorder = env["mrp.workorder"]
+        mfg_workorder_secondary = env["mrp.workorder.secondary.workcenter"]
+        change_product_qty = env["change.production.qty"]
+
+        # Mapping between frepple-generated MO reference and their odoo id.
+        # This mapping is later used when importing WO.
+        mo_references = {}
+
+        # Cache the manufacturing operation type of each warehouse
+        picking_types = {}
+        for i in env["stock.picking.type"].search(
+            [
+                ("code", "=", "mrp_operation"),
+                ("company_id", "=", self.company.id),
+                (
+                    "warehouse_id",
+                    "in",
+                    list({rec["warehouse"] for rec in mo_proposals}),
+                ),
+            ]
+        ):
+            picking_types.setdefault(i.warehouse_id.id, i.id)
+
+        def getContext(warehouse):
+            # update the context with the default picking type
+            # to set correct src/dest locations
+            # Also do not create secondary work center records
+            return dict(
+                context,
+                default_picking_type_id=picking_types.get(warehouse, False),
+                ignore_secondary_workcenters=True,
+            )
+
+        # Prefetch all work centers of the plan
+        wc_ids = {
+            res["id"]
+            for rec in mo_proposals
+            for wo in rec["workorders"]
+            for res in wo.get("workcenters", [])
+        }
+        for rec in wo_updates:
+            for res_id in rec["resources"]:
+                try:
+                    wc_ids.add(int(res_id))
+                except Exception:
+                    pass
+        workcenters = {
+            i.id: i for i in env["mrp.workcenter"].browse(list(wc_ids)).exists()
+        }
+
+        # Create the new manufacturing orders
+        proposed = {}
+        for rec in mo_proposals:
+            if rec["status"] == "proposed":
+                proposed.setdefault(
+                    picking_types.get(rec["warehouse"], False), []
+                ).append(rec)
+
+        def create(picking_id, recs):
+            with env.cr.savepoint():
+                mos = mfg_order.with_context(getContext(recs[0]["warehouse"])).create(
+                    [
+                        {
+                            "product_qty": rec["quantity"],
+                            "date_start": rec["start"],
+                            "date_finished": rec["end"],
+                            "product_id": rec["item_id"],
+                            "company_id": self.company.id,
+                            "product_uom_id": rec["uom_id"],
+                            "picking_type_id": picking_id,
+                            "bom_id": rec["bom_id"],
+                            "qty_producing": 0.00,
+                            # TODO no place to store the criticality
+                            # elem.get('criticality'),
+                            "origin": rec["remark"],
+                        }
+                        for rec in recs
+                    ]
+                )
+                mos._create_update_move_finished()
+                # mos.action_confirm()  # confirm MO
+                # mos._plan_workorders() # plan MO
+                # mos.action_assign() # reserve material
+            for mo, rec in zip(mos, recs):
+                mo_references[rec["reference"]] = mo
+                rec["mo"] = mo
+
+        for picking_id, recs in proposed.items():
+            try:
+                create(picking_id, recs)
+                continue
+            except Exception as e:
+                logger.info(traceback.format_exc())
+                logger.error("Exception %s" % e)
+            # Create the manufacturing orders one by one, such that an error
+            # only loses the failing one
+            for rec in recs:
+                try:
+                    create(picking_id, [rec])
+                except Exception as e:
+                    logger.info(traceback.format_exc())
+                    logger.error("Exception %s" % e)
+                    msg.append(str(e))
+
+        # Update the existing manufacturing orders
+        updates = [rec for rec in mo_proposals if rec["status"] != "proposed"]
+        existing = {}
+        if updates:
+            for mo in mfg_order.search(
+                [("name", "in", [rec["reference"] for rec in updates])]
+            ):
+                existing.setdefault(mo.name, mo)
+        for rec in updates:
+            mo = existing.get(rec["reference"], None)
+            if not mo:
+                continue
+            try:
+                mo = mo.with_context(getContext(rec["warehouse"]))
+                new_qty = float(rec["quantity"])
+                if mo.product_qty != new_qty:
+                    cpq = change_product_qty.create(
+                        {
+                            "mo_id": mo.id,
+                            "product_qty": new_qty,
+                        }
+                    )
+                    cpq.change_prod_qty()
+                mo.write(
+                    {
+                        "date_start": rec["start"],
+                        "date_finished": rec["end"],
+                        "origin": rec["remark"],
+                    }
+                )
+                mo_references[rec["reference"]] = mo
+                rec["mo"] = mo
+            except Exception as e:
+                logger.info(traceback.format_exc())
+                logger.error("Exception %s" % e)
+                msg.append(str(e))
+
+        # Process the workorder information we received
+        for rec in mo_proposals:
+            if not rec["workorders"] or "mo" not in rec:
+                continue
+            create = rec["status"] == "proposed"
+            try:
+                for wo in rec["mo"].workorder_ids:
+                    for wo_rec in rec["workorders"]:
+                        if (create and wo_rec["id"] == wo.operation_id.id) or (
+                            not create and wo_rec["id"] == wo.id
+                        ):
+                            # By default odoo populates the scheduled start date field only when you confirm and plan
+                            # the manufacturing order.
+                            # Here we are already updating it earlier
+                            if "start" in wo_rec:
+                                wo.date_start = wo_rec["start"]
+                                if not create:
+                                    wo.write({"date_start": wo.date_start})
+                            if "end" in wo_rec:
+                                wo.date_finished = wo_rec["end"]
+                                if not create:
+                                    wo.write({"date_finished": wo.date_finished})
+
+                            for res in wo_rec.get("workcenters", []):
+                                wc = workcenters.get(res["id"], None)
+                                if not wc:
+                                    continue
+                                if create:
+                                    if res["id"] != wo.workcenter_id.id:
+                                        if wo.workcenter_id == wc.owner:
+                                            wo.workcenter_id = res["id"]
+                                        else:
+                                            mfg_workorder_secondary.create(
+                                                {
+                                                    "workcenter_id": res["id"],
+                                                    "workorder_id": wo.id,
+                                                    "duration": res["quantity"]
+                                                    * wo.duration_expected,
+                                                }
+                                            )
+                                else:
+                                    if not wo.operation_id or (  # No operation defined
+                                        wo.operation_id.workcenter_id
+                                        == wc  # Same workcenter
+                                        or (
+                                            # New member of a pool
+                                            wo.operation_id.workcenter_id
+                                            and wo.operation_id.workcenter_id
+                                            == wc.owner
+                                        )
+                                    ):
+                                        # Change primary work center
+                                        wo.write({"workcenter_id": wc.id})
+                                    else:
+                                        # Check assigned secondary resources
+                                        for sec in wo.secondary_workcenters:
+                                            if sec.workcenter_id.owner == wc:
+                                                break
+                                            if sec.workcenter_id.owner == wc.owner:
+                                                # Change secondary work center
+                                                sec.write({"workcenter_id": wc.id})
+                                                break
+            except Exception as e:
+                logger.info(traceback.format_exc())
+                logger.error("Exception %s" % e)
+                msg.append(str(e))
+
+        # Prefetch the existing manufacturing orders and open work orders of
+        # the work order updates
+        owners = {
+            rec["owner"] for rec in wo_updates if rec["owner"] not in mo_references
+        }
+        if owners:
+            for mo in mfg_order.search([("name", "in", list(owners))]):
+                mo_references.setdefault(mo.name, mo)
+        workorders = {}
+        owner_ids = [
+            mo_references[rec["owner"]].id
+            for rec in wo_updates
+            if rec["owner"] in mo_references
+        ]
+        if owner_ids:
+            for wo in mfg_workorder.search(
+                [
+                    ("production_id", "in", owner_ids),
+                    ("state", "in", ["pending", "waiting", "ready"]),
+                ]
+            ):
+                # Can't filter on the computed display_name field in the search...
+                workorders.setdefault((wo.production_id.id, wo.display_name), wo)
+
+        # Update the work orders
+        for rec in wo_updates:
+            mo = mo_references.get(rec["owner"], None)
+            wo = workorders.get((mo.id, rec["reference"]), None) if mo else None
+            if not wo:
+                continue
+            try:
+                data = {
+                    "date_start": rec["start"],
+                    "date_finished": rec["end"],
+                }
+                for res_id in rec["resources"]:
+                    try:
+                        res = workcenters.get(int(res_id), None)
+                    except Exception:
+                        res = None
+                    if not res:
+                        continue
+                    if not wo.operation_id or (  # No operation defined
+                        wo.operation_id.workcenter_id == res  # Same workcenter
+                        or (
+                            # New member of a pool
+                            wo.operation_id.workcenter_id
+                            and wo.operation_id.workcenter_id == res.owner
+                        )
+                    ):
+                        # Change primary work center
+                        data["workcenter_id"] = res.id
+                    else:
+                        # Check assigned secondary resources
+                        for sec in wo.secondary_workcenters:
+                            if sec.workcenter_id.owner == res:
+                                break
+                            if sec.workcenter_id.owner == res.owner:
+                                # Change secondary work center
+                                sec.write({"workcenter_id": res.id})
+                                break
+                wo.write(data)
+            except Exception as e:
+                logger.info(traceback.format_exc())
+                logger.error("Exception %s" % e)
+                msg.append(str(e))
+        return len([rec for rec in mo_proposals if "mo" in rec])
+
     def run(self):
         msg = []
         if self.actual_user:
-            product_product = self.env["product.product"].with_user(self.actual_user)
-            product_supplierinfo = self.env["product.supplierinfo"].with_user(
-                self.actual_user
-            )
-            uom_uom = self.env["uom.uom"].with_user(self.actual_user)
             proc_order = self.env["purchase.order"].with_user(self.actual_user)
             proc_orderline = self.env["purchase.order.line"].with_user(self.actual_user)
             mfg_order = self.env["mrp.production"].with_user(self.actual_user)
-            mfg_workorder = self.env["mrp.workorder"].with_user(self.actual_user)
-            mfg_workcenter = self.env["mrp.workcenter"].with_user(self.actual_user)
-            mfg_workorder_secondary = self.env[
-                "mrp.workorder.secondary.workcenter"
-            ].with_user(self.actual_user)
             stck_picking_type = self.env["stock.picking.type"].with_user(
                 self.actual_user
             )
@@ -94,41 +575,16 @@ class importer(object):
             stck_move = self.env["stock.move"].with_user(self.actual_user)
             stck_warehouse = self.env["stock.warehouse"].with_user(self.actual_user)
             stck_location = self.env["stock.location"].with_user(self.actual_user)
-            change_product_qty = self.env["change.production.qty"].with_user(
-                self.actual_user
-            )
-            hasRequisition = True
-            try:
-                purchase_requisition = self.env["purchase.requisition"].with_user(
-                    self.actual_user
-                )
-                purchase_requisition_line = self.env[
-                    "purchase.requisition.line"
-                ].with_user(self.actual_user)
-            except:
-                hasRequisition = False
         else:
-            product_product = self.env["product.product"]
-            product_supplierinfo = self.env["product.supplierinfo"]
-            uom_uom = self.env["uom.uom"]
             proc_order = self.env["purchase.order"]
             proc_orderline = self.env["purchase.order.line"]
             mfg_order = self.env["mrp.production"]
-            mfg_workorder = self.env["mrp.workorder"]
-            mfg_workcenter = self.env["mrp.workcenter"]
-            mfg_workorder_secondary = self.env["mrp.workorder.secondary.workcenter"]
             stck_picking_type = self.env["stock.picking.type"]
             stck_picking = self.env["stock.picking"]
             stck_move = self.env["stock.move"]
             stck_warehouse = self.env["stock.warehouse"]
             stck_location = self.env["stock.location"]
-            change_product_qty = self.env["change.production.qty"]
-            hasRequisition = True
-            try:
-                purchase_requisition = self.env["purchase.requisition"]
-                purchase_requisition_line = self.env["purchase.requisition.line"]
-            except:
-                hasRequisition = False
+        hasRequisition = "purchase.requisition" in self.env
         if self.mode == 1:
             # Cancel previous draft purchase quotations
             m = self.env["purchase.order"]
@@ -150,48 +606,16 @@ class importer(object):
             recs.unlink()
             msg.append("Removed %s old draft manufacturing orders" % len(recs))
 
-            # read all the blanket orders
-            if hasRequisition:
-                pr_ids = [
-                    i
-                    for i in purchase_requisition.search(
-                        [
-                            "&",
-                            "&",
-                            "|",
-                            ("date_end", "=", False),
-                            ("date_end", ">=", datetime.now()),
-                            ("type_id.name", "=", "Blanket Order"),
-                            ("state", "=", "ongoing"),
-                        ]
-                    )
-                ]
-                requisition_dic = {
-                    (i.product_id.id, i.requisition_id.vendor_id.id): i.requisition_id
-                    for i in purchase_requisition_line.search(
-                        [
-                            ("requisition_id", "in", [j.id for j in pr_ids]),
-                        ]
-                    )
-                }
-
         # Parsing the XML data file
         countproc = 0
         countmfg = 0
 
-        # dictionary that stores as key the supplier id and the associated po id
-        # this dict is used to aggregate the exported POs for a same supplier
-        # into one PO in odoo with multiple lines
-        supplier_reference = {}
+        # New purchase orders, created after parsing the file
+        po_proposals = []
 
-        # dictionary that stores as key a tuple (product id, supplier id)
-        # and as value a poline odoo object
-        # this dict is used to aggregate POs for the same product supplier
-        # into one PO with sum of quantities and min date
-        product_supplier_dict = {}
-
-        # Mapping between frepple-generated MO reference and their odoo id.
-        mo_references = {}
+        # Manufacturing orders and work orders, updated after parsing the file
+        mo_proposals = []
+        wo_updates = []
         wo_data = []
 
         # Workcenters of a workorder to update
@@ -320,165 +744,26 @@ class importer(object):
                                 )
                             continue
 
-                        # Create purchase order
+                        # New purchase orders are created in bulk after parsing the file
                         remark = elem.get("remark", None)
-                        if remark:
-                            remark = "frePPLe - %s" % remark
-                        else:
-                            remark = "frePPLe"
-                        if supplier_id not in supplier_reference:
-                            po_args = {
-                                "company_id": self.company.id,
-                                "partner_id": supplier_id,
-                                "origin": remark,
-                            }
-                            try:
-                                picking_type_id = stck_picking_type.search(
-                                    [
-                                        ("code", "=", "incoming"),
-                                        (
-                                            "warehouse_id",
-                                            "=",
-                                            int(elem.get("location_id")),
-                                        ),
-                                    ],
-                                    limit=1,
-                                )[:1]
-                                if not picking_type_id:
-                                    picking_type_id = stck_picking_type.search(
-                                        [
-                                            ("code", "=", "incoming"),
-                                            ("warehouse_id", "=", False),
-                                        ],
-                                        limit=1,
-                                    )[:1]
-                                if picking_type_id:
-                                    po_args["picking_type_id"] = picking_type_id.id
-                            except Exception:
-                                pass
-                            po = proc_order.create(po_args)
-                            po.payment_term_id = (
-                                po.partner_id.property_supplier_payment_term_id.id
-                            )
-                            supplier_reference[supplier_id] = {
-                                "id": po.id,
-                                "min_planned": date_planned,
-                                "min_ordered": date_ordered,
-                                "po": po,
+                        try:
+                            location_id = int(elem.get("location_id"))
+                        except Exception:
+                            location_id = None
+                        po_proposals.append(
+                            {
+                                "supplier_id": supplier_id,
+                                "item_id": int(item_id),
+                                "uom_id": int(uom_id),
+                                "quantity": quantity,
+                                "date_planned": date_planned,
+                                "date_ordered": date_ordered,
+                                "location_id": location_id,
+                                "remark": (
+                                    "frePPLe - %s" % remark if remark else "frePPLe"
+                                ),
                             }
-                        else:
-                            if (
-                                date_planned
-                                < supplier_reference[supplier_id]["min_planned"]
-                            ):
-                                supplier_reference[supplier_id][
-                                    "min_planned"
-                                ] = date_planned
-                            if (
-                                date_ordered
-                                < supplier_reference[supplier_id]["min_ordered"]
-                            ):
-                                supplier_reference[supplier_id][
-                                    "min_ordered"
-                                ] = date_ordered
-
-                        if (item_id, supplier_id) not in product_supplier_dict:
-                            product = product_product.browse(int(item_id))
-                            supplier = product_supplierinfo.search(
-                                [
-                                    ("partner_id", "=", supplier_id),
-                                    (
-                                        "product_tmpl_id",
-                                        "=",
-                                        product.product_tmpl_id.id,
-                                    ),
-                                    ("min_qty", "<=", quantity),
-                                ],
-                                limit=1,
-                                order="min_qty desc",
-                            )
-                            product_uom = uom_uom.browse(int(uom_id))
-                            # first create a minimal PO line
-                            po_line = proc_orderline.create(
-                                {
-                                    "order_id": supplier_reference[supplier_id]["id"],
-                                    "product_id": int(item_id),
-                                    "product_qty": quantity,
-                                    "product_uom": int(uom_id),
-                                }
-                            )
-
-                            # Is there a blanket order for this product /supplier ?
-                            if (
-                                self.mode == 1
-                                and hasRequisition
-                                and not po_line.order_id.requisition_id
-                                and (int(item_id), supplier_id) in requisition_dic
-                            ):
-                                po.requisition_id = requisition_dic[
-                                    (int(item_id), supplier_id)
-                                ]
-                            elif (
-                                self.mode != 1
-                                and hasRequisition
-                                and not po_line.order_id.requisition_id
-                            ):
-                                for i in purchase_requisition_line.search(
-                                    [
-                                        "&",
-                                        "&",
-                                        "&",
-                                        "&",
-                                        "|",
-                                        ("requisition_id.date_end", "=", False),
-                                        (
-                                            "requisition_id.date_end",
-                                            ">=",
-                                            datetime.now(),
-                                        ),
-                                        (
-                                            "requisition_id.type_id.name",
-                                            "=",
-                                            "Blanket Order",
-                                        ),
-                                        ("requisition_id.state", "=", "ongoing"),
-                                        ("product_id.id", "=", int(item_id)),
-                                        (
-                                            "requisition_id.vendor_id.id",
-                                            "=",
-                                            supplier_id,
-                                        ),
-                                    ],
-                                    limit=1,
-                                ):
-                                    po_line.order_id.requisition_id = i.requisition_id
-
-                            # Then let odoo computes all the fields (taxes, name, description...)
-
-                            d = po_line._prepare_purchase_order_line(
-                                product,
-                                quantity,
-                                product_uom,
-                                self.company,
-                                supplier,
-                                po,
-                            )
-                            d["date_planned"] = date_planned
-                            # Finally update the PO line
-                            po_line.write(d)
-
-                            # Aggregation of quantities under the same PO line
-                            # only happens in incremental export
-                            if self.mode == 2:
-                                product_supplier_dict[(item_id, supplier_id)] = po_line
-                        else:
-                            po_line = product_supplier_dict[(item_id, supplier_id)]
-                            po_line.date_planned = min(
-                                po_line.date_planned,
-                                date_planned,
-                            )
-                            po_line.product_qty = po_line.product_qty + float(quantity)
-                        countproc += 1
+                        )
                     elif ordertype == "DO":
                         if not hasattr(self, "do_index"):
                             self.do_index = 1
@@ -609,242 +894,56 @@ class importer(object):
                             self.sm_dict[(product.id, sp.id)] = sm
 
                     elif ordertype == "WO":
-                        # Update a workorder
-                        if elem.get("owner") in mo_references:
-                            # Newly created MO
-                            mo = mo_references[elem.get("owner")]
-                        else:
-                            # Existing MO
-                            mo = mfg_order.search([("name", "=", elem.get("owner"))])
-                        if mo:
-                            wo_list = mfg_workorder.search(
-                                [
-                                    ("production_id", "=", mo.id),
-                                    ("state", "in", ["pending", "waiting", "ready"]),
-                                ]
-                            )
-                            for wo in wo_list:
-                                if wo["display_name"] != elem.get("reference"):
-                                    # Can't filter on the computed display_name field in the search...
-                                    continue
-                                if wo:
-                                    data = {
-                                        "date_start": self.timezone.localize(
-                                            datetime.strptime(
-                                                elem.get("start"),
-                                                "%Y-%m-%d %H:%M:%S",
-                                            )
-                                        )
-                                        .astimezone(UTC)
-                                        .replace(tzinfo=None),
-                                        "date_finished": self.timezone.localize(
-                                            datetime.strptime(
-                                                elem.get("end"),
-                                                "%Y-%m-%d %H:%M:%S",
-                                            )
-                                        )
-                                        .astimezone(UTC)
-                                        .replace(tzinfo=None),
-                                    }
-                                    for res_id in resources:
-                                        res = mfg_workcenter.search(
-                                            [("id", "=", res_id)]
-                                        )
-                                        if not res:
-                                            continue
-                                        if (
-                                            not wo.operation_id  # No operation defined
-                                            or (
-                                                wo.operation_id.workcenter_id
-                                                == res  # Same workcenter
-                                                or (
-                                                    # New member of a pool
-                                                    wo.operation_id.workcenter_id
-                                                    and wo.operation_id.workcenter_id
-                                                    == res.owner
-                                                )
-                                            )
-                                        ):
-                                            # Change primary work center
-                                            data["workcenter_id"] = res.id
-                                        else:
-                                            # Check assigned secondary resources
-                                            for sec in wo.secondary_workcenters:
-                                                if sec.workcenter_id.owner == res:
-                                                    break
-                                                if sec.workcenter_id.owner == res.owner:
-                                                    # Change secondary work center
-                                                    sec.write({"workcenter_id": res.id})
-                                                    break
-                                    wo.write(data)
-                                    break
-                    else:
-                        # Create or update a manufacturing order
-                        warehouse = int(elem.get("location_id"))
-                        picking = stck_picking_type.search(
-                            [
-                                ("code", "=", "mrp_operation"),
-                                ("company_id", "=", self.company.id),
-                                ("warehouse_id", "=", warehouse),
-                            ],
-                            limit=1,
-                        )
-
-                        # update the context with the default picking type
-                        # to set correct src/dest locations
-                        # Also do not create secondary work center records
-                        context.update(
+                        # Work orders are updated after parsing the file
+                        wo_updates.append(
                             {
-                                "default_picking_type_id": picking.id,
-                                "ignore_secondary_workcenters": True,
-                            }
-                        )
-                        if (elem.get("status") or "proposed") == "proposed":
-                            # MO creation
-                            remark = elem.get("remark", None)
-                            if remark:
-                                remark = "frePPLe - %s" % remark
-                            else:
-                                remark = "frePPLe"
-                            mo = mfg_order.with_context(context).create(
-                                {
-                                    "product_qty": elem.get("quantity"),
-                                    "date_start": elem.get("start"),
-                                    "date_finished": elem.get("end"),
-                                    "product_id": int(item_id),
-                                    "company_id": self.company.id,
-                                    "product_uom_id": int(uom_id),
-                                    "picking_type_id": picking.id,
-                                    "bom_id": int(
-                                        elem.get("operation").rsplit(" ", 1)[1]
-                                    ),
-                                    "qty_producing": 0.00,
-                                    # TODO no place to store the criticality
-                                    # elem.get('criticality'),
-                                    "origin": remark,
-                                }
-                            )
-                            # Remember odoo name for the MO reference passed by frepple.
-                            # This mapping is later used when importing WO.
-                            mo_references[elem.get("reference")] = mo
-                            mo._create_update_move_finished()
-                            # mo.action_confirm()  # confirm MO
-                            # mo._plan_workorders() # plan MO
-                            # mo.action_assign() # reserve material
-                            create = True
-                        else:
-                            # MO update
-                            create = False
-                            try:
-                                mo = mfg_order.with_context(context).search(
-                                    [("name", "=", elem.get("reference"))]
+                                "owner": elem.get("owner"),
+                                "reference": elem.get("reference"),
+                                "start": self.timezone.localize(
+                                    datetime.strptime(
+                                        elem.get("start"),
+                                        "%Y-%m-%d %H:%M:%S",
+                                    )
                                 )
-                            except Exception:
-                                continue
-                            if mo:
-                                new_qty = float(elem.get("quantity"))
-                                remark = elem.get("remark", None)
-                                if remark:
-                                    remark = "frePPLe - %s" % remark
-                                else:
-                                    remark = "frePPLe"
-                                if mo.product_qty != new_qty:
-                                    cpq = change_product_qty.create(
-                                        {
-                                            "mo_id": mo.id,
-                                            "product_qty": new_qty,
-                                        }
+                                .astimezone(UTC)
+                                .replace(tzinfo=None),
+                                "end": self.timezone.localize(
+                                    datetime.strptime(
+                                        elem.get("end"),
+                                        "%Y-%m-%d %H:%M:%S",
                                     )
-                                    cpq.change_prod_qty()
-                                mo.write(
-                                    {
-                                        "date_start": elem.get("start"),
-                                        "date_finished": elem.get("end"),
-                                        "origin": remark,
-                                    }
                                 )
-                                mo_references[elem.get("reference")] = mo
-
-                        # Process the workorder information we received
-                        if wo_data:
-                            for wo in mo.workorder_ids:
-                                for rec in wo_data:
-                                    if (create and rec["id"] == wo.operation_id.id) or (
-                                        not create and rec["id"] == wo.id
-                                    ):
-                                        # By default odoo populates the scheduled start date field only when you confirm and plan
-                                        # the manufacturing order.
-                                        # Here we are already updating it earlier
-                                        if "start" in rec:
-                                            wo.date_start = rec["start"]
-                                            if not create:
-                                                wo.write({"date_start": wo.date_start})
-                                        if "end" in rec:
-                                            wo.date_finished = rec["end"]
-                                            if not create:
-                                                wo.write(
-                                                    {"date_finished": wo.date_finished}
-                                                )
-
-                                        for res in rec["workcenters"]:
-                                            wc = mfg_workcenter.browse(res["id"])
-                                            if not wc:
-                                                continue
-                                            if create:
-                                                if res["id"] != wo.workcenter_id.id:
-                                                    if wo.workcenter_id == wc[0].owner:
-                                                        wo.workcenter_id = res["id"]
-                                                    else:
-                                                        mfg_workorder_secondary.create(
-                                                            {
-                                                                "workcenter_id": res[
-                                                                    "id"
-                                                                ],
-                                                                "workorder_id": wo.id,
-                                                                "duration": res[
-                                                                    "quantity"
-                                                                ]
-                                                                * wo.duration_expected,
-                                                            }
-                                                        )
-                                            else:
-                                                if (
-                                                    not wo.operation_id  # No operation defined
-                                                    or (
-                                                        wo.operation_id.workcenter_id
-                                                        == wc  # Same workcenter
-                                                        or (
-                                                            # New member of a pool
-                                                            wo.operation_id.workcenter_id
-                                                            and wo.operation_id.workcenter_id
-                                                            == wc.owner
-                                                        )
-                                                    )
-                                                ):
-                                                    # Change primary work center
-                                                    wo.write({"workcenter_id": wc.id})
-                                                else:
-                                                    # Check assigned secondary resources
-                                                    for sec in wo.secondary_workcenters:
-                                                        if (
-                                                            sec.workcenter_id.owner
-                                                            == wc
-                                                        ):
-                                                            break
-                                                        if (
-                                                            sec.workcenter_id.owner
-                                                            == wc.owner
-                                                        ):
-                                                            # Change secondary work center
-                                                            sec.write(
-                                                                {"workcenter_id": wc.id}
-                                                            )
-                                                            break
-
-                        countmfg += 1
+                                .astimezone(UTC)
+                                .replace(tzinfo=None),
+                                "resources": resources,
+                            }
+                        )
+                    else:
+                        # Manufacturing orders are created and updated after parsing the file
+                        status = elem.get("status") or "proposed"
+                        remark = elem.get("remark", None)
+                        mo_proposals.append(
+                            {
+                                "reference": elem.get("reference"),
+                                "status": status,
+                                "quantity": elem.get("quantity"),
+                                "start": elem.get("start"),
+                                "end": elem.get("end"),
+                                "item_id": int(item_id),
+                                "uom_id": int(uom_id),
+                                "warehouse": int(elem.get("location_id")),
+                                "bom_id": (
+                                    int(elem.get("operation").rsplit(" ", 1)[1])
+                                    if status == "proposed"
+                                    else None
+                                ),
+                                "remark": (
+                                    "frePPLe - %s" % remark if remark else "frePPLe"
+                                ),
+                                "workorders": wo_data,
+                            }
+                        )
                 except Exception as e:
-                    import traceback
-
                     logger.info(traceback.format_exc())
                     logger.error("Exception %s" % e)
                     msg.append(str(e))
@@ -882,12 +981,25 @@ class importer(object):
                 # Remember the root element
                 root = elem
 
-        # Update PO RFQ order_deadline and receipt date
-        for sup in supplier_reference.values():
-            if sup["min_planned"]:
-                sup["po"].date_planned = sup["min_planned"]
-            if sup["min_ordered"]:
-                sup["po"].date_order = sup["min_ordered"]
+        # Second pass: create the new purchase orders
+        if po_proposals:
+            try:
+                countproc += self.create_purchase_orders(
+                    po_proposals, proc_order.env, hasRequisition, msg
+                )
+            except Exception as e:
+                logger.info(traceback.format_exc())
+                logger.error("Exception %s" % e)
+                msg.append(str(e))
+        if mo_proposals or wo_updates:
+            countmfg += self.update_manufacturing_orders(
+                mo_proposals, wo_updates, proc_order.env, context, msg
+            )
+
+        # A new plan invalidates the cached quotes
+        self.env["ir.config_parameter"].sudo().set_param(
+            "frepple.plan_version", datetime.now().isoformat()
+        )
 
         # Be polite, and reply to the post
         msg.append("Processed %s uploaded procurement orders" % countproc)
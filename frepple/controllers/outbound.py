@@ -22,9 +22,15 @@
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
 
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import json
 import logging
 import pytz
+import queue
+import threading
+from time import perf_counter
 import xmlrpc.client
 from xml.sax.saxutils import quoteattr
 from datetime import datetime, timedelta
@@ -40,6 +46,16 @@ logger = logging.getLogger(__name__)
 
 
 class Odoo_generator:
+    # Number of data reads and rows read, for the export statistics
+    calls = 0
+    rows = 0
+
+    # Reference data shared by all exports of this process.
+    # The key is the arguments of getCachedData and the database, user, companies
+    # and language. The value is the signature of the table and the records.
+    reference_cache = {}
+    reference_cache_lock = threading.Lock()
+
     def __init__(self, env):
         self.env = env
 
@@ -51,32 +67,90 @@ class Odoo_generator:
             context=t,
         )
 
+    def exportSnapshot(self):
+        """
+        Returns the identifier of the database snapshot of our transaction.
+        """
+        self.env.cr.execute("select pg_export_snapshot()")
+        return self.env.cr.fetchone()[0]
+
+    @contextmanager
+    def fork(self, snapshot):
+        """
+        Returns a generator with its own database cursor, which reads the
+        same snapshot of the database as this generator.
+        """
+        with odoo.registry(self.env.cr.dbname).cursor() as cr:
+            cr.execute("SET TRANSACTION SNAPSHOT %s", (snapshot,))
+            yield Odoo_generator(
+                odoo.api.Environment(cr, self.env.uid, self.env.context)
+            )
+
     def callMethod(self, model, id, method, args=[]):
         for obj in self.env[model].browse(id):
             return getattr(obj, method)(*args)
         return None
 
     def getData(self, model, search=[], order=None, fields=[], ids=None, object=False):
+        self.calls += 1
         if ids is not None:
-            if object:
-                return self.env[model].browse(ids) if ids else []
-            else:
-                return self.env[model].browse(ids).read(fields) if ids else []
-        if order:
-            if object:
-                return self.env[model].search(search, order=order)
-            else:
-                return self.env[model].search(search, order=order).read(fields)
+            if not ids:
+                return []
+            recs = self.env[model].browse(ids)
+        elif order:
+            recs = self.env[model].search(search, order=order)
         else:
-            if object:
-                return self.env[model].search(search)
-            else:
-                return self.env[model].search(search).read(fields)
+            recs = self.env[model].search(search)
+        self.rows += len(recs)
+        return recs if object else recs.read(fields)
+
+    def getCachedData(self, model, search=[], order=None, fields=[]):
+        """
+        Returns the same data as getData, for reference data that rarely changes
+        such as units of measure, warehouses and product categories.
+
+        The records are cached across exports. The cache is used as long as the
+        number of records and the last write date of the table are unchanged.
+        """
+        self.env.cr.execute(
+            'select count(*), max(write_date) from "%s"' % self.env[model]._table
+        )
+        signature = self.env.cr.fetchone()
+        key = (
+            self.env.cr.dbname,
+            self.env.uid,
+            tuple(self.env.context.get("allowed_company_ids") or ()),
+            self.env.context.get("lang"),
+            model,
+            repr(search),
+            order,
+            tuple(fields),
+        )
+        with self.reference_cache_lock:
+            cached = self.reference_cache.get(key)
+        if not cached or cached[0] != signature:
+            cached = (
+                signature,
+                self.getData(model, search=search, order=order, fields=fields),
+            )
+            with self.reference_cache_lock:
+                self.reference_cache[key] = cached
+        return [dict(i) for i in cached[1]]
+
+    def getIds(self, model, search=[]):
+        self.calls += 1
+        ids = self.env[model].search(search).ids
+        self.rows += len(ids)
+        return ids
 
 
 class XMLRPC_generator:
     pagesize = 5000
 
+    # Number of data reads and rows read, for the export statistics
+    calls = 0
+    rows = 0
+
     def __init__(self, url, db, username, password):
         self.db = db
         self.password = password
@@ -102,6 +176,7 @@ class XMLRPC_generator:
         )
 
     def getData(self, model, search=None, order="id asc", fields=[], ids=[]):
+        self.calls += 1
         if ids:
             page_ids = [ids]
         else:
@@ -142,12 +217,33 @@ class XMLRPC_generator:
                         {"fields": fields, "context": self.context},
                     )
                 )
+            self.rows += len(data)
             return data
         else:
             return []
 
+    def getCachedData(self, model, search=None, order="id asc", fields=[]):
+        # No caching over xmlrpc
+        return self.getData(model, search=search, order=order, fields=fields)
+
+    def getIds(self, model, search=None):
+        return [i["id"] for i in self.getData(model, search=search, fields=["id"])]
+
 
 class exporter(object):
+    # Sections building lookups used by later sections
+    lookup_sections = (
+        "calendars",
+        "locations",
+        "customers",
+        "workcenters",
+        "item hierarchy",
+        "items",
+    )
+
+    # Other sections that a section depends on
+    section_dependencies = {"manufacturing orders": ("purchase orders",)}
+
     def __init__(
         self,
         generator,
@@ -162,9 +258,17 @@ class exporter(object):
         delta=999,
         language="en_US",
         apps="",
+        incremental=False,
+        sync_token=None,
+        sync_ack=None,
+        workers=1,
+        pages=None,
+        currentdate=None,
+        progress=None,
     ):
         self.database = database
         self.company = company
+        self.thread_data = threading.local()
         self.generator = generator
         self.version = version
         self.timezone = timezone
@@ -184,6 +288,7 @@ class exporter(object):
             ):
                 self.timezone = i["tz"] or "UTC"
         self.timeformat = "%Y-%m-%dT%H:%M:%S"
+        self.tz_transitions = {}
         self.singlecompany = singlecompany
         self.delta = delta
         self.language = language
@@ -231,6 +336,54 @@ class exporter(object):
         # Which data elements belong to each mode can vary between implementations.
         self.mode = mode
 
+        # In incremental mode only the objects created, changed or deleted since
+        # the previous incremental export are sent to frePPLe.
+        # The state of the previous export is stored in the frepple.sync.cursor model.
+        # The state of this export is stored with the sync_token, and only used
+        # by the next exports after the client confirms it with the sync_ack
+        # argument of its next request.
+        # A paged export always sends the complete sections.
+        self.incremental = incremental and pages is None
+        self.sync_token = sync_token
+        self.sync_ack = sync_ack
+
+        # Number of threads exporting the independent sections in parallel
+        self.workers = workers
+
+        # In a paged export only the listed sections are sent to frePPLe.
+        # A page "<section>:<first id>-<last id>" only sends the records of a
+        # section in that id range, see get_pages.
+        # All pages of an export session use the same current date.
+        self.pages = None
+        self.page_ranges = {}
+        if pages is not None:
+            self.pages = []
+            for p in pages:
+                name, sep, id_range = p.partition(":")
+                self.pages.append(name)
+                if id_range:
+                    first, last = id_range.split("-")
+                    self.page_ranges[name] = (int(first), int(last) if last else None)
+        self.currentdate = currentdate
+
+        # Function called with the name of every section that is done
+        self.progress = progress
+
+        # Performance statistics of each export section
+        self.stats = []
+        self.stats_start = datetime.now(pytz.utc).replace(tzinfo=None)
+
+    @property
+    def generator(self):
+        """
+        The generator of a worker thread, or else the main generator.
+        """
+        return getattr(self.thread_data, "generator", self.main_generator)
+
+    @generator.setter
+    def generator(self, generator):
+        self.main_generator = generator
+
     def run(self):
         # Check if we manage by work orders or manufacturing orders.
         self.manage_work_orders = False
@@ -241,6 +394,7 @@ class exporter(object):
 
         # Load some auxiliary data in memory
         self.load_company()
+        self.load_sync_cursors()
         if self.mode == 0:
             # This was only a connection test
             yield '<?xml version="1.0" encoding="UTF-8" ?>\n'
@@ -258,64 +412,315 @@ class exporter(object):
         yield '<plan xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" source="odoo_%s">\n' % self.mode
         yield "<description>Generated by odoo %s</description>\n" % odoo.release.version
 
-        self.currentdate = datetime.now()
+        self.currentdate = self.currentdate or datetime.now()
         yield "<current>%s</current>" % self.currentdate.strftime("%Y-%m-%dT%H:%M:%S")
 
-        # Synchronize users
-        yield from self.export_users()
+        lookups, groups = self.get_sections()
+        if self.pages is not None:
+            # Only the requested pages are sent. Other sections only run when
+            # they build lookups needed by the requested ones.
+            self.required_sections = set(self.lookup_sections)
+            for p in self.pages:
+                self.required_sections.update(self.section_dependencies.get(p, ()))
+            groups = [
+                g
+                for g in groups
+                if any(n in self.pages or n in self.required_sections for n, s in g)
+            ]
+        for name, section in lookups:
+            yield from self.export_section(name, section)
+        self.load_operation_types()
+        yield from self.export_sections(groups)
+
+        self.save_sync_cursors()
+        yield from self.export_statistics()
+
+        # Footer
+        yield "</plan>\n"
 
-        # Main content.
-        # The order of the entities is important. First one needs to create the
-        # objects before they are referenced by other objects.
-        # If multiple types of an entity exists (eg operation_time_per,
-        # operation_alternate, operation_alternate, etc) the reference would
-        # automatically create an object, potentially of the wrong type.
-        logger.debug("Exporting calendars.")
+    def get_sections(self):
+        """
+        Returns the export sections as two lists.
+
+        The first list has the (name, method) tuples of the sections building the
+        lookups of the other sections. They are exported one after the other.
+        The order of the entities is important. First one needs to create the
+        objects before they are referenced by other objects.
+        If multiple types of an entity exists (eg operation_time_per,
+        operation_alternate, operation_alternate, etc) the reference would
+        automatically create an object, potentially of the wrong type.
+
+        The second list has groups of sections that only depend on these lookups.
+        The sections of a group are exported in the listed order. Different groups
+        can be exported in parallel.
+        """
+        lookups = [("users", self.export_users)]
         if self.mode == 1:
-            yield from self.export_calendar()
-        logger.debug("Exporting locations.")
-        yield from self.export_locations()
-        self.load_operation_types()
-        logger.debug("Exporting customers.")
-        yield from self.export_customers()
+            lookups.append(("calendars", self.export_calendar))
+        lookups.append(("locations", self.export_locations))
+        lookups.append(("customers", self.export_customers))
         if self.mode == 1:
-            logger.debug("Exporting suppliers.")
-            yield from self.export_suppliers()
-            logger.debug("Exporting skills.")
-            yield from self.export_skills()
-            logger.debug("Exporting workcenters.")
-            yield from self.export_workcenters()
-            logger.debug("Exporting workcenterskills.")
-            yield from self.export_workcenterskills()
-        logger.debug("Exporting products.")
-        yield from self.export_item_hierarchy()
-        yield from self.export_items()
-        logger.debug("Exporting BOMs.")
+            lookups.append(("suppliers", self.export_suppliers))
+            lookups.append(("skills", self.export_skills))
+            lookups.append(("workcenters", self.export_workcenters))
+            lookups.append(("workcenterskills", self.export_workcenterskills))
+        lookups.append(("item hierarchy", self.export_item_hierarchy))
+        lookups.append(("items", self.export_items))
+
+        groups = []
         if self.mode == 1:
-            yield from self.export_boms()
-        logger.debug("Exporting sales orders.")
-        yield from self.export_salesorders()
+            groups.append([("BOMs", self.export_boms)])
+        groups.append([("sales orders", self.export_salesorders)])
         # Uncomment the following lines to create forecast models in frepple
-        # logger.debug("Exporting forecast.")
-        # for i in self.export_forecasts():
-        #     yield i
+        # groups.append([("forecast", self.export_forecasts)])
         if self.mode == 1:
-            logger.debug("Exporting purchase orders.")
-            yield from self.export_purchaseorders()
-            logger.debug("Exporting manufacturing orders.")
-            yield from self.export_manufacturingorders()
-            logger.debug("Exporting reordering rules.")
-            yield from self.export_orderpoints()
-
+            groups.append(
+                [
+                    # Manufacturing orders use the subcontracting purchase orders
+                    ("purchase orders", self.export_purchaseorders),
+                    ("manufacturing orders", self.export_manufacturingorders),
+                ]
+            )
+            groups.append([("reordering rules", self.export_orderpoints)])
             if self.has_expiry:
-                logger.debug("Exporting stock orders.")
-                yield from self.export_stockorders()
+                groups.append([("stock orders", self.export_stockorders)])
             else:
-                logger.debug("Exporting quantities on-hand.")
-                yield from self.export_onhand()
+                groups.append([("quantities on-hand", self.export_onhand)])
+        return lookups, groups
+
+    # Sections that are split in pages of at most page_size records of a model.
+    # The value is the model and the field of the section with its id.
+    paged_sections = {
+        "sales orders": ("sale.order", "order_id"),
+        "purchase orders": ("purchase.order", "order_id"),
+        "manufacturing orders": ("mrp.production", "id"),
+    }
+    page_size = 5000
+
+    def get_pages(self, split=False):
+        """
+        Returns the names of all export sections, in the order of the export.
 
-        # Footer
-        yield "</plan>\n"
+        With the split argument the sections in paged_sections are split in
+        pages "<section>:<first id>-<last id>" of at most page_size records.
+        The last page of a section has no last id, such that it also contains
+        the records created while the pages are exported.
+        Note that every page still runs the lookup sections.
+        """
+        lookups, groups = self.get_sections()
+        pages = [name for name, section in lookups]
+        for group in groups:
+            for name, section in group:
+                if not split or name not in self.paged_sections:
+                    pages.append(name)
+                    continue
+                ids = sorted(self.generator.getIds(self.paged_sections[name][0], []))
+                if not ids:
+                    pages.append(name)
+                for i in range(0, len(ids), self.page_size):
+                    pages.append(
+                        "%s:%s-%s"
+                        % (
+                            name,
+                            ids[i],
+                            (
+                                ids[i + self.page_size - 1]
+                                if i + self.page_size < len(ids)
+                                else ""
+                            ),
+                        )
+                    )
+        return pages
+
+    def page_domain(self, name):
+        """
+        Returns the search domain selecting the records of the page of a
+        section in a paged export.
+        """
+        id_range = self.page_ranges.get(name, None)
+        if not id_range:
+            return []
+        field = self.paged_sections[name][1]
+        if id_range[1] is None:
+            return [(field, ">=", id_range[0])]
+        return [(field, ">=", id_range[0]), (field, "<=", id_range[1])]
+
+    def export_section(self, name, section):
+        """
+        Runs an export section, and records its wall time, SQL queries, data
+        reads and the size of the generated XML.
+        The time spent by the consumer of the XML isn't counted.
+        """
+        if self.pages is not None and name not in self.pages:
+            if name in self.required_sections:
+                # Build the lookups without sending the data
+                logger.debug("Loading lookups of %s." % name)
+                for x in section():
+                    pass
+            return
+        logger.debug("Exporting %s." % name)
+        generator = self.generator
+        cr = generator.env.cr if isinstance(generator, Odoo_generator) else None
+        thread = threading.current_thread()
+        queries = getattr(cr, "sql_log_count", 0)
+        query_time = getattr(thread, "query_time", 0)
+        calls = generator.calls
+        rows = generator.rows
+        duration = 0
+        size = 0
+        data = section()
+        while True:
+            start = perf_counter()
+            try:
+                x = next(data)
+            except StopIteration:
+                duration += perf_counter() - start
+                break
+            duration += perf_counter() - start
+            size += len(x)
+            yield x
+        self.stats.append(
+            {
+                "section": name,
+                "duration": duration,
+                "queries": getattr(cr, "sql_log_count", 0) - queries,
+                "query_time": getattr(thread, "query_time", 0) - query_time,
+                "calls": generator.calls - calls,
+                "rows": generator.rows - rows,
+                "size": size,
+            }
+        )
+        if self.progress:
+            self.progress(name)
+
+    def export_statistics(self):
+        """
+        Reports the statistics of all sections in the log, in the
+        frepple.export.stat model and as an XML comment.
+        """
+        lines = [
+            "%-24s %9s %8s %9s %6s %9s %11s"
+            % (
+                "section",
+                "time (s)",
+                "queries",
+                "sql (s)",
+                "reads",
+                "rows",
+                "size",
+            )
+        ]
+        for s in self.stats:
+            lines.append(
+                "%-24s %9.3f %8d %9.3f %6d %9d %11d"
+                % (
+                    s["section"],
+                    s["duration"],
+                    s["queries"],
+                    s["query_time"],
+                    s["calls"],
+                    s["rows"],
+                    s["size"],
+                )
+            )
+        summary = "\n".join(lines)
+        logger.info("Export statistics of company %s:\n%s" % (self.company, summary))
+        if isinstance(self.generator, Odoo_generator):
+            try:
+                with self.generator.env.cr.savepoint():
+                    self.generator.env["frepple.export.stat"].sudo().record(
+                        self.company_id, self.mode, self.stats_start, self.stats
+                    )
+            except Exception as e:
+                logger.warning("Can't store the export statistics: %s" % e)
+        yield "<!-- export statistics\n%s\n-->\n" % summary
+
+    def export_section_group(self, group):
+        for name, section in group:
+            yield from self.export_section(name, section)
+
+    # Number of batches of strings that a worker generates ahead of the client,
+    # and number of strings in a batch
+    queue_size = 16
+    batch_size = 1000
+
+    def export_sections(self, sections):
+        """
+        Exports groups of independent sections.
+
+        With multiple workers every group runs in a separate thread, with its own
+        cursor on the same database snapshot. The XML of the groups is returned
+        in the order of the groups.
+        Every group passes its XML through a bounded queue. A worker that is
+        ahead of the client waits, so the memory use doesn't grow with the
+        size of the plan.
+        """
+        if (
+            self.workers <= 1
+            or len(sections) <= 1
+            or not isinstance(self.generator, Odoo_generator)
+        ):
+            for group in sections:
+                yield from self.export_section_group(group)
+            return
+
+        snapshot = self.generator.exportSnapshot()
+        stop = threading.Event()
+
+        def put(q, item):
+            # Returns False when the export is stopped
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def worker(group, q):
+            # Let odoo accumulate the query time of this thread
+            thread = threading.current_thread()
+            if not hasattr(thread, "query_time"):
+                thread.query_count = 0
+                thread.query_time = 0
+            try:
+                with self.main_generator.fork(snapshot) as generator:
+                    self.thread_data.generator = generator
+                    try:
+                        batch = []
+                        for x in self.export_section_group(group):
+                            batch.append(x)
+                            if len(batch) >= self.batch_size:
+                                if not put(q, batch):
+                                    return
+                                batch = []
+                        if put(q, batch):
+                            put(q, None)
+                    finally:
+                        del self.thread_data.generator
+            except Exception as e:
+                put(q, e)
+
+        queues = [queue.Queue(self.queue_size) for group in sections]
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="frepple_export"
+        ) as pool:
+            futures = [
+                pool.submit(worker, group, q) for group, q in zip(sections, queues)
+            ]
+            try:
+                for q in queues:
+                    while True:
+                        batch = q.get()
+                        if batch is None:
+                            break
+                        if isinstance(batch, Exception):
+                            raise batch
+                        yield from batch
+            finally:
+                stop.set()
+                for f in futures:
+                    f.cancel()
 
     def load_company(self):
         self.company_id = 0
@@ -329,6 +734,8 @@ class exporter(object):
                 "calendar",
                 "manufacturing_warehouse",
                 "respect_reservations",
+                "history_days",
+                "horizon_days",
             ],
         ):
             self.company_id = i["id"]
@@ -338,6 +745,7 @@ class exporter(object):
             self.po_lead = i["po_lead"]
             self.manufacturing_lead = i["manufacturing_lead"]
             self.respect_reservations = i["respect_reservations"]
+            self.set_window(i["history_days"], i["horizon_days"])
             try:
                 self.calendar = (
                     i["calendar"]
@@ -364,6 +772,41 @@ class exporter(object):
             self.manufacturing_lead = 0
             self.calendar = None
             self.mfg_location = self.company
+            self.set_window(0, 0)
+
+    def set_window(self, history_days, horizon_days):
+        """
+        Sets the planning window of the company. Records ending before the start
+        or starting after the end of the window can't influence the plan.
+        """
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.history_start = (
+            today - timedelta(days=history_days) if history_days else None
+        )
+        self.horizon_end = (
+            today + timedelta(days=horizon_days) if horizon_days else None
+        )
+
+    def get_window_domain(self, start_field=None, end_field=None, dates=False):
+        """
+        Returns a domain selecting the records overlapping with the planning
+        window. Records without a start or end date are always selected.
+        """
+        fmt = "%Y-%m-%d" if dates else "%Y-%m-%d %H:%M:%S"
+        domain = []
+        if self.history_start and end_field:
+            domain += [
+                "|",
+                (end_field, "=", False),
+                (end_field, ">=", self.history_start.strftime(fmt)),
+            ]
+        if self.horizon_end and start_field:
+            domain += [
+                "|",
+                (start_field, "=", False),
+                (start_field, "<=", self.horizon_end.strftime(fmt)),
+            ]
+        return domain
 
     def load_uom(self):
         """
@@ -373,7 +816,8 @@ class exporter(object):
         unit of measure of the uom dimension.
         """
         self.uom = {}
-        for i in self.generator.getData(
+        self.uom_factors = {}
+        for i in self.generator.getCachedData(
             "uom.uom",
             # We also need to load INactive UOMs, because there still might be records
             # using the inactive UOM. Questionable practice, but can happen...
@@ -391,7 +835,7 @@ class exporter(object):
         Loading operation types into a dictionary for fast lookups.
         """
         self.operation_types = {}
-        for i in self.generator.getData(
+        for i in self.generator.getCachedData(
             "stock.picking.type",
             # We also need to load INactive types
             search=["|", ("active", "=", 1), ("active", "=", 0)],
@@ -426,35 +870,60 @@ class exporter(object):
                 ),
             }
 
+    def readByIds(self, model, ids, fields=[]):
+        """
+        Reads a set of records in a single call.
+        An empty set of ids returns no records.
+        """
+        if not ids:
+            return []
+        return self.generator.getData(model, ids=list(ids), fields=fields)
+
     def convert_qty_uom(self, qty, uom_id, product_template_id=None):
         """
         Convert a quantity to the reference uom of the product template.
+
+        The conversion factors are computed only once for every combination
+        of uom and product template.
         """
-        try:
+        if isinstance(uom_id, (list, tuple)):
             uom_id = uom_id[0]
-        except Exception:
-            pass
         if not uom_id:
             return qty
+        factors = self.uom_factors.get((uom_id, product_template_id), None)
+        if not factors:
+            factors = self.get_uom_factors(uom_id, product_template_id)
+        return qty / factors[1] * factors[0]
+
+    def get_uom_factors(self, uom_id, product_template_id):
+        """
+        Returns the multiplier and divisor to convert a quantity in a uom to the
+        reference uom of the product template.
+        """
         if not product_template_id:
-            return qty * self.uom[uom_id]["factor"]
+            factors = (self.uom[uom_id]["factor"], 1)
+            self.uom_factors[(uom_id, product_template_id)] = factors
+            return factors
         try:
             product_uom = self.product_templates[product_template_id]["uom_id"][0]
         except Exception:
-            return qty * self.uom[uom_id]["factor"]
-        # check if default product uom is the one we received
+            # Not cached, because the product templates may not be read yet
+            return (self.uom[uom_id]["factor"], 1)
         if product_uom == uom_id:
-            return qty
-        # check if different uoms belong to the same category
-        if self.uom[product_uom]["category"] == self.uom[uom_id]["category"]:
-            return qty / self.uom[uom_id]["factor"] * self.uom[product_uom]["factor"]
+            # Default product uom
+            factors = (1, 1)
+        elif self.uom[product_uom]["category"] == self.uom[uom_id]["category"]:
+            factors = (self.uom[product_uom]["factor"], self.uom[uom_id]["factor"])
         else:
             # UOM is from a different category as the reference uom of the product.
+            # The warning is logged only once.
             logger.warning(
                 "Can't convert from %s for product template %s"
                 % (self.uom[uom_id]["name"], product_template_id)
             )
-            return qty * self.uom[uom_id]["factor"]
+            factors = (self.uom[uom_id]["factor"], 1)
+        self.uom_factors[(uom_id, product_template_id)] = factors
+        return factors
 
     def convert_float_time(self, float_time, units="days"):
         """
@@ -468,10 +937,180 @@ class exporter(object):
             int(d.seconds % 60),  # duration: seconds
         )
 
+    def get_tz_transitions(self, tmzone):
+        """
+        Returns the UTC times when the offset of a timezone changes, and the
+        offset from each of these times on.
+        The timezone is resolved only once per export.
+        """
+        transitions = self.tz_transitions.get(tmzone, None)
+        if not transitions:
+            tz = timezone(tmzone)
+            if hasattr(tz, "_utc_transition_times"):
+                transitions = (
+                    tz._utc_transition_times,
+                    [i[0] for i in tz._transition_info],
+                )
+            else:
+                # Timezone with a fixed offset, eg UTC
+                transitions = ([datetime.min], [tz.utcoffset(datetime.min)])
+            self.tz_transitions[tmzone] = transitions
+        return transitions
+
     def formatDateTime(self, d, tmzone=None):
+        """
+        Converts a datetime in UTC to the export timezone, or the timezone
+        passed as argument.
+        Naive datetimes are in UTC, like all datetimes in the odoo database.
+        """
         if not isinstance(d, datetime):
             d = datetime.fromisoformat(d)
-        return d.astimezone(timezone(tmzone or self.timezone)).strftime(self.timeformat)
+        if d.tzinfo:
+            d = d.astimezone(pytz.utc).replace(tzinfo=None)
+        times, offsets = self.get_tz_transitions(tmzone or self.timezone)
+        d += offsets[bisect_right(times, d) - 1]
+        if self.timeformat != "%Y-%m-%dT%H:%M:%S":
+            return d.strftime(self.timeformat)
+        return "%04d-%02d-%02dT%02d:%02d:%02d" % (
+            d.year,
+            d.month,
+            d.day,
+            d.hour,
+            d.minute,
+            d.second,
+        )
+
+    # Margin applied on the high-water mark of an incremental export. It covers
+    # transactions that were still running when the previous export started.
+    sync_overlap = timedelta(minutes=10)
+
+    # Entities exported as lookups. The other sections refer to them by name.
+    sync_lookups = ("customers", "suppliers", "items")
+
+    def load_sync_cursors(self):
+        """
+        Loading the state of the previous incremental export.
+        """
+        self.sync_cursors = {}
+        self.sync_keys = {}
+        self.sync_renamed = False
+        if not self.incremental:
+            return
+        if not isinstance(self.generator, Odoo_generator) or not self.company_id:
+            logger.warning(
+                "Incremental export requires a company and direct database access"
+            )
+            self.incremental = False
+            return
+        cursors = self.generator.env["frepple.sync.cursor"].sudo()
+        cursors.confirm(self.company_id, self.mode, self.sync_ack)
+        self.sync_cursors = cursors.get_cursors(self.company_id, self.mode)
+        self.generator.env.cr.execute("select now() at time zone 'utc'")
+        self.sync_start = self.generator.env.cr.fetchone()[0]
+
+    def save_sync_cursors(self):
+        """
+        Storing the high-water mark and exported objects of an incremental export.
+        They are pending until the client confirms the sync token.
+        """
+        if not self.incremental or not self.sync_token:
+            return
+        m = self.generator.env["frepple.sync.cursor"].sudo()
+        for entity, keys in self.sync_keys.items():
+            m.set_cursor(
+                self.company_id,
+                self.mode,
+                entity,
+                self.sync_start,
+                keys,
+                self.sync_token,
+            )
+
+    def sync_since(self, entity):
+        """
+        Returns the write date from which records of an entity need to be exported
+        again, or None when all records need to be exported.
+        """
+        if not self.incremental:
+            return None
+        if self.sync_renamed and entity not in self.sync_lookups:
+            # A lookup was renamed: all records referring to it need to be
+            # exported again
+            return None
+        cursor = self.sync_cursors.get(entity, None)
+        if not cursor or not cursor[0]:
+            return None
+        return cursor[0] - self.sync_overlap
+
+    def delta_search(self, entity, search, paths=("write_date",)):
+        """
+        Extends a search domain to select only the records changed since the
+        previous incremental export.
+        The paths are the write_date fields of the record itself and of all
+        related records that are exported in the same frePPLe object.
+        """
+        since = self.sync_since(entity)
+        if not since:
+            return search
+        return search + ["|"] * (len(paths) - 1) + [(p, ">=", since) for p in paths]
+
+    def is_changed(self, entity, *write_dates):
+        since = self.sync_since(entity)
+        return not since or any(d and d >= since for d in write_dates)
+
+    def is_renamed(self, entity, odoo_id, key):
+        """
+        Checks whether the frePPLe object of a lookup record got a different
+        name since the previous incremental export. The other sections are
+        then exported completely, since their unchanged records still refer
+        to the old name.
+        """
+        if not self.incremental:
+            return False
+        previous = self.sync_cursors.get(entity, (None, {}))[1].get(str(odoo_id), None)
+        if previous is None or key in previous:
+            return False
+        self.sync_renamed = True
+        return True
+
+    def track(self, entity, odoo_id, key):
+        """
+        Remember the name of a frePPLe object exported for an odoo record.
+        """
+        if self.incremental:
+            self.sync_keys.setdefault(entity, {}).setdefault(str(odoo_id), []).append(
+                key
+            )
+
+    def export_removals(
+        self, entity, tag, alive_ids=None, changed_ids=(), attribute="name"
+    ):
+        """
+        Removes the frePPLe objects of a previous incremental export that
+        don't exist any longer in odoo.
+
+        The argument alive_ids lists the odoo records that still exist, and
+        changed_ids the records selected by the delta search of this run. The
+        other existing records are unchanged and keep their frePPLe objects.
+        A changed record that wasn't exported loses its frePPLe objects.
+        When alive_ids is None, all existing records were selected in this run.
+        """
+        if not self.incremental:
+            return
+        keys = self.sync_keys.setdefault(entity, {})
+        previous = self.sync_cursors.get(entity, (None, {}))[1]
+        if alive_ids is not None:
+            changed_ids = {str(i) for i in changed_ids}
+            for i in alive_ids:
+                i = str(i)
+                if i not in keys and i not in changed_ids and i in previous:
+                    keys[i] = previous[i]
+        current = {k for v in keys.values() for k in v}
+        for v in previous.values():
+            for k in v:
+                if k not in current:
+                    current.add(k)
+                    yield '<%s %s=%s action="R"/>\n' % (tag, attribute, quoteattr(k))
 
     def export_users(self):
         users = []
@@ -515,6 +1154,8 @@ class exporter(object):
         calendar end dates are added in frepple as calendar buckets.
         The week number is using the iso standard (first week of the
         year is the one containing the first Thursday of the year).
+        When a calendar horizon is set, only the weeks within that number of
+        days around the current date are added.
 
         """
         yield "<!-- calendar -->\n"
@@ -522,7 +1163,8 @@ class exporter(object):
 
         calendars = {}
         cal_tz = {}
-        cal_ids = set()
+        cal_names = {}
+        self.resource_calendars = {}
         try:
             # Read the timezone
             for i in self.generator.getData(
@@ -532,8 +1174,8 @@ class exporter(object):
                     "tz",
                 ],
             ):
-                cal_ids.add(i["id"])
-                cal_tz["%s %s" % (i["name"], i["id"])] = i["tz"]
+                cal_names[i["id"]] = "%s %s" % (i["name"], i["id"])
+                cal_tz[cal_names[i["id"]]] = i["tz"]
 
             # Read the resource calendar association
             calendar_resource = {}
@@ -551,9 +1193,13 @@ class exporter(object):
 
             # Read from the attendance/leaves which resource has specific entries
             self.resources_with_specific_calendars = {}
+            attendance_window = self.get_window_domain(
+                "date_from", "date_to", dates=True
+            )
+            leave_window = self.get_window_domain("date_from", "date_to")
             for i in self.generator.getData(
                 "resource.calendar.attendance",
-                search=[("resource_id", "!=", False)],
+                search=[("resource_id", "!=", False)] + attendance_window,
                 fields=[
                     "resource_id",
                 ],
@@ -563,7 +1209,8 @@ class exporter(object):
                 ][1]
             for i in self.generator.getData(
                 "resource.calendar.leaves",
-                search=[("resource_id", "!=", False), ("time_type", "=", "leave")],
+                search=[("resource_id", "!=", False), ("time_type", "=", "leave")]
+                + leave_window,
                 fields=[
                     "resource_id",
                 ],
@@ -572,10 +1219,12 @@ class exporter(object):
                     "resource_id"
                 ][1]
 
-            # Read the attendance for all calendars
+            # Read the attendance and leaves for all calendars, in the order they
+            # are exported
+            calendar_rows = {}
             for i in self.generator.getData(
                 "resource.calendar.attendance",
-                search=[("display_type", "=", False)],
+                search=[("display_type", "=", False)] + attendance_window,
                 fields=[
                     "dayofweek",
                     "date_from",
@@ -588,51 +1237,12 @@ class exporter(object):
                     "day_period",
                 ],
             ):
-                if i["calendar_id"] and i["calendar_id"][0] in cal_ids:
-                    calendar_name = "%s %s" % (i["calendar_id"][1], i["calendar_id"][0])
-
-                    if not i["resource_id"]:
-                        if calendar_name not in calendars:
-                            calendars[calendar_name] = []
-                        i["attendance"] = (
-                            True
-                            if i["day_period"] in ("morning", "afternoon")
-                            else False
-                        )
-                        calendars[calendar_name].append(i)
-
-                    if calendar_resource.get(i["calendar_id"][0]):
-                        for res in calendar_resource.get(i["calendar_id"][0]):
-                            if i["resource_id"] and res != i["resource_id"][0]:
-                                continue
-                            if res in self.resources_with_specific_calendars:
-                                if (
-                                    "calendar for %s"
-                                    % (self.resources_with_specific_calendars[res],)
-                                    not in calendars
-                                ):
-                                    calendars[
-                                        "calendar for %s"
-                                        % (self.resources_with_specific_calendars[res],)
-                                    ] = []
-                                    cal_tz[
-                                        "calendar for %s"
-                                        % (self.resources_with_specific_calendars[res],)
-                                    ] = cal_tz[calendar_name]
-                                i["attendance"] = (
-                                    True
-                                    if i["day_period"] in ("morning", "afternoon")
-                                    else False
-                                )
-                                calendars[
-                                    "calendar for %s"
-                                    % (self.resources_with_specific_calendars[res],)
-                                ].append(i)
-
-            # Read the leaves for all calendars
+                if i["calendar_id"] and i["calendar_id"][0] in cal_names:
+                    i["attendance"] = i["day_period"] in ("morning", "afternoon")
+                    calendar_rows.setdefault(i["calendar_id"][0], []).append(i)
             for i in self.generator.getData(
                 "resource.calendar.leaves",
-                search=[("time_type", "=", "leave")],
+                search=[("time_type", "=", "leave")] + leave_window,
                 fields=[
                     "date_from",
                     "date_to",
@@ -640,40 +1250,47 @@ class exporter(object):
                     "resource_id",
                 ],
             ):
-                if i["calendar_id"] and i["calendar_id"][0] in cal_ids:
-                    calendar_name = "%s %s" % (i["calendar_id"][1], i["calendar_id"][0])
-                    if not i["resource_id"]:
-                        if calendar_name not in calendars:
-                            calendars[calendar_name] = []
-                        i["attendance"] = False
-                        calendars[calendar_name].append(i)
-
-                    if calendar_resource.get(i["calendar_id"][0]):
-                        for res in calendar_resource.get(i["calendar_id"][0]):
-                            if i["resource_id"] and res != i["resource_id"][0]:
-                                continue
-                            if res in self.resources_with_specific_calendars:
-                                if (
-                                    "calendar for %s"
-                                    % (self.resources_with_specific_calendars[res],)
-                                    not in calendars
-                                ):
-                                    calendars[
-                                        "calendar for %s"
-                                        % (self.resources_with_specific_calendars[res],)
-                                    ] = []
-                                    cal_tz[
-                                        "calendar for %s"
-                                        % (self.resources_with_specific_calendars[res],)
-                                    ] = cal_tz[i["calendar_id"][1]]
-                                i["attendance"] = False
-                                calendars[
-                                    "calendar for %s"
-                                    % (self.resources_with_specific_calendars[res],)
-                                ].append(i)
+                if i["calendar_id"] and i["calendar_id"][0] in cal_names:
+                    i["attendance"] = False
+                    calendar_rows.setdefault(i["calendar_id"][0], []).append(i)
                 # else:
                 #    TODO   Handle company-wide leaves that apply to all calendars
 
+            # A resource with its own attendances or leaves gets a calendar with
+            # these and the rows of the calendar of its workcenter. Calendars with
+            # the same content are exported only once.
+            exported = {}
+            for cal, rows in calendar_rows.items():
+                calendar_name = cal_names[cal]
+                general = [j for j in rows if not j["resource_id"]]
+                if general:
+                    calendars[calendar_name] = general
+                    exported[self.get_calendar_key(cal_tz[calendar_name], general)] = (
+                        calendar_name
+                    )
+                for res in sorted(
+                    calendar_resource.get(cal, ()),
+                    key=lambda r: self.resources_with_specific_calendars.get(r, ""),
+                ):
+                    if res not in self.resources_with_specific_calendars:
+                        continue
+                    res_rows = [
+                        j
+                        for j in rows
+                        if not j["resource_id"] or j["resource_id"][0] == res
+                    ]
+                    if not res_rows:
+                        continue
+                    key = self.get_calendar_key(cal_tz[calendar_name], res_rows)
+                    if key not in exported:
+                        name = "calendar for %s" % (
+                            self.resources_with_specific_calendars[res],
+                        )
+                        calendars[name] = res_rows
+                        cal_tz[name] = cal_tz[calendar_name]
+                        exported[key] = name
+                    self.resource_calendars[res] = exported[key]
+
             # Iterate over the results:
             for i in calendars:
                 priority_attendance = 1000
@@ -723,40 +1340,38 @@ class exporter(object):
                             priority_leave += 1
                     else:
                         # TWO-WEEKS CALENDAR
+                        # The dates of the attendance are converted to datetimes
                         start = j["date_from"] or datetime(2020, 1, 1)
+                        start = datetime(start.year, start.month, start.day)
                         end = j["date_to"] or datetime(2030, 12, 31)
-
-                        t = start
-                        while t < end:
-                            if int(t.isocalendar()[1] % 2) == int(j["week_type"]):
-                                yield '<bucket start="%s" end="%s" value="%s" days="%s" priority="%s" starttime="%s" endtime="%s"/>\n' % (
-                                    self.formatDateTime(t, cal_tz[i]),
-                                    self.formatDateTime(
-                                        min(t + timedelta(7 - t.weekday()), end),
-                                        cal_tz[i],
-                                    ),
-                                    "1",
-                                    (
-                                        (2 ** ((int(j["dayofweek"]) + 1) % 7))
-                                        if "dayofweek" in j
-                                        else (2**7) - 1
-                                    ),
-                                    priority_attendance,
-                                    # In odoo, monday = 0. In frePPLe, sunday = 0.
-                                    (
-                                        ("PT%dM" % round(j["hour_from"] * 60))
-                                        if "hour_from" in j
-                                        else "PT0M"
-                                    ),
-                                    (
-                                        ("PT%dM" % round(j["hour_to"] * 60))
-                                        if "hour_to" in j
-                                        else "PT1440M"
-                                    ),
-                                )
-                                priority_attendance += 1
-                            dow = t.weekday()
-                            t += timedelta(7 - dow)
+                        end = datetime(end.year, end.month, end.day)
+                        for t in self.get_two_week_starts(start, end, j["week_type"]):
+                            yield '<bucket start="%s" end="%s" value="%s" days="%s" priority="%s" starttime="%s" endtime="%s"/>\n' % (
+                                self.formatDateTime(t, cal_tz[i]),
+                                self.formatDateTime(
+                                    min(t + timedelta(7 - t.weekday()), end),
+                                    cal_tz[i],
+                                ),
+                                "1",
+                                (
+                                    (2 ** ((int(j["dayofweek"]) + 1) % 7))
+                                    if "dayofweek" in j
+                                    else (2**7) - 1
+                                ),
+                                priority_attendance,
+                                # In odoo, monday = 0. In frePPLe, sunday = 0.
+                                (
+                                    ("PT%dM" % round(j["hour_from"] * 60))
+                                    if "hour_from" in j
+                                    else "PT0M"
+                                ),
+                                (
+                                    ("PT%dM" % round(j["hour_to"] * 60))
+                                    if "hour_to" in j
+                                    else "PT1440M"
+                                ),
+                            )
+                            priority_attendance += 1
 
                 yield "</buckets></calendar>\n"
 
@@ -765,6 +1380,52 @@ class exporter(object):
             logger.info(e)
             yield "</calendars>\n"
 
+    def get_calendar_key(self, tz, rows):
+        """
+        Returns a key identifying the buckets exported for the attendance and
+        leave rows of a calendar.
+        """
+        return (tz,) + tuple(
+            (
+                j["attendance"],
+                j.get("dayofweek", None),
+                j.get("week_type", None),
+                j.get("hour_from", None),
+                j.get("hour_to", None),
+                j["date_from"],
+                j["date_to"],
+            )
+            for j in rows
+        )
+
+    def get_two_week_starts(self, start, end, week_type):
+        """
+        Generates the start of all weeks between the start and end date with
+        an even (week type 0) or odd (week type 1) iso week number.
+        The first week starts at the start date, the other weeks on monday.
+
+        The weeks are computed directly from the first week of each iso year,
+        which has 52 or 53 weeks. Weeks outside the planning window of the
+        company are skipped.
+        """
+        if self.history_start:
+            start = max(start, self.history_start)
+        if self.horizon_end:
+            end = min(end, self.horizon_end)
+        if start >= end:
+            return
+        year = start.isocalendar()[0]
+        while True:
+            first_monday = datetime.fromisocalendar(year, 1, 1)
+            weeks = (datetime.fromisocalendar(year + 1, 1, 1) - first_monday).days // 7
+            for week in range(2 if int(week_type) == 0 else 1, weeks + 1, 2):
+                monday = first_monday + timedelta(weeks=week - 1)
+                if monday >= end:
+                    return
+                if monday + timedelta(weeks=1) > start:
+                    yield max(monday, start)
+            year += 1
+
     def export_locations(self):
         """
         Generate a list of warehouse locations to frePPLe, based on the
@@ -787,7 +1448,7 @@ class exporter(object):
         self.map_locations = {}
         self.warehouses = {}
         first = True
-        for i in self.generator.getData(
+        for i in self.generator.getCachedData(
             "stock.warehouse",
             fields=["name", "code"],
         ):
@@ -812,18 +1473,9 @@ class exporter(object):
             self.mfg_location = self.warehouses[self.mfg_location]
 
         # Populate a mapping location-to-warehouse name for later lookups
-        loc_ids = [
-            loc["id"]
-            for loc in self.generator.getData(
-                "stock.location",
-                search=[("usage", "=", "internal")],
-                fields=["id"],
-            )
-        ]
-
-        for loc_object in self.generator.getData(
+        for loc_object in self.generator.getCachedData(
             "stock.location",
-            ids=loc_ids,
+            search=[("usage", "=", "internal")],
             fields=["warehouse_id"],
         ):
             if (
@@ -843,12 +1495,13 @@ class exporter(object):
         res.partner.id res.partner.name -> customer.name
         """
         self.map_customers = {}
+        self.changed_customers = set()
         first = True
         individual_inserted = False
         for i in self.generator.getData(
             "res.partner",
             search=["|", ("parent_id", "=", False), ("parent_id.active", "=", True)],
-            fields=["name", "parent_id", "is_company"],
+            fields=["name", "parent_id", "is_company", "write_date"],
             order="parent_id desc",
         ):
             if first:
@@ -857,11 +1510,18 @@ class exporter(object):
                 first = False
             if i["is_company"]:
                 name = "%s %s" % (i["name"], i["id"])
-                yield "<customer name=%s/>\n" % quoteattr(name)
+                if self.is_renamed("customers", i["id"], name) or self.is_changed(
+                    "customers", i["write_date"]
+                ):
+                    self.changed_customers.add(name)
+                    yield "<customer name=%s/>\n" % quoteattr(name)
+                self.track("customers", i["id"], name)
             elif i["parent_id"] == False or i["id"] == i["parent_id"][0]:
                 name = "Individuals"
                 if not individual_inserted:
+                    self.changed_customers.add(name)
                     yield "<customer name=%s/>\n" % quoteattr(name)
+                    self.track("customers", 0, name)
                     individual_inserted = True
             else:
                 if i["parent_id"][0] in self.map_customers:
@@ -870,6 +1530,12 @@ class exporter(object):
                     continue
 
             self.map_customers[i["id"]] = name
+        for i in self.export_removals("customers", "customer"):
+            if first:
+                yield "<!-- customers -->\n"
+                yield "<customers>\n"
+                first = False
+            yield i
         if not first:
             yield "</customers>\n"
 
@@ -882,12 +1548,21 @@ class exporter(object):
         res.partner.id res.partner.name -> supplier.name
         """
         first = True
-        for i in self.map_customers.values():
+        for i in dict.fromkeys(self.map_customers.values()):
+            self.track("suppliers", i, i)
+            if i not in self.changed_customers:
+                continue
             if first:
                 yield "<!-- suppliers -->\n"
                 yield "<suppliers>\n"
                 first = False
             yield "<supplier name=%s/>\n" % quoteattr(i)
+        for i in self.export_removals("suppliers", "supplier"):
+            if first:
+                yield "<!-- suppliers -->\n"
+                yield "<suppliers>\n"
+                first = False
+            yield i
         if not first:
             yield "</suppliers>\n"
 
@@ -964,21 +1639,10 @@ class exporter(object):
                 first = False
             name = i["name"]
             owner = i["owner"]
-            available = (
-                (
-                    (
-                        0,
-                        "%s %s"
-                        % (i["resource_calendar_id"][1], i["resource_calendar_id"][0]),
-                    )
-                    if i["resource_calendar_id"]
-                    else None
-                )
-                if not self.resources_with_specific_calendars.get(i["resource_id"][0])
-                else (
-                    0,
-                    "calendar for %s" % (i["resource_id"][1],),
-                )
+            available = self.resource_calendars.get(i["resource_id"][0], None) or (
+                "%s %s" % (i["resource_calendar_id"][1], i["resource_calendar_id"][0])
+                if i["resource_calendar_id"]
+                else None
             )
             self.map_workcenters[i["id"]] = name
             yield '<resource name=%s maximum="%s" category="%s" subcategory="%s" efficiency="%s"><location name=%s/>%s%s</resource>\n' % (
@@ -992,7 +1656,7 @@ class exporter(object):
                 i["time_efficiency"],
                 quoteattr(self.mfg_location),
                 ("<owner name=%s/>" % quoteattr(owner[1])) if owner else "",
-                ("<available name=%s/>" % quoteattr(available[1])) if available else "",
+                ("<available name=%s/>" % quoteattr(available)) if available else "",
             )
         if not first:
             yield "</resources>\n"
@@ -1007,7 +1671,7 @@ class exporter(object):
         product.category.parent_id.complete_name -> item.owner_id
         """
         self.categories = {}
-        for i in self.generator.getData(
+        for i in self.generator.getCachedData(
             "product.category",
             search=[],
             fields=[
@@ -1067,7 +1731,8 @@ class exporter(object):
         self.product_template_product = {}
         self.product_templates = {}
         self.routes = {
-            i["id"]: i for i in self.generator.getData("stock.route", fields=["name"])
+            i["id"]: i
+            for i in self.generator.getCachedData("stock.route", fields=["name"])
         }
         self.route_mto = None
         for k, v in self.routes.items():
@@ -1085,6 +1750,7 @@ class exporter(object):
                 "categ_id",
                 "product_variant_ids",
                 "route_ids",
+                "write_date",
             ]
             + (
                 [
@@ -1099,30 +1765,11 @@ class exporter(object):
         # Check if we can use short names
         # To use short names, the internal reference (or the name when no internal reference is defined)
         # needs to be unique
-        use_short_names = True
-
-        self.generator.env.cr.execute(
-            """
-            select count(*) from
-            (
-            select coalesce(product_product.default_code,
-            product_template.name->>%s,
-            product_template.name->>'en_US'), count(*)
-            from product_product
-            inner join product_template on product_product.product_tmpl_id = product_template.id
-            where product_template.type not in ('service', 'consu')
-            group by coalesce(product_product.default_code,
-            product_template.name->>%s,
-            product_template.name->>'en_US')
-            having count(*) > 1
-            ) t
-                """,
-            (self.language, self.language),
+        use_short_names = (
+            self.generator.env["frepple.product.naming"]
+            .sudo()
+            .use_short_names(self.language)
         )
-        for i in self.generator.env.cr.fetchall():
-            if i[0] > 0:
-                use_short_names = False
-                break
 
         supplierinfo_fields = [
             "product_tmpl_id",
@@ -1135,12 +1782,14 @@ class exporter(object):
             "batching_window",
             "sequence",
             "is_subcontractor",
+            "write_date",
         ]
         try:
             tmp = self.generator.getData(
                 "product.supplierinfo",
                 fields=supplierinfo_fields,
-                search=[("product_tmpl_id", "!=", False)],
+                search=[("product_tmpl_id", "!=", False)]
+                + self.get_window_domain(end_field="date_end", dates=True),
             )
         except Exception:
             # subcontracting module not installed
@@ -1148,7 +1797,8 @@ class exporter(object):
             tmp = self.generator.getData(
                 "product.supplierinfo",
                 fields=supplierinfo_fields,
-                search=[("product_tmpl_id", "!=", False)],
+                search=[("product_tmpl_id", "!=", False)]
+                + self.get_window_domain(end_field="date_end", dates=True),
             )
         itemsuppliers = {}
         for i in tmp:
@@ -1170,6 +1820,7 @@ class exporter(object):
                 "weight",
                 "product_template_attribute_value_ids",
                 "price_extra",
+                "write_date",
             ],
         ):
             if first:
@@ -1179,6 +1830,12 @@ class exporter(object):
             if i["product_tmpl_id"][0] not in self.product_templates:
                 continue
             tmpl = self.product_templates[i["product_tmpl_id"][0]]
+            changed = self.is_changed(
+                "items",
+                i["write_date"],
+                tmpl["write_date"],
+                *(sup["write_date"] for sup in itemsuppliers.get(tmpl["id"], [])),
+            )
             if i["code"]:
                 name = (
                     (("[%s] %s" % (i["code"], i["name"]))[:300])
@@ -1204,47 +1861,53 @@ class exporter(object):
             }
             self.product_product[i["id"]] = prod_obj
             self.product_template_product[i["product_tmpl_id"][0]] = prod_obj
+            if self.is_renamed("items", i["id"], name):
+                changed = True
+            self.track("items", i["id"], name)
 
             # For make-to-order items the next line needs to XML snippet ' type="item_mto"'.
-            yield '<item name=%s %s uom=%s volume="%f" weight="%f" cost="%f" subcategory="%s,%s"%s%s>%s\n' % (
-                quoteattr(name),
-                (
-                    ("description=%s" % (quoteattr(description),))
-                    if use_short_names
-                    else ""
-                ),
-                quoteattr(tmpl["uom_id"][1]) if tmpl["uom_id"] else "",
-                i["volume"] or 0,
-                i["weight"] or 0,
-                max(
-                    0, (tmpl["list_price"] + (i["price_extra"] or 0)) or 0
-                )  # Option 1:  Map "sales price" to frepple
-                #  max(0, tmpl["standard_price"]) or 0)  # Option 2: Map the "cost" to frepple
-                / self.convert_qty_uom(1.0, tmpl["uom_id"], i["product_tmpl_id"][0]),
-                tmpl["uom_id"][0],
-                i["id"],
-                ' type="item_mto"' if self.route_mto in tmpl["route_ids"] else "",
-                (
+            if changed:
+                yield '<item name=%s %s uom=%s volume="%f" weight="%f" cost="%f" subcategory="%s,%s"%s%s>%s\n' % (
+                    quoteattr(name),
                     (
-                        ' shelflife="%s"'
-                        % self.convert_float_time(tmpl["expiration_time"])
-                    )
-                    if self.has_expiry
-                    and tmpl["expiration_time"]
-                    and tmpl["expiration_time"] > 0
-                    else ""
-                ),
-                (
+                        ("description=%s" % (quoteattr(description),))
+                        if use_short_names
+                        else ""
+                    ),
+                    quoteattr(tmpl["uom_id"][1]) if tmpl["uom_id"] else "",
+                    i["volume"] or 0,
+                    i["weight"] or 0,
+                    max(
+                        0, (tmpl["list_price"] + (i["price_extra"] or 0)) or 0
+                    )  # Option 1:  Map "sales price" to frepple
+                    #  max(0, tmpl["standard_price"]) or 0)  # Option 2: Map the "cost" to frepple
+                    / self.convert_qty_uom(
+                        1.0, tmpl["uom_id"], i["product_tmpl_id"][0]
+                    ),
+                    tmpl["uom_id"][0],
+                    i["id"],
+                    ' type="item_mto"' if self.route_mto in tmpl["route_ids"] else "",
                     (
-                        "<owner name=%s/>"
-                        % quoteattr(
-                            self.categories[tmpl["categ_id"][0]]["complete_name"]
+                        (
+                            ' shelflife="%s"'
+                            % self.convert_float_time(tmpl["expiration_time"])
                         )
-                    )
-                    if tmpl["categ_id"] and tmpl["categ_id"][0] in self.categories
-                    else ""
-                ),
-            )
+                        if self.has_expiry
+                        and tmpl["expiration_time"]
+                        and tmpl["expiration_time"] > 0
+                        else ""
+                    ),
+                    (
+                        (
+                            "<owner name=%s/>"
+                            % quoteattr(
+                                self.categories[tmpl["categ_id"][0]]["complete_name"]
+                            )
+                        )
+                        if tmpl["categ_id"] and tmpl["categ_id"][0] in self.categories
+                        else ""
+                    ),
+                )
             # Export suppliers for the item, if the item is allowed to be purchased
             if tmpl["purchase_ok"]:
                 suppliers = {}
@@ -1303,7 +1966,7 @@ class exporter(object):
                             "price": max(0, sup["price"]),
                             "date_end": sup["date_end"],
                         }
-                if suppliers:
+                if suppliers and changed:
                     yield "<itemsuppliers>\n"
                     for k, v in suppliers.items():
                         yield '<itemsupplier leadtime="P%dD" priority="%s" batchwindow="P%dD" size_minimum="%f" cost="%f"%s%s><supplier name=%s/></itemsupplier>\n' % (
@@ -1327,7 +1990,14 @@ class exporter(object):
                             quoteattr(k[0]),
                         )
                     yield "</itemsuppliers>\n"
-            yield "</item>\n"
+            if changed:
+                yield "</item>\n"
+        for i in self.export_removals("items", "item"):
+            if first:
+                yield "<!-- products -->\n"
+                yield "<items>\n"
+                first = False
+            yield i
         if not first:
             yield "</items>\n"
 
@@ -1388,9 +2058,19 @@ class exporter(object):
             i["id"]: i for i in self.generator.getData("mrp.secondary.workcenter")
         }
 
-        # Loop over all bom records
-        for i in self.generator.getData(
+        # Read all bom records
+        boms = self.generator.getData(
             "mrp.bom",
+            search=self.delta_search(
+                "boms",
+                [],
+                (
+                    "write_date",
+                    "bom_line_ids.write_date",
+                    "operation_ids.write_date",
+                    "product_tmpl_id.write_date",
+                ),
+            ),
             fields=[
                 "product_qty",
                 "product_uom_id",
@@ -1403,7 +2083,55 @@ class exporter(object):
                 "sequence",
                 "code",
             ],
+        )
+
+        # Read the lines and byproducts of all boms at once, indexed by bom.
+        # The attribute values of the lines are converted to sets for quick
+        # checks of the variants a line applies to.
+        bom_lines = {}
+        line_ids = [k for i in boms for k in i["bom_line_ids"]]
+        for j in (
+            self.generator.getData(
+                "mrp.bom.line",
+                ids=line_ids,
+                fields=[
+                    "bom_id",
+                    "product_qty",
+                    "product_uom_id",
+                    "product_id",
+                    "operation_id",
+                    "bom_product_template_attribute_value_ids",
+                ],
+            )
+            if line_ids
+            else []
         ):
+            if not j["bom_id"]:
+                continue
+            j["attribute_values"] = set(j["bom_product_template_attribute_value_ids"])
+            bom_lines.setdefault(j["bom_id"][0], []).append(j)
+        sub_product_ids = [k for i in boms for k in i.get("sub_products", None) or []]
+        sub_products = {
+            j["id"]: j
+            for j in (
+                self.generator.getData(
+                    "mrp.subproduct",
+                    ids=sub_product_ids,
+                    fields=[
+                        "product_id",
+                        "product_qty",
+                        "product_uom",
+                        "subproduct_type",
+                    ],
+                )
+                if sub_product_ids
+                else []
+            )
+        }
+        variant_attribute_values = {}
+
+        # Loop over all bom records
+        for i in boms:
             # Determine the location
             location = self.mfg_location
 
@@ -1434,6 +2162,11 @@ class exporter(object):
                 if not product_buf:
                     logger.warning("Skipping %s" % i["product_tmpl_id"][0])
                     continue
+                if product_id not in variant_attribute_values:
+                    variant_attribute_values[product_id] = set(
+                        product_buf["product_template_attribute_value_ids"]
+                    )
+                product_attribute_values = variant_attribute_values[product_id]
 
                 for subcontractor in subcontractors:
                     # Build operation. The operation can either be a summary operation or a detailed
@@ -1452,6 +2185,7 @@ class exporter(object):
                             product_buf["name"][: 300 - len(suffix)],
                             suffix,
                         )
+                    self.track("boms", i["id"], operation)
                     if (
                         not self.manage_work_orders
                         or subcontractor
@@ -1517,25 +2251,12 @@ class exporter(object):
                         # we sum up all quantities in a single flow. We assume all of them
                         # have the same effectivity.
                         fl = {}
-                        for j in self.generator.getData(
-                            "mrp.bom.line",
-                            ids=i["bom_line_ids"],
-                            fields=[
-                                "product_qty",
-                                "product_uom_id",
-                                "product_id",
-                                "operation_id",
-                                "bom_product_template_attribute_value_ids",
-                            ],
-                        ):
+                        for j in bom_lines.get(i["id"], []):
                             # check if this BOM line applies to this variant
-                            if len(
-                                j["bom_product_template_attribute_value_ids"]
-                            ) > 0 and not all(
-                                elem in j["bom_product_template_attribute_value_ids"]
-                                for elem in product_buf[
-                                    "product_template_attribute_value_ids"
-                                ]
+                            if (
+                                j["attribute_values"]
+                                and not product_attribute_values
+                                <= j["attribute_values"]
                             ):
                                 continue
                             product = self.product_product.get(j["product_id"][0], None)
@@ -1565,16 +2286,7 @@ class exporter(object):
 
                         # Build byproduct flows
                         if i.get("sub_products", None):
-                            for j in self.generator.getData(
-                                "mrp.subproduct",
-                                ids=i["sub_products"],
-                                fields=[
-                                    "product_id",
-                                    "product_qty",
-                                    "product_uom",
-                                    "subproduct_type",
-                                ],
-                            ):
+                            for j in (sub_products[k] for k in i["sub_products"]):
                                 product = self.product_product.get(
                                     j["product_id"][0], None
                                 )
@@ -1687,26 +2399,12 @@ class exporter(object):
                         yield "<suboperations>"
 
                         fl = {}
-                        for j in self.generator.getData(
-                            "mrp.bom.line",
-                            ids=i["bom_line_ids"],
-                            fields=[
-                                "product_qty",
-                                "product_uom_id",
-                                "product_id",
-                                "operation_id",
-                                "bom_product_template_attribute_value_ids",
-                            ],
-                        ):
+                        for j in bom_lines.get(i["id"], []):
                             # check if this BOM line applies to this variant
-                            if len(
-                                j["bom_product_template_attribute_value_ids"]
-                            ) > 0 and not all(
-                                elem
-                                in product_buf["product_template_attribute_value_ids"]
-                                for elem in j[
-                                    "bom_product_template_attribute_value_ids"
-                                ]
+                            if (
+                                j["attribute_values"]
+                                and not j["attribute_values"]
+                                <= product_attribute_values
                             ):
                                 continue
                             product = self.product_product.get(j["product_id"][0], None)
@@ -1735,7 +2433,7 @@ class exporter(object):
                                     )
                                 ]["qty"] += qty
                             else:
-                                j["qty"] = qty
+                                # Copy, because the line is shared between variants
                                 fl[
                                     (
                                         j["product_id"][0],
@@ -1745,7 +2443,7 @@ class exporter(object):
                                             else None
                                         ),
                                     )
-                                ] = j
+                                ] = dict(j, qty=qty)
 
                         steplist = mrp_routing_workcenters[i["id"]]
                         counter = 0
@@ -1861,6 +2559,14 @@ class exporter(object):
                             yield "</operation></suboperation>\n"
                         yield "</suboperations>\n"
                     yield "</operation>\n"
+        yield from self.export_removals(
+            "boms",
+            "operation",
+            alive_ids=(
+                self.generator.getIds("mrp.bom") if self.sync_since("boms") else None
+            ),
+            changed_ids=[i["id"] for i in boms],
+        )
         yield "</operations>\n"
 
     def export_salesorders(self):
@@ -1891,9 +2597,11 @@ class exporter(object):
         (if sale.order.picking_policy = 'one' then same as demand.quantity else 1) -> demand.minshipment
         """
         # Get all sales order lines
+        # In incremental mode the delta argument is superseded by the write date
+        # of the previous incremental export.
         search = (
             [("product_id", "!=", False)]
-            if self.delta >= 999
+            if self.delta >= 999 or self.incremental
             else [
                 ("product_id", "!=", False),
                 (
@@ -1903,9 +2611,27 @@ class exporter(object):
                 ),
             ]
         )
+        if self.history_start:
+            # Orders before the planning window are history we don't need, unless
+            # they still have open deliveries. Odoo has no done state for
+            # sales orders: delivered orders stay in the sale state.
+            search = search + [
+                "|",
+                (
+                    "order_id.date_order",
+                    ">=",
+                    self.history_start.strftime("%Y-%m-%d %H:%M:%S"),
+                ),
+                ("move_ids.state", "not in", ("done", "cancel")),
+            ]
+        search = search + self.page_domain("sales orders")
         so_line = self.generator.getData(
             "sale.order.line",
-            search=search,
+            search=self.delta_search(
+                "salesorders",
+                search,
+                ("write_date", "order_id.write_date", "move_ids.write_date"),
+            ),
             fields=[
                 "qty_delivered",
                 "state",
@@ -1920,9 +2646,9 @@ class exporter(object):
         # Get all sales orders
         so = {
             i["id"]: i
-            for i in self.generator.getData(
+            for i in self.readByIds(
                 "sale.order",
-                ids=[j["order_id"][0] for j in so_line],
+                {j["order_id"][0] for j in so_line},
                 fields=[
                     "state",
                     "partner_id",
@@ -1934,45 +2660,8 @@ class exporter(object):
             )
         }
 
-        # Get all move ids
-        # We only read the open ones
-
-        stock_moves_dict = {
-            i["id"]: i
-            for i in self.generator.getData(
-                "stock.move",
-                search=[
-                    (
-                        "state",
-                        "in",
-                        ["waiting", "partially_available", "assigned", "confirmed"],
-                    )
-                ],
-                fields=[
-                    "id",
-                    "move_orig_ids",
-                    "product_id",
-                    "date",
-                    "quantity",
-                    "procure_method",
-                    "product_uom_qty",
-                    "product_uom",
-                    "state",
-                ],
-            )
-        }
-
-        def getReservedQuantity(stock_move_id):
-            reserved_quantity = 0
-            if stock_move_id in stock_moves_dict:
-                mv = stock_moves_dict[stock_move_id]
-                reserved_quantity = (
-                    mv["quantity"] if mv["procure_method"] != "make_to_stock" else 0
-                )
-                for i in mv["move_orig_ids"]:
-                    if i != stock_move_id:
-                        reserved_quantity += getReservedQuantity(i)
-            return reserved_quantity
+        # Get the open stock moves of the sales order lines
+        stock_moves_dict = self.getSalesOrderMoves(so_line)
 
         # Generate the demand records
         yield "<!-- sales order lines -->\n"
@@ -2033,13 +2722,14 @@ class exporter(object):
                         )
                         sm = stock_moves_dict.get(mv_id)
                         if sm:
+                            self.track("salesorders", i["id"], sol_name)
                             qty = self.convert_qty_uom(
                                 sm["product_uom_qty"],
                                 sm["product_uom"],
                                 self.product_product[i["product_id"][0]]["template"],
                             )
                             reserved_quantity = (
-                                getReservedQuantity(mv_id)
+                                sm["reserved_quantity"]
                                 if self.respect_reservations
                                 else 0
                             )
@@ -2109,6 +2799,7 @@ class exporter(object):
                 logger.warning("Unknown sales order state: %s." % (state,))
                 continue
 
+            self.track("salesorders", i["id"], name)
             yield (
                 '<demand name=%s batch=%s quantity="%s" due="%s" priority="%s" minshipment="%s" status="%s"><item name=%s/><customer name=%s/><location name=%s/>'
                 # Disable the next line in frepple < 6.25
@@ -2129,8 +2820,116 @@ class exporter(object):
                 quoteattr(i["order_id"][1]),
                 "alltogether" if j["picking_policy"] == "one" else "independent",
             )
+        yield from self.export_removals(
+            "salesorders",
+            "demand",
+            alive_ids=(
+                self.generator.getIds("sale.order.line", search)
+                if self.sync_since("salesorders")
+                else None
+            ),
+            changed_ids=[i["id"] for i in so_line],
+        )
         yield "</demands>\n"
 
+    # States of the stock moves that are still open
+    open_move_states = ("waiting", "partially_available", "assigned", "confirmed")
+
+    def getSalesOrderMoves(self, so_line):
+        """
+        Returns a dictionary with the open stock moves of sales order lines.
+
+        The reserved quantity of a move is its own quantity (unless it is a
+        make-to-stock move) plus the reserved quantity of all open moves that
+        it originates from.
+        """
+        if isinstance(self.generator, Odoo_generator):
+            # SQL query gives much better performance
+            move_ids = list({k for i in so_line for k in i["move_ids"]})
+            if not move_ids:
+                return {}
+            self.generator.env.cr.execute(
+                """
+                with recursive chain (root_id, move_id, path) as (
+                  select id, id, array[id]
+                  from stock_move
+                  where id = any(%s) and state in %s
+                  union all
+                  select chain.root_id, stock_move.id, chain.path || stock_move.id
+                  from chain
+                  inner join stock_move_move_rel
+                    on stock_move_move_rel.move_dest_id = chain.move_id
+                  inner join stock_move
+                    on stock_move.id = stock_move_move_rel.move_orig_id
+                    and stock_move.state in %s
+                  where stock_move.id <> all(chain.path)
+                  )
+                select
+                  root.id, root.date, root.product_uom_qty, root.product_uom,
+                  coalesce(sum(
+                    case when stock_move.procure_method != 'make_to_stock'
+                    then stock_move.quantity else 0 end
+                    ), 0)
+                from chain
+                inner join stock_move on stock_move.id = chain.move_id
+                inner join stock_move root on root.id = chain.root_id
+                group by root.id
+                """,
+                (move_ids, self.open_move_states, self.open_move_states),
+            )
+            return {
+                i[0]: {
+                    "id": i[0],
+                    "date": i[1],
+                    "product_uom_qty": i[2],
+                    "product_uom": i[3],
+                    "reserved_quantity": i[4],
+                }
+                for i in self.generator.env.cr.fetchall()
+            }
+
+        # We only read the open ones
+        stock_moves_dict = {
+            i["id"]: i
+            for i in self.generator.getData(
+                "stock.move",
+                search=[("state", "in", list(self.open_move_states))],
+                fields=[
+                    "id",
+                    "move_orig_ids",
+                    "product_id",
+                    "date",
+                    "quantity",
+                    "procure_method",
+                    "product_uom_qty",
+                    "product_uom",
+                    "state",
+                ],
+            )
+        }
+
+        def getReservedQuantity(stock_move_id):
+            reserved_quantity = 0
+            if stock_move_id in stock_moves_dict:
+                mv = stock_moves_dict[stock_move_id]
+                reserved_quantity = (
+                    mv["quantity"] if mv["procure_method"] != "make_to_stock" else 0
+                )
+                for i in mv["move_orig_ids"]:
+                    if i != stock_move_id:
+                        reserved_quantity += getReservedQuantity(i)
+            return reserved_quantity
+
+        result = {}
+        for i in so_line:
+            for mv_id in i["move_ids"]:
+                if mv_id in stock_moves_dict and mv_id not in result:
+                    result[mv_id] = dict(
+                        stock_moves_dict[mv_id],
+                        reserved_quantity=getReservedQuantity(mv_id),
+                    )
+        return result
+
     def export_forecasts(self):
         """
         IMPORTANT:
@@ -2163,6 +2962,93 @@ class exporter(object):
             )
         yield "</demands>\n"
 
+    def get_purchaseorder_domain(self):
+        """
+        Returns the search domain selecting the open purchase order lines.
+        """
+        return [
+            "|",
+            (
+                "order_id.state",
+                "not in",
+                # Comment out on of the following alternative approaches:
+                # Alternative I: don't send RFQs to frepple because that supply isn't certain to be available yet.
+                ("draft", "sent", "bid", "to approve", "confirmed", "cancel"),
+                # Alternative II: send RFQs to frepple to avoid that the same purchasing proposal is generated again by frepple.
+                # ("bid", "confirmed", "cancel"),
+            ),
+            ("order_id.state", "=", False),
+            "|",
+            ("order_id.receipt_status", "!=", "full"),
+            ("order_id.receipt_status", "=", False),
+        ]
+
+    def get_subcontracting_mo_po_mapping(self):
+        """
+        Returns the reference of the subcontracting purchase order line of the
+        manufacturing orders of all open subcontracting moves.
+
+        The purchase orders section builds the same mapping, but in an incremental
+        or paged export it only reads a part of the purchase orders.
+        """
+        mapping = {}
+        if not self.has_subcontracting:
+            return mapping
+        moves = self.generator.getData(
+            "stock.move",
+            search=[
+                ("is_subcontract", "=", True),
+                ("purchase_line_id", "!=", False),
+                ("product_id", "!=", False),
+                ("location_dest_id", "!=", False),
+                ("state", "not in", ("draft", "cancel", "done")),
+            ]
+            + [
+                t if isinstance(t, str) else ("purchase_line_id.%s" % t[0],) + t[1:]
+                for t in self.get_purchaseorder_domain()
+            ],
+            fields=["purchase_line_id", "picking_id", "move_orig_ids"],
+        )
+        po_line = {
+            i["id"]: i
+            for i in self.readByIds(
+                "purchase.order.line",
+                {mv["purchase_line_id"][0] for mv in moves},
+                fields=["order_id"],
+            )
+        }
+        po = {
+            i["id"]: i
+            for i in self.readByIds(
+                "purchase.order",
+                {i["order_id"][0] for i in po_line.values() if i["order_id"]},
+                fields=["name"],
+            )
+        }
+        productions = {
+            i["id"]: i["production_id"]
+            for i in self.readByIds(
+                "stock.move",
+                {k for mv in moves for k in mv["move_orig_ids"]},
+                fields=["production_id"],
+            )
+        }
+        for mv in moves:
+            line = po_line.get(mv["purchase_line_id"][0], None)
+            j = po.get(line["order_id"][0], None) if line and line["order_id"] else None
+            if not j:
+                continue
+            for k in mv["move_orig_ids"]:
+                production = productions.get(k, None)
+                if production:
+                    mapping[production[0]] = "%s - %s - %s - %s" % (
+                        j["name"],
+                        mv["picking_id"][1] if mv["picking_id"] else False,
+                        mv["id"],
+                        mv["purchase_line_id"][0],
+                    )
+        return mapping
+
     def export_purchaseorders(self):
         """
         Send all open purchase orders to frePPLe, using the purchase.order and
@@ -2171,6 +3057,9 @@ class exporter(object):
         Only purchase order lines in state 'confirmed' are extracted. The state of the
         purchase order header must be "approved".
 
+        All records are read in bulk and joined in memory, rather than navigating
+        the relations of each purchase order line.
+
         Mapping:
         purchase.order.line.product_id -> operationplan.item
         purchase.order.company.mfg_location -> operationplan.location
@@ -2182,193 +3071,368 @@ class exporter(object):
         'confirmed' -> operationplan.status
         """
         self.subcontracting_mo_po_mapping = {}
+        search = self.get_purchaseorder_domain()
+        po_line_fields = [
+            "product_id",
+            "state",
+            "order_id",
+            "move_ids",
+            "move_dest_ids",
+            "product_qty",
+            "qty_received",
+            "product_uom",
+            "date_planned",
+        ]
+        search = search + self.page_domain("purchase orders")
         po_line = {
             i["id"]: i
             for i in self.generator.getData(
                 "purchase.order.line",
+                search=self.delta_search(
+                    "purchaseorders",
+                    search,
+                    ("write_date", "order_id.write_date", "move_ids.write_date"),
+                ),
+                fields=po_line_fields,
+            )
+        }
+
+        # Read the purchase order headers
+        po = {
+            i["id"]: i
+            for i in self.readByIds(
+                "purchase.order",
+                {i["order_id"][0] for i in po_line.values() if i["order_id"]},
+                fields=["name", "date_order", "partner_id", "order_line"],
+            )
+        }
+
+        # Read the stock moves of the purchase order lines
+        move_fields = [
+            "product_id",
+            "purchase_line_id",
+            "location_dest_id",
+            "state",
+            "picking_id",
+            "date",
+            "product_qty",
+            "move_orig_ids",
+            "move_dest_ids",
+        ]
+        if self.has_subcontracting:
+            move_fields.append("is_subcontract")
+        moves = {
+            i["id"]: i
+            for i in self.readByIds(
+                "stock.move",
+                {k for i in po_line.values() for k in i["move_ids"]},
+                fields=move_fields,
+            )
+        }
+
+        # Subcontracting: manufacturing orders linked to the moves
+        for i in self.readByIds(
+            "stock.move",
+            {
+                k
+                for mv in moves.values()
+                if mv.get("is_subcontract", False)
+                for k in mv["move_orig_ids"]
+            },
+            fields=["production_id"],
+        ):
+            moves.setdefault(i["id"], {}).update(production_id=i["production_id"])
+
+        # Resolve archived suppliers with a single query.
+        # They are kept local, because other sections read map_customers
+        # while this one runs in a worker thread.
+        suppliers = {}
+        archived = {
+            j["partner_id"][0]
+            for j in po.values()
+            if j["partner_id"] and j["partner_id"][0] not in self.map_customers
+        }
+        if archived:
+            for sup in self.generator.getData(
+                "res.partner",
                 search=[
+                    ("id", "in", list(archived)),
                     "|",
-                    (
-                        "order_id.state",
-                        "not in",
-                        # Comment out on of the following alternative approaches:
-                        # Alternative I: don't send RFQs to frepple because that supply isn't certain to be available yet.
-                        ("draft", "sent", "bid", "to approve", "confirmed", "cancel"),
-                        # Alternative II: send RFQs to frepple to avoid that the same purchasing proposal is generated again by frepple.
-                        # ("bid", "confirmed", "cancel"),
-                    ),
-                    ("order_id.state", "=", False),
-                    "|",
-                    ("order_id.receipt_status", "!=", "full"),
-                    ("order_id.receipt_status", "=", False),
+                    ("active", "=", True),
+                    ("active", "=", False),
                 ],
-                object=True,
+                fields=["name", "active"],
+            ):
+                suppliers[sup["id"]] = "%s %s%s" % (
+                    sup["name"],
+                    "(archived) " if not sup["active"] else "",
+                    sup["id"],
+                )
+
+        def getSupplier(partner_id):
+            if not partner_id:
+                return None
+            return self.map_customers.get(
+                partner_id[0], suppliers.get(partner_id[0], None)
+            )
+
+        # MTO links: sales order of the destination moves
+        dest_moves = {
+            i["id"]: i
+            for i in self.readByIds(
+                "stock.move",
+                {k for mv in moves.values() for k in mv.get("move_dest_ids", [])}
+                | {k for i in po_line.values() for k in i["move_dest_ids"]},
+                fields=["group_id"],
+            )
+        }
+        groups = {
+            i["id"]: i
+            for i in self.readByIds(
+                "procurement.group",
+                {i["group_id"][0] for i in dest_moves.values() if i["group_id"]},
+                fields=["sale_id"],
             )
         }
 
-        yield "<!-- open purchase orders -->\n"
-        yield "<operationplans>\n"
+        def getMTOSale(move_dest_ids):
+            for k in move_dest_ids:
+                grp = dest_moves.get(k, {}).get("group_id", None)
+                if grp and groups.get(grp[0], {}).get("sale_id", None):
+                    return groups[grp[0]]["sale_id"][1]
+            return None
+
+        # Collect the operationplans to export
+        # The reference, batch, purchase order id, start, end, quantity, item,
+        # location and supplier are stored for each of them.
+        operationplans = []
         for i in po_line.values():
-            if i.move_ids:
+            if i["move_ids"]:
                 # METHOD 1: Use the stock move information rather than the po line
-                for mv in i.move_ids:
+                for mv_id in i["move_ids"]:
+                    mv = moves.get(mv_id, None)
                     if (
-                        not mv.product_id
-                        or not mv.purchase_line_id
-                        or not mv.location_dest_id
-                        or mv.state in ("draft", "cancel", "done")
+                        not mv
+                        or not mv["product_id"]
+                        or not mv["purchase_line_id"]
+                        or not mv["location_dest_id"]
+                        or mv["state"] in ("draft", "cancel", "done")
                     ):
                         continue
-                    j = mv.purchase_line_id.order_id
+                    line = po_line.get(mv["purchase_line_id"][0], i)
+                    j = po.get(line["order_id"][0], None) if line["order_id"] else None
+                    if not j:
+                        continue
                     po_line_reference = "%s - %s - %s - %s" % (
-                        j.name,
-                        mv.picking_id.name,
-                        mv.id,
-                        mv.purchase_line_id.id,
+                        j["name"],
+                        mv["picking_id"][1] if mv["picking_id"] else False,
+                        mv["id"],
+                        mv["purchase_line_id"][0],
                     )
-                    if self.has_subcontracting and mv.is_subcontract:
+                    if self.has_subcontracting and mv["is_subcontract"]:
                         # PO lines on a subcontracting BOM are mapped as a MO in frepple
-                        for k in mv.move_orig_ids:
-                            if k.production_id:
-                                self.subcontracting_mo_po_mapping[
-                                    k.production_id.id
-                                ] = po_line_reference
+                        for k in mv["move_orig_ids"]:
+                            production = moves.get(k, {}).get("production_id", None)
+                            if production:
+                                self.subcontracting_mo_po_mapping[production[0]] = (
+                                    po_line_reference
+                                )
                         continue
-                    item = self.product_product.get(mv.product_id.id, None)
+                    item = self.product_product.get(mv["product_id"][0], None)
                     if not item:
                         continue
 
                     # MTO links
-                    if (
+                    mto = (
                         self.route_mto
                         in self.product_templates[item["template"]]["route_ids"]
-                    ):
-                        mto_so = mv.move_dest_ids.group_id.sale_id
-                        batch = mto_so[0].name if mto_so else None
-                        if not batch:
-                            mto_mo = j._get_mrp_productions()
-                            if mto_mo:
-                                batch = mto_mo[0].display_name
-                    else:
-                        batch = None
+                    )
+                    batch = getMTOSale(mv["move_dest_ids"]) if mto else None
 
-                    location = self.map_locations.get(mv.location_dest_id.id, None)
+                    location = self.map_locations.get(mv["location_dest_id"][0], None)
                     if not location:
                         continue
-                    start = j.date_order
-                    if not isinstance(start, datetime):
-                        start = datetime.fromisoformat(start)
-                    end = mv.date
-                    if not isinstance(end, datetime):
-                        end = datetime.fromisoformat(end)
-                    start = self.formatDateTime(start if start < end else end)
-                    end = self.formatDateTime(end)
-                    qty = mv.product_qty
-                    supplier = self.map_customers.get(j.partner_id.id)
-                    if not supplier:
-                        # supplier is archived :-(
-                        for sup in self.generator.getData(
-                            "res.partner",
-                            search=[
-                                ("id", "=", j.partner_id.id),
-                                "|",
-                                ("active", "=", True),
-                                ("active", "=", False),
-                            ],
-                            fields=["name", "active"],
-                        ):
-                            supplier = "%s %s%s" % (
-                                sup["name"],
-                                "(archived) " if not sup["active"] else "",
-                                sup["id"],
-                            )
-                            self.map_customers[sup["id"]] = supplier
-                            break
+                    supplier = getSupplier(j["partner_id"])
                     if not supplier:
                         continue
+                    qty = mv["product_qty"]
                     if qty >= 0:
-                        yield '<operationplan reference=%s %sordertype="PO" start="%s" end="%s" quantity="%f" status="confirmed">' "<item name=%s/><location name=%s/><supplier name=%s/></operationplan>\n" % (
-                            quoteattr(po_line_reference),
-                            "batch=%s " % quoteattr(batch) if batch else "",
-                            start,
-                            end,
-                            qty,
-                            quoteattr(item["name"]),
-                            quoteattr(location),
-                            quoteattr(supplier),
+                        self.track("purchaseorders", i["id"], po_line_reference)
+                        operationplans.append(
+                            [
+                                po_line_reference,
+                                batch,
+                                j["id"] if mto and not batch else None,
+                                j["date_order"],
+                                mv["date"],
+                                qty,
+                                item,
+                                location,
+                                supplier,
+                            ]
                         )
             else:
                 # METHOD 2: Create purchasing operations from purchase order lines
                 if not i["product_id"] or i["state"] == "cancel":
                     continue
-                item = self.product_product.get(i.product_id.id, None)
-                j = i.order_id
-                if not item:
+                item = self.product_product.get(i["product_id"][0], None)
+                j = po.get(i["order_id"][0], None) if i["order_id"] else None
+                if not item or not j:
                     continue
                 location = self.mfg_location
-                if location and item and i.product_qty > i.qty_received:
-                    start = j.date_order
-                    if not isinstance(start, datetime):
-                        start = datetime.fromisoformat(start)
-                    end = i.date_planned
-                    if not isinstance(end, datetime):
-                        end = datetime.fromisoformat(end)
-                    start = self.formatDateTime(start if start < end else end)
-                    end = self.formatDateTime(end)
+                if location and item and i["product_qty"] > i["qty_received"]:
                     qty = self.convert_qty_uom(
-                        i.product_qty - i.qty_received,
-                        i.product_uom.id,
-                        self.product_product[i.product_id.id]["template"],
+                        i["product_qty"] - i["qty_received"],
+                        i["product_uom"],
+                        item["template"],
                     )
-                    supplier = self.map_customers.get(j.partner_id.id)
-                    if not supplier:
-                        # supplier is archived :-(
-                        for sup in self.generator.getData(
-                            "res.partner",
-                            search=[
-                                ("id", "=", j.partner_id.id),
-                                "|",
-                                ("active", "=", True),
-                                ("active", "=", False),
-                            ],
-                            fields=["name", "active"],
-                        ):
-                            supplier = "%s %s%s" % (
-                                sup["name"],
-                                "(archived) " if not sup["active"] else "",
-                                sup["id"],
-                            )
-                            self.map_customers[sup["id"]] = supplier
-                            break
+                    supplier = getSupplier(j["partner_id"])
                     if not supplier:
                         continue
 
                     # MTO links
-                    if (
+                    mto = (
                         self.route_mto
                         in self.product_templates[item["template"]]["route_ids"]
-                    ):
-                        mto_so = i.move_dest_ids.group_id.sale_id
-                        batch = mto_so[0].name if mto_so else None
-                        if not batch:
-                            mto_mo = j._get_mrp_productions()
-                            if mto_mo:
-                                batch = mto_mo[0].display_name
-                    else:
-                        batch = None
-
-                    yield '<operationplan reference=%s %sordertype="PO" start="%s" end="%s" quantity="%f" status="confirmed">' "<item name=%s/><location name=%s/><supplier name=%s/></operationplan>\n" % (
-                        quoteattr("%s - %s" % (j.name, i.id)),
-                        "batch=%s " % quoteattr(batch) if batch else "",
-                        start,
-                        end,
-                        qty,
-                        quoteattr(item["name"]),
-                        quoteattr(location),
-                        quoteattr(supplier),
                     )
+                    batch = getMTOSale(i["move_dest_ids"]) if mto else None
+
+                    reference = "%s - %s" % (j["name"], i["id"])
+                    self.track("purchaseorders", i["id"], reference)
+                    operationplans.append(
+                        [
+                            reference,
+                            batch,
+                            j["id"] if mto and not batch else None,
+                            j["date_order"],
+                            i["date_planned"],
+                            qty,
+                            item,
+                            location,
+                            supplier,
+                        ]
+                    )
+
+        # MTO links without a sales order refer to the manufacturing order
+        # of the purchase order.
+        mto_productions = self.getPurchaseProductions(
+            {op[2] for op in operationplans if op[2]}, po
+        )
+
+        yield "<!-- open purchase orders -->\n"
+        yield "<operationplans>\n"
+        for (
+            reference,
+            batch,
+            po_id,
+            start,
+            end,
+            qty,
+            item,
+            location,
+            supplier,
+        ) in operationplans:
+            if po_id:
+                batch = mto_productions.get(po_id, None)
+            if not isinstance(start, datetime):
+                start = datetime.fromisoformat(start)
+            if not isinstance(end, datetime):
+                end = datetime.fromisoformat(end)
+            yield '<operationplan reference=%s %sordertype="PO" start="%s" end="%s" quantity="%f" status="confirmed">' "<item name=%s/><location name=%s/><supplier name=%s/></operationplan>\n" % (
+                quoteattr(reference),
+                "batch=%s " % quoteattr(batch) if batch else "",
+                self.formatDateTime(start if start < end else end),
+                self.formatDateTime(end),
+                qty,
+                quoteattr(item["name"]),
+                quoteattr(location),
+                quoteattr(supplier),
+            )
+        yield from self.export_removals(
+            "purchaseorders",
+            "operationplan",
+            alive_ids=(
+                self.generator.getIds("purchase.order.line", search)
+                if self.sync_since("purchaseorders")
+                else None
+            ),
+            changed_ids=po_line.keys(),
+            attribute="reference",
+        )
         yield "</operationplans>\n"
 
+    def getPurchaseProductions(self, po_ids, po):
+        """
+        Returns a dictionary with the name of the first manufacturing order
+        linked to each purchase order. This is the set-based equivalent of
+        the method _get_mrp_productions of the purchase order.
+        """
+        if not po_ids:
+            return {}
+        lines = {
+            i["id"]: i
+            for i in self.readByIds(
+                "purchase.order.line",
+                {k for p in po_ids for k in po[p]["order_line"]},
+                fields=["move_ids", "move_dest_ids"],
+            )
+        }
+        moves = {
+            i["id"]: i
+            for i in self.readByIds(
+                "stock.move",
+                {k for i in lines.values() for k in i["move_ids"]},
+                fields=["move_dest_ids"],
+            )
+        }
+        dest_moves = {
+            i["id"]: i
+            for i in self.readByIds(
+                "stock.move",
+                {k for i in lines.values() for k in i["move_dest_ids"]}
+                | {k for i in moves.values() for k in i["move_dest_ids"]},
+                fields=["group_id"],
+            )
+        }
+        groups = {
+            i["id"]: i
+            for i in self.readByIds(
+                "procurement.group",
+                {i["group_id"][0] for i in dest_moves.values() if i["group_id"]},
+                fields=["mrp_production_ids"],
+            )
+        }
+        productions = {
+            i["id"]: i["name"]
+            for i in self.readByIds(
+                "mrp.production",
+                {k for i in groups.values() for k in i["mrp_production_ids"]},
+                fields=["name"],
+            )
+        }
+        result = {}
+        for p in po_ids:
+            # Destination moves of the lines first, then those of their moves
+            dest = [
+                k for l in po[p]["order_line"] for k in lines[l]["move_dest_ids"]
+            ] + [
+                k
+                for l in po[p]["order_line"]
+                for m in lines[l]["move_ids"]
+                for k in moves[m]["move_dest_ids"]
+            ]
+            for k in dest:
+                grp = dest_moves[k]["group_id"]
+                if not grp:
+                    continue
+                for mo in groups[grp[0]]["mrp_production_ids"]:
+                    if mo in productions:
+                        result[p] = productions[mo]
+                        break
+                if p in result:
+                    break
+        return result
+
     def export_manufacturingorders(self):
         """
         Extracting work in progress to frePPLe, using the mrp.production model.
@@ -2376,6 +3440,9 @@ class exporter(object):
         We extract manufacturing orders in the states 'in_production' and 'confirmed', and
         which have a bom specified.
 
+        The work orders, time logs, raw material moves, secondary work centers
+        and MTO links of all manufacturing orders are read in bulk first.
+
         Mapping:
         mrp.production.bom_id mrp.production.bom_id.name @ mrp.production.location_dest_id -> operationplan.operation
         convert mrp.production.product_qty and mrp.production.product_uom -> operationplan.quantity
@@ -2385,6 +3452,7 @@ class exporter(object):
         now = datetime.now()
 
         # Retrieve reserved quantities from stock moves
+        reserved_quantity = {}
         if self.respect_reservations:
             # a first call to get all confirmed MO IDs
             confirmed_mos = [
@@ -2397,7 +3465,6 @@ class exporter(object):
                 )
             ]
             # a second call to get the reserved quantities
-            reserved_quantity = {}
             for i in self.generator.getData(
                 "stock.move",
                 search=[
@@ -2413,28 +3480,182 @@ class exporter(object):
                     + i["quantity"]
                 )
 
+        # Option 1: import only the odoo status from "confirmed" onwards
+        search = [("state", "in", ["progress", "confirmed", "to_close"])]
+        # Option 2: Also import draft manufacturing order from odoo (to avoid that frepple reproposes it another time)
+        # search = [("state", "in", ["draft", "progress", "confirmed", "to_close"])]
+        search = search + self.page_domain("manufacturing orders")
+        if self.pages is not None or self.sync_since("purchaseorders"):
+            # The purchase orders section didn't read all subcontracting moves
+            self.subcontracting_mo_po_mapping = self.get_subcontracting_mo_po_mapping()
+        mos = self.generator.getData(
+            "mrp.production",
+            search=self.delta_search(
+                "manufacturingorders",
+                search,
+                (
+                    "write_date",
+                    "workorder_ids.write_date",
+                    "move_raw_ids.write_date",
+                ),
+            ),
+            fields=[
+                "name",
+                "location_dest_id",
+                "picking_type_id",
+                "product_id",
+                "date_start",
+                "qty_producing",
+                "product_qty",
+                "product_uom_id",
+                "procurement_group_id",
+                "workorder_ids",
+                "move_raw_ids",
+            ],
+        )
+
+        # Raw material moves
+        raw_moves = {
+            i["id"]: i
+            for i in self.readByIds(
+                "stock.move",
+                {k for i in mos for k in i["move_raw_ids"]},
+                fields=[
+                    "product_id",
+                    "product_qty",
+                    "quantity",
+                    "product_uom",
+                    "workorder_id",
+                    "operation_id",
+                ],
+            )
+        }
+
+        # Work orders, with their time logs, operations and work centers
+        workorders = {}
+        time_logs = {}
+        operations = {}
+        secondary = {}
+        workcenter_owner = {}
+        if self.manage_work_orders:
+            workorders = {
+                i["id"]: i
+                for i in self.readByIds(
+                    "mrp.workorder",
+                    {k for i in mos for k in i["workorder_ids"]},
+                    fields=[
+                        "display_name",
+                        "duration_expected",
+                        "duration_unit",
+                        "is_user_working",
+                        "time_ids",
+                        "operation_id",
+                        "workcenter_id",
+                        "secondary_workcenters",
+                        "state",
+                        "date_start",
+                        "date_finished",
+                    ],
+                )
+            }
+            time_logs = {
+                i["id"]: i
+                for i in self.readByIds(
+                    "mrp.workcenter.productivity",
+                    {
+                        k
+                        for wo in workorders.values()
+                        if wo["is_user_working"]
+                        for k in wo["time_ids"]
+                    },
+                    fields=["date_start", "date_end"],
+                )
+            }
+            operations = {
+                i["id"]: i
+                for i in self.readByIds(
+                    "mrp.routing.workcenter",
+                    {
+                        wo["operation_id"][0]
+                        for wo in workorders.values()
+                        if wo["operation_id"]
+                    },
+                    fields=["workcenter_id", "secondary_workcenter", "time_cycle"],
+                )
+            }
+            wo_secondary = {
+                i["id"]: i
+                for i in self.readByIds(
+                    "mrp.workorder.secondary.workcenter",
+                    {
+                        k
+                        for wo in workorders.values()
+                        for k in wo["secondary_workcenters"]
+                    },
+                    fields=["workcenter_id"],
+                )
+            }
+            secondary = {
+                i["id"]: i
+                for i in self.readByIds(
+                    "mrp.secondary.workcenter",
+                    {
+                        k
+                        for op in operations.values()
+                        for k in op["secondary_workcenter"]
+                    },
+                    fields=["workcenter_id", "skill", "search_mode", "duration"],
+                )
+            }
+            for wo in workorders.values():
+                wo["secondary_workcenters"] = [
+                    wo_secondary[k]
+                    for k in wo["secondary_workcenters"]
+                    if k in wo_secondary
+                ]
+            workcenter_owner = {
+                i["id"]: i["owner"][0] if i["owner"] else None
+                for i in self.readByIds(
+                    "mrp.workcenter",
+                    {
+                        wo["workcenter_id"][0]
+                        for wo in workorders.values()
+                        if wo["workcenter_id"]
+                    }
+                    | {
+                        sec["workcenter_id"][0]
+                        for wo in workorders.values()
+                        for sec in wo["secondary_workcenters"]
+                        if sec["workcenter_id"]
+                    },
+                    fields=["owner"],
+                )
+            }
+
+        batches = self.getProductionBatches(mos)
+
         yield "<!-- manufacturing orders in progress -->\n"
         yield "<operationplans>\n"
-        for i in self.generator.getData(
-            "mrp.production",
-            # Option 1: import only the odoo status from "confirmed" onwards
-            search=[("state", "in", ["progress", "confirmed", "to_close"])],
-            # Option 2: Also import draft manufacturing order from odoo (to avoid that frepple reproposes it another time)
-            # search=[("state", "in", ["draft", "progress", "confirmed", "to_close"])],
-            object=True,
-        ):
+        for i in mos:
             # Filter out irrelevant manufacturing orders
-            location = self.map_locations.get(i.location_dest_id.id, None)
-            if not location and i.picking_type_id:
+            name = i["name"]
+            location = (
+                self.map_locations.get(i["location_dest_id"][0], None)
+                if i["location_dest_id"]
+                else None
+            )
+            if not location and i["picking_type_id"]:
                 # For subcontracting MO we find the warehouse on the operation type
-                operation_type = self.operation_types.get(i.picking_type_id.id, None)
+                operation_type = self.operation_types.get(i["picking_type_id"][0], None)
                 if operation_type:
                     location = operation_type["warehouse_id"]
                     if location:
-                        code = self.subcontracting_mo_po_mapping.get(i.id, None)
-                        if code:
-                            i.name = code
-            item = self.product_product.get(i.product_id.id, None)
+                        name = self.subcontracting_mo_po_mapping.get(i["id"], name)
+            item = (
+                self.product_product.get(i["product_id"][0], None)
+                if i["product_id"]
+                else None
+            )
             if not item or not location:
                 continue
 
@@ -2443,36 +3664,28 @@ class exporter(object):
             # materials.
             # To reflect this flexibility we need a frepple operation specific
             # to each manufacturing order.
-            operation = i.name
+            operation = name
             try:
-                startdate = self.formatDateTime(
-                    i.date_start if i.date_start else i.date_planned_start
-                )
-                # enddate = self.formatDateTime(i.date_planned_finished)
+                startdate = self.formatDateTime(i["date_start"])
+                # enddate = self.formatDateTime(i["date_planned_finished"])
             except Exception:
                 continue
             qty = self.convert_qty_uom(
-                i.qty_producing if i.qty_producing else i.product_qty,
-                i.product_uom_id.id,
-                self.product_product[i.product_id.id]["template"],
+                i["qty_producing"] if i["qty_producing"] else i["product_qty"],
+                i["product_uom_id"],
+                item["template"],
             )
             if not qty:
                 continue
 
             # Get MTO link
-            mto_so = (
-                i.procurement_group_id.mrp_production_ids.move_dest_ids.group_id.sale_id
-            )
-            if mto_so:
-                batch = mto_so[0].name
-            else:
-                mto_mo = i._get_sources()
-                batch = mto_mo[0].display_name if mto_mo else i.name
+            batch = batches.get(i["id"], None) or name
 
             # Create a record for the MO
             # Option 1: compute MO end date based on the start date
+            self.track("manufacturingorders", i["id"], name)
             yield '<operationplan type="MO" reference=%s batch=%s start="%s" quantity="%s" status="%s">\n' % (
-                quoteattr(i.name),
+                quoteattr(name),
                 quoteattr(batch),
                 startdate,
                 qty,
@@ -2491,16 +3704,10 @@ class exporter(object):
             # )
 
             # Collect work order info
-            if self.manage_work_orders:
-                wo_list = i.workorder_ids
-            else:
-                wo_list = []
+            wo_list = [workorders[k] for k in i["workorder_ids"] if k in workorders]
 
             # Collect move info
-            if i.move_raw_ids:
-                mv_list = i.move_raw_ids
-            else:
-                mv_list = []
+            mv_list = [raw_moves[k] for k in i["move_raw_ids"] if k in raw_moves]
 
             if not wo_list:
                 # There are no workorders on the manufacturing order
@@ -2512,23 +3719,25 @@ class exporter(object):
                 # dictionary needed as BOM in Odoo might have multiple lines with the same product
                 operation_materials = {}
                 for mv in mv_list:
-                    consumed_item = self.product_product.get(mv.product_id.id, None)
+                    if not mv["product_id"]:
+                        continue
+                    consumed_item = self.product_product.get(mv["product_id"][0], None)
                     if not consumed_item:
                         continue
                     qty_flow = self.convert_qty_uom(
                         max(
                             0,
-                            mv.product_qty
-                            - (mv.quantity if self.respect_reservations else 0),
+                            mv["product_qty"]
+                            - (mv["quantity"] if self.respect_reservations else 0),
                         ),
-                        mv.product_uom.id,
+                        mv["product_uom"],
                         consumed_item["template"],
                     )
                     # subtract the reserved quantity if product is twice in the BOM
-                    reserved_quantity[(i["name"], mv.product_id.id)] = max(
+                    reserved_quantity[(name, mv["product_id"][0])] = max(
                         0,
-                        reserved_quantity.get((i["name"], mv.product_id.id), 0)
-                        - mv.product_qty,
+                        reserved_quantity.get((name, mv["product_id"][0]), 0)
+                        - mv["product_qty"],
                     )
                     if qty_flow > 0:
                         operation_materials[consumed_item["name"]] = (
@@ -2555,22 +3764,31 @@ class exporter(object):
                 idx = 10
                 first_wo = True
                 for wo in wo_list:
-                    suboperation = wo.display_name
+                    suboperation = wo["display_name"]
                     if len(suboperation) > 300:
                         suboperation = suboperation[0:300]
+                    wo_operation = (
+                        operations.get(wo["operation_id"][0], None)
+                        if wo["operation_id"]
+                        else None
+                    )
+                    wo_workcenter = (
+                        wo["workcenter_id"][0] if wo["workcenter_id"] else None
+                    )
 
                     # Get remaining duration of the WO
-                    time_left = wo.duration_expected - wo.duration_unit
-                    if wo.is_user_working and wo.time_ids:
+                    time_left = wo["duration_expected"] - wo["duration_unit"]
+                    if wo["is_user_working"]:
                         # The WO is currently being worked on
-                        for tm in wo.time_ids:
-                            if tm.date_start and not tm.date_end:
+                        for k in wo["time_ids"]:
+                            tm = time_logs.get(k, None)
+                            if tm and tm["date_start"] and not tm["date_end"]:
                                 time_left -= round(
-                                    (now - tm.date_start).total_seconds() / 60
+                                    (now - tm["date_start"]).total_seconds() / 60
                                 )
 
                     yield '<suboperation><operation name=%s priority="%s" type="operation_fixed_time" duration="%s"><location name=%s/><flows>' % (
-                        quoteattr("%s - %s" % (suboperation, wo.id)),
+                        quoteattr("%s - %s" % (suboperation, wo["id"])),
                         idx,
                         self.convert_float_time(
                             max(time_left, 1),  # Miniminum 1 minute remaining :-)
@@ -2579,10 +3797,10 @@ class exporter(object):
                         quoteattr(location),
                     )
                     idx += 10
-                    # dictionary needed as BOM in Odoo might have multiple lines with the same product
-                    operation_materials = {}
                     for mv in mv_list:
-                        item = self.product_product.get(mv.product_id.id, None)
+                        if not mv["product_id"]:
+                            continue
+                        item = self.product_product.get(mv["product_id"][0], None)
                         if not item:
                             continue
 
@@ -2593,8 +3811,8 @@ class exporter(object):
                         # In frePPLe we want to consume them in the *FIRST* work order
                         # instead. This is a much more correct & realistic representation
                         # from a planning point of view.
-                        if mv.workorder_id and mv.operation_id:
-                            if mv.workorder_id.id != wo.id:
+                        if mv["workorder_id"] and mv["operation_id"]:
+                            if mv["workorder_id"][0] != wo["id"]:
                                 continue
                         elif not first_wo:
                             continue
@@ -2602,16 +3820,16 @@ class exporter(object):
                         qty_flow = self.convert_qty_uom(
                             max(
                                 0,
-                                mv.product_qty
-                                - (mv.quantity if self.respect_reservations else 0),
+                                mv["product_qty"]
+                                - (mv["quantity"] if self.respect_reservations else 0),
                             ),
-                            mv.product_uom.id,
+                            mv["product_uom"],
                             item["template"],
                         )
                         # subtract the reserved quantity if product is twice in the BOM
-                        reserved_quantity[(i["name"], mv["product_id"][0])] = max(
+                        reserved_quantity[(name, mv["product_id"][0])] = max(
                             0,
-                            reserved_quantity.get((i["name"], mv["product_id"][0]), 0)
+                            reserved_quantity.get((name, mv["product_id"][0]), 0)
                             - mv["product_qty"],
                         )
                         if qty_flow > 0:
@@ -2620,55 +3838,69 @@ class exporter(object):
                                 quoteattr(item["name"]),
                             )
                     yield "</flows>"
+                    op_workcenter = (
+                        wo_operation["workcenter_id"][0]
+                        if wo_operation and wo_operation["workcenter_id"]
+                        else None
+                    )
                     if (
-                        wo.operation_id
-                        and wo.workcenter_id
-                        and wo.operation_id.workcenter_id
-                        and wo.operation_id.workcenter_id.id in self.map_workcenters
-                        and wo.workcenter_id.owner
-                        and wo.workcenter_id.owner == wo.operation_id.workcenter_id
+                        wo_operation
+                        and wo_workcenter
+                        and op_workcenter
+                        and op_workcenter in self.map_workcenters
+                        and workcenter_owner.get(wo_workcenter, None)
+                        and workcenter_owner[wo_workcenter] == op_workcenter
                     ):
                         # Only send a load definition if the bom specifies a parent pool
                         yield "<loads><load><resource name=%s/></load></loads>" % quoteattr(
-                            self.map_workcenters[wo.operation_id.workcenter_id.id]
+                            self.map_workcenters[op_workcenter]
                         )
-                    elif (
-                        wo.workcenter_id and wo.workcenter_id.id in self.map_workcenters
-                    ):
+                    elif wo_workcenter and wo_workcenter in self.map_workcenters:
                         yield "<loads><load><resource name=%s/></load></loads>" % quoteattr(
-                            self.map_workcenters[wo.workcenter_id.id]
+                            self.map_workcenters[wo_workcenter]
                         )
-                    if wo.operation_id:
-                        for wo_sec in wo.secondary_workcenters:
+                    if wo_operation:
+                        for wo_sec in wo["secondary_workcenters"]:
+                            sec_workcenter = (
+                                wo_sec["workcenter_id"][0]
+                                if wo_sec["workcenter_id"]
+                                else None
+                            )
                             if (
-                                not wo_sec.workcenter_id
-                                or wo_sec.workcenter_id.id not in self.map_workcenters
-                                or wo_sec.workcenter_id == wo.workcenter_id
+                                not sec_workcenter
+                                or sec_workcenter not in self.map_workcenters
+                                or sec_workcenter == wo_workcenter
                             ):
                                 continue
-                            for sec in wo.operation_id.secondary_workcenter:
+                            for k in wo_operation["secondary_workcenter"]:
+                                sec = secondary.get(k, None)
                                 if (
-                                    wo_sec.workcenter_id.owner
-                                    and wo_sec.workcenter_id.owner == sec.workcenter_id
+                                    sec
+                                    and workcenter_owner.get(sec_workcenter, None)
+                                    and sec["workcenter_id"]
+                                    and workcenter_owner[sec_workcenter]
+                                    == sec["workcenter_id"][0]
                                 ):
                                     yield '<load quantity="%f" search=%s><resource name=%s/>%s</load>' % (
                                         (
                                             1
-                                            if not sec.duration
-                                            or wo.operation_id.time_cycle == 0
-                                            else sec.duration
-                                            / wo.operation_idtime_cycle
+                                            if not sec["duration"]
+                                            or wo_operation["time_cycle"] == 0
+                                            else sec["duration"]
+                                            / wo_operation["time_cycle"]
                                         ),
-                                        quoteattr(sec.search_mode),
+                                        quoteattr(sec["search_mode"] or ""),
                                         quoteattr(
-                                            self.map_workcenters[sec.workcenter_id.id]
+                                            self.map_workcenters[
+                                                sec["workcenter_id"][0]
+                                            ]
                                         ),
                                         (
                                             (
                                                 "<skill name=%s/>"
-                                                % quoteattr(sec.skill.name)
+                                                % quoteattr(sec["skill"][1])
                                             )
-                                            if sec.skill
+                                            if sec["skill"]
                                             else ""
                                         ),
                                     )
@@ -2681,76 +3913,195 @@ class exporter(object):
                 idx = 0
                 for wo in reversed(wo_list):
                     idx += 1.0
-                    suboperation = wo.display_name
+                    suboperation = wo["display_name"]
                     if len(suboperation) > 300:
                         suboperation = suboperation[0:300]
+                    wo_workcenter = (
+                        wo["workcenter_id"][0] if wo["workcenter_id"] else None
+                    )
 
                     # In the "approved" status, frepple can still reschedule the MO in function of material and capacity
                     # In the "confirmed" status, frepple sees the MO as frozen and unchangeable
-                    if wo.state == "progress":
+                    if wo["state"] == "progress":
                         state = "confirmed"
-                    elif wo.state in ("done", "to_close", "cancel"):
+                    elif wo["state"] in ("done", "to_close", "cancel"):
                         state = "completed"
                     else:
                         state = "approved"
                     try:
-                        if wo.date_finished:
+                        if wo["date_finished"]:
                             wo_date = ' end="%s"' % self.formatDateTime(
-                                wo.date_finished
+                                wo["date_finished"]
                             )
                         else:
-                            if wo.is_user_working:
+                            if wo["is_user_working"]:
                                 dt = now
                             else:
                                 dt = max(
                                     (
-                                        wo.date_start
-                                        if wo.date_start
-                                        else (
-                                            wo.date_start
-                                            if wo.date_start
-                                            else i.date_start
-                                        )
+                                        wo["date_start"]
+                                        if wo["date_start"]
+                                        else i["date_start"]
                                     ),
                                     now,
                                 )
                             wo_date = ' start="%s"' % self.formatDateTime(dt)
                     except Exception:
                         wo_date = ""
+                    self.track("manufacturingorders", i["id"], wo["display_name"])
                     yield '<operationplan type="MO" reference=%s%s quantity="%s" status="%s"><operation name=%s/><owner reference=%s/>' % (
-                        quoteattr(wo.display_name),
+                        quoteattr(wo["display_name"]),
                         wo_date,
                         qty,
                         state,
-                        quoteattr("%s - %s" % (suboperation, wo.id)),
-                        quoteattr(i.name),
+                        quoteattr("%s - %s" % (suboperation, wo["id"])),
+                        quoteattr(name),
                     )
                     if (
-                        wo.operation_id
-                        and wo.workcenter_id
-                        and wo.workcenter_id.id in self.map_workcenters
+                        wo["operation_id"]
+                        and wo_workcenter
+                        and wo_workcenter in self.map_workcenters
                     ):
                         yield "<loadplans><loadplan><resource name=%s/></loadplan></loadplans>" % quoteattr(
-                            self.map_workcenters[wo.workcenter_id.id]
+                            self.map_workcenters[wo_workcenter]
                         )
-                    if wo.secondary_workcenters:
+                    if wo["secondary_workcenters"]:
                         yield "<loadplans>"
-                        for secondary in wo.secondary_workcenters:
+                        for sec in wo["secondary_workcenters"]:
                             if (
-                                secondary.workcenter_id
-                                and secondary.workcenter_id.id in self.map_workcenters
-                                and secondary.workcenter_id != wo.workcenter_id
+                                sec["workcenter_id"]
+                                and sec["workcenter_id"][0] in self.map_workcenters
+                                and sec["workcenter_id"][0] != wo_workcenter
                             ):
                                 yield "<loadplan><resource name=%s/></loadplan>" % (
                                     quoteattr(
-                                        self.map_workcenters[secondary.workcenter_id.id]
+                                        self.map_workcenters[sec["workcenter_id"][0]]
                                     ),
                                 )
                         yield "</loadplans>"
 
                     yield "</operationplan>\n"
+        yield from self.export_removals(
+            "manufacturingorders",
+            "operationplan",
+            alive_ids=(
+                self.generator.getIds("mrp.production", search)
+                if self.sync_since("manufacturingorders")
+                else None
+            ),
+            changed_ids=[i["id"] for i in mos],
+            attribute="reference",
+        )
         yield "</operationplans>\n"
 
+    def getProductionBatches(self, mos):
+        """
+        Returns a dictionary with the MTO batch of each manufacturing order.
+
+        The batch is the sales order linked to the destination moves of the
+        procurement group. When there is none, it is the first source
+        manufacturing order, as computed by the method _get_sources of the
+        manufacturing order.
+        """
+        groups = {
+            i["id"]: i
+            for i in self.readByIds(
+                "procurement.group",
+                {
+                    i["procurement_group_id"][0]
+                    for i in mos
+                    if i["procurement_group_id"]
+                },
+                fields=["mrp_production_ids", "stock_move_ids"],
+            )
+        }
+        group_mos = {
+            i["id"]: i
+            for i in self.readByIds(
+                "mrp.production",
+                {k for g in groups.values() for k in g["mrp_production_ids"]},
+                fields=["move_dest_ids"],
+            )
+        }
+        group_moves = {
+            i["id"]: i
+            for i in self.readByIds(
+                "stock.move",
+                {k for g in groups.values() for k in g["stock_move_ids"]},
+                fields=["move_dest_ids"],
+            )
+        }
+        dest_moves = {
+            i["id"]: i
+            for i in self.readByIds(
+                "stock.move",
+                {k for m in group_mos.values() for k in m["move_dest_ids"]}
+                | {k for m in group_moves.values() for k in m["move_dest_ids"]},
+                fields=["group_id"],
+            )
+        }
+        dest_groups = {
+            i["id"]: i
+            for i in self.readByIds(
+                "procurement.group",
+                {m["group_id"][0] for m in dest_moves.values() if m["group_id"]},
+                fields=["sale_id", "mrp_production_ids"],
+            )
+        }
+        sources = {
+            i["id"]: i
+            for i in self.readByIds(
+                "mrp.production",
+                {k for g in dest_groups.values() for k in g["mrp_production_ids"]}
+                | {i["id"] for i in mos},
+                fields=["display_name", "origin"],
+            )
+        }
+
+        def getGroups(move_ids):
+            # Procurement groups of the destination moves, in order
+            result = []
+            for k in move_ids:
+                grp = dest_moves.get(k, {}).get("group_id", None)
+                if grp and grp[0] in dest_groups and grp[0] not in result:
+                    result.append(grp[0])
+            return result
+
+        batches = {}
+        for i in mos:
+            if not i["procurement_group_id"]:
+                continue
+            grp = groups.get(i["procurement_group_id"][0], None)
+            if not grp:
+                continue
+            production_dest = [
+                k
+                for m in grp["mrp_production_ids"]
+                for k in group_mos.get(m, {}).get("move_dest_ids", [])
+            ]
+            for g in getGroups(production_dest):
+                if dest_groups[g]["sale_id"]:
+                    batches[i["id"]] = dest_groups[g]["sale_id"][1]
+                    break
+            if i["id"] in batches:
+                continue
+            origin = sources.get(i["id"], {}).get("origin", None)
+            for g in getGroups(
+                production_dest
+                + [
+                    k
+                    for m in grp["stock_move_ids"]
+                    for k in group_moves.get(m, {}).get("move_dest_ids", [])
+                ]
+            ):
+                for m in dest_groups[g]["mrp_production_ids"]:
+                    if m != i["id"] and m in sources and sources[m]["origin"] != origin:
+                        batches[i["id"]] = sources[m]["display_name"]
+                        break
+                if i["id"] in batches:
+                    break
+        return batches
+
     def export_orderpoints(self):
         """
         Defining order points for frePPLe, based on the stock.warehouse.orderpoint
@@ -2809,8 +4160,9 @@ class exporter(object):
             if not first:
                 yield "</buffers>\n"
         else:
-            for i in self.generator.getData(
+            orderpoints = self.generator.getData(
                 "stock.warehouse.orderpoint",
+                search=self.delta_search("orderpoints", []),
                 fields=[
                     "warehouse_id",
                     "product_id",
@@ -2819,7 +4171,8 @@ class exporter(object):
                     "product_uom",
                     "qty_multiple",
                 ],
-            ):
+            )
+            for i in orderpoints:
                 if first:
                     yield "<!-- order points -->\n"
                     yield "<calendars>\n"
@@ -2836,6 +4189,7 @@ class exporter(object):
                 )
                 name = "%s @ %s" % (item["name"], i["warehouse_id"][1])
                 if i["product_min_qty"]:
+                    self.track("orderpoints", i["id"], "SS for %s" % (name,))
                     yield """
                     <calendar name=%s default="0"><buckets>
                     <bucket start="%s" end="2030-12-31T00:00:00" value="%s" days="127" priority="998" starttime="PT0M" endtime="PT1440M"/>
@@ -2847,6 +4201,7 @@ class exporter(object):
                         (i["product_min_qty"] * uom_factor),
                     )
                 if i["product_max_qty"] - i["product_min_qty"] > 0:
+                    self.track("orderpoints", i["id"], "ROQ for %s" % (name,))
                     yield """
                     <calendar name=%s default="0"><buckets>
                     <bucket start="%s" end="2030-12-31T00:00:00" value="%s" days="127" priority="998" starttime="PT0M" endtime="PT1440M"/>
@@ -2857,6 +4212,21 @@ class exporter(object):
                         self.currentdate.strftime("%Y-%m-%dT%H:%M:%S"),
                         ((i["product_max_qty"] - i["product_min_qty"]) * uom_factor),
                     )
+            for i in self.export_removals(
+                "orderpoints",
+                "calendar",
+                alive_ids=(
+                    self.generator.getIds("stock.warehouse.orderpoint")
+                    if self.sync_since("orderpoints")
+                    else None
+                ),
+                changed_ids=[i["id"] for i in orderpoints],
+            ):
+                if first:
+                    yield "<!-- order points -->\n"
+                    yield "<calendars>\n"
+                    first = False
+                yield i
             if not first:
                 yield "</calendars>\n"
 
@@ -2929,7 +4299,22 @@ class exporter(object):
                 )
                 if i[5]:
                     expirationdate[(item["name"], location, lotname)] = i[5]
+        # In incremental mode we only send the lots with a different on hand
+        previous = (
+            self.sync_cursors.get("stockorders", (None, {}))[1]
+            if self.incremental
+            else {}
+        )
         for key, val in inventory.items():
+            reference = "STCK %s @ %s%s" % (
+                key[0],
+                key[1],
+                (" @ %s" % (key[2],)) if key[2] else "",
+            )
+            state = "%s %s" % (val, expirationdate.get(key, ""))
+            self.track("stockorders", reference, state)
+            if previous.get(reference) == [state]:
+                continue
             yield (
                 """
             <operationplan ordertype="STCK" end="%s" reference=%s %s quantity="%s">
@@ -2939,10 +4324,7 @@ class exporter(object):
             """
                 % (
                     self.formatDateTime(datetime.now()),
-                    quoteattr(
-                        "STCK %s @ %s%s"
-                        % (key[0], key[1], (" @ %s" % (key[2],)) if key[2] else "")
-                    ),
+                    quoteattr(reference),
                     (
                         ('expiry="%s"' % self.formatDateTime(expirationdate[key]))
                         if key in expirationdate
@@ -2953,6 +4335,11 @@ class exporter(object):
                     quoteattr(key[1]),
                 )
             )
+        for reference in previous:
+            if reference not in self.sync_keys.get("stockorders", {}):
+                yield '<operationplan reference=%s action="R"/>\n' % quoteattr(
+                    reference
+                )
         yield "</operationplans>\n"
 
     # export_stockorders will be called instead of export_onhand
@@ -3011,14 +4398,25 @@ class exporter(object):
                     + i[2]
                     - (i[3] if self.respect_reservations else 0)
                 )
+        # In incremental mode we only send the buffers with a different on hand
+        previous = (
+            self.sync_cursors.get("onhand", (None, {}))[1] if self.incremental else {}
+        )
         for key, val in inventory.items():
             buf = "%s @ %s" % (key[0], key[1])
-            yield '<buffer name=%s onhand="%f"><item name=%s/><location name=%s/></buffer>\n' % (
+            onhand = "%f" % val
+            self.track("onhand", buf, onhand)
+            if previous.get(buf) == [onhand]:
+                continue
+            yield '<buffer name=%s onhand="%s"><item name=%s/><location name=%s/></buffer>\n' % (
                 quoteattr(buf),
-                val,
+                onhand,
                 quoteattr(key[0]),
                 quoteattr(key[1]),
             )
+        for buf in previous:
+            if buf not in self.sync_keys.get("onhand", {}):
+                yield '<buffer name=%s onhand="0"/>\n' % quoteattr(buf)
         yield "</buffers>\n"
 
 
@@ -12,3 +12,8 @@ from . import mrp_secondary_workcenter
 from . import mrp_workorder_secondary_workcenter
 from . import mrp_workorder_inherit
 from . import mrp_production_inherit
+from . import sync_cursor
+from . import export_stat
+from . import export_session
+from . import export_job
+from . import product_inherit
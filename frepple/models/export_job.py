@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 by frePPLe bv
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+from datetime import datetime, timedelta
+import gzip
+import json
+import logging
+from tempfile import TemporaryFile
+import threading
+import uuid
+
+from odoo import api, fields, models
+from odoo.tools import config
+
+from odoo.addons.frepple.controllers.outbound import exporter, Odoo_generator
+
+logger = logging.getLogger(__name__)
+
+
+class ExportJob(models.Model):
+    """
+    Export of the frePPLe data running in the background.
+
+    The job is queued by the /frepple/xml?async=1 request, and executed by a
+    scheduled action. Every run of the scheduled action claims the queued
+    jobs one by one, and runs each of them in a separate transaction. The
+    progress is updated after every export section. The gzip compressed
+    result is stored as an attachment of the job.
+    Note that the scheduled action is subject to the limit_time_real_cron
+    limit of the odoo server. A job still running after that limit was
+    interrupted, and is marked as failed.
+    """
+
+    _name = "frepple.export.job"
+    _description = "Background export of the frePPLe connector"
+    _rec_name = "token"
+    _order = "id desc"
+
+    # Number of hours after which a job and its result are deleted
+    expiry = 24
+
+    # Message of a job that didn't finish within the time limit
+    interrupted = "The export job was interrupted"
+
+    token = fields.Char(
+        "Token",
+        required=True,
+        index=True,
+        copy=False,
+        default=lambda self: uuid.uuid4().hex,
+    )
+    user_id = fields.Many2one("res.users", "User", ondelete="cascade")
+    company_id = fields.Many2one("res.company", "Company", ondelete="cascade")
+    state = fields.Selection(
+        [
+            ("queued", "Queued"),
+            ("running", "Running"),
+            ("done", "Done"),
+            ("failed", "Failed"),
+        ],
+        "State",
+        default="queued",
+        required=True,
+    )
+    arguments = fields.Text("Export arguments")
+    sections = fields.Text("Sections")
+    done = fields.Text("Exported sections")
+    message = fields.Text("Message")
+    start = fields.Datetime("Start")
+    end = fields.Datetime("End")
+    attachment_id = fields.Many2one("ir.attachment", "Result", ondelete="set null")
+
+    _sql_constraints = [
+        ("token_uniq", "unique(token)", "The job token must be unique"),
+    ]
+
+    @api.model
+    def queue(self, user_id, company_id, arguments):
+        """
+        Creates a job for an export with the given arguments, and triggers
+        the scheduled action that runs it.
+        """
+        job = self.create(
+            {
+                "user_id": user_id,
+                "company_id": company_id or False,
+                "arguments": json.dumps(arguments),
+                "done": "[]",
+            }
+        )
+        self.env.ref("frepple.ir_cron_frepple_export_job")._trigger()
+        return job
+
+    @api.model
+    def find(self, user_id, token):
+        return self.search([("token", "=", token), ("user_id", "=", user_id)], limit=1)
+
+    def get_status(self):
+        self.ensure_one()
+        sections = json.loads(self.sections) if self.sections else []
+        done = json.loads(self.done) if self.done else []
+        arguments = json.loads(self.arguments) if self.arguments else {}
+        # A job that was interrupted is reported as failed before the scheduled
+        # action updates it
+        stale = (
+            self.state == "running"
+            and self.start
+            and self.start < self.get_stale_date()
+        )
+        return {
+            "job": self.token,
+            "state": "failed" if stale else self.state,
+            "sections": sections,
+            "done": done,
+            "progress": (
+                round(100.0 * len(done) / len(sections), 1) if sections else 0.0
+            ),
+            "message": self.interrupted if stale else (self.message or None),
+            "start": self.start.isoformat() if self.start else None,
+            "end": self.end.isoformat() if self.end else None,
+            "sync_token": arguments.get("sync_token", None),
+        }
+
+    def set_progress(self, **vals):
+        """
+        Updates the job in a separate transaction, such that the export
+        transaction keeps its snapshot and clients see the progress.
+        """
+        with self.pool.cursor() as cr:
+            self.with_env(self.env(cr=cr)).write(vals)
+
+    @api.model
+    def get_stale_date(self):
+        """
+        Returns the start date before which a running job was interrupted.
+        """
+        limit = config.get("limit_time_real_cron", -1)
+        if limit is None or limit < 0:
+            limit = config.get("limit_time_real", 0)
+        if limit and limit > 0:
+            return datetime.now() - timedelta(seconds=limit + 60)
+        return datetime.now() - timedelta(hours=self.expiry)
+
+    @api.model
+    def fail_stale_jobs(self):
+        self.search(
+            [("state", "=", "running"), ("start", "<", self.get_stale_date())]
+        ).write(
+            {
+                "state": "failed",
+                "end": datetime.now(),
+                "message": self.interrupted,
+            }
+        )
+
+    @api.model
+    def claim(self):
+        """
+        Claims the oldest queued job, such that concurrent runs of the
+        scheduled action don't run it as well.
+        Jobs that are running longer than the time limit of the scheduled
+        action are marked as failed first.
+        """
+        with self.pool.cursor() as cr:
+            self.with_env(self.env(cr=cr)).fail_stale_jobs()
+            cr.execute(
+                """
+                select id from frepple_export_job
+                where state = 'queued'
+                order by id
+                limit 1
+                for update skip locked
+                """
+            )
+            row = cr.fetchone()
+            if not row:
+                return self.browse()
+            self.with_env(self.env(cr=cr)).browse(row[0]).write(
+                {"state": "running", "start": datetime.now()}
+            )
+        return self.browse(row[0])
+
+    @api.model
+    def _run_jobs(self):
+        while True:
+            job = self.claim()
+            if not job:
+                break
+            # Every job runs in its own transaction, started after the claim
+            with self.pool.cursor() as cr:
+                job.with_env(job.env(cr=cr)).run()
+
+    def run(self):
+        """
+        Runs a claimed job. The job itself is only updated with set_progress,
+        never in the transaction of the export.
+        """
+        self.ensure_one()
+        try:
+            workers = int(
+                self.env["ir.config_parameter"]
+                .sudo()
+                .get_param("frepple.export_workers", 1)
+            )
+        except ValueError:
+            workers = 1
+        done = []
+        lock = threading.Lock()
+
+        def progress(section):
+            # Sections exported in parallel report from different threads
+            with lock:
+                done.append(section)
+                self.set_progress(done=json.dumps(done))
+
+        try:
+            xp = exporter(
+                Odoo_generator(self.with_user(self.user_id).env),
+                None,
+                uid=self.user_id.id,
+                database=self.env.cr.dbname,
+                workers=workers,
+                progress=progress,
+                **json.loads(self.arguments),
+            )
+            self.set_progress(sections=json.dumps(xp.get_pages()))
+            data = xp.run()
+            with TemporaryFile() as tmp:
+                with gzip.open(tmp, "wt", encoding="utf-8") as f:
+                    for x in data:
+                        f.write(x)
+                tmp.seek(0)
+                attachment = self.env["ir.attachment"].create(
+                    {
+                        "name": "frepple_%s.xml.gz" % (self.token,),
+                        "res_model": self._name,
+                        "res_id": self.id,
+                        "mimetype": "application/gzip",
+                        "raw": tmp.read(),
+                    }
+                )
+            self.env.cr.commit()
+            self.set_progress(
+                state="done", end=datetime.now(), attachment_id=attachment.id
+            )
+        except Exception as e:
+            logger.exception("Error running frePPLe export job %s" % self.token)
+            self.env.cr.rollback()
+            self.set_progress(state="failed", end=datetime.now(), message=str(e))
+
+    @api.autovacuum
+    def _gc_jobs(self):
+        self.fail_stale_jobs()
+        jobs = self.search(
+            [("create_date", "<", datetime.now() - timedelta(hours=self.expiry))]
+        )
+        jobs.mapped("attachment_id").unlink()
+        jobs.unlink()
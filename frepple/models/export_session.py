@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 by frePPLe bv
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+from datetime import datetime, timedelta
+import json
+import uuid
+
+from odoo import api, fields, models
+
+
+class ExportSession(models.Model):
+    """
+    Paged export of the frePPLe data.
+
+    The session stores the arguments and the pages of an export. Every page
+    is a complete plan document with a single export section. The sales
+    orders, purchase orders and manufacturing orders are split in pages of an
+    id range. The client downloads the pages in separate requests, and can
+    retry a page or resume the export after a failure.
+    Every page also runs the lookup sections, such as the items, so these
+    limit how small a page can be.
+    """
+
+    _name = "frepple.export.session"
+    _description = "Paged export session of the frePPLe connector"
+    _rec_name = "token"
+    _order = "id desc"
+
+    # Number of hours after which a session is deleted
+    expiry = 24
+
+    token = fields.Char(
+        "Token",
+        required=True,
+        index=True,
+        copy=False,
+        default=lambda self: uuid.uuid4().hex,
+    )
+    user_id = fields.Many2one("res.users", "User", ondelete="cascade")
+    company_id = fields.Many2one("res.company", "Company", ondelete="cascade")
+    currentdate = fields.Datetime("Current date of the plan")
+    arguments = fields.Text("Export arguments")
+    pages = fields.Text("Pages")
+    done = fields.Text("Exported pages")
+
+    _sql_constraints = [
+        ("token_uniq", "unique(token)", "The session token must be unique"),
+    ]
+
+    @api.model
+    def start(self, user_id, company_id, pages, arguments):
+        """
+        Creates a session for the pages of an export with the given arguments.
+        """
+        return self.create(
+            {
+                "user_id": user_id,
+                "company_id": company_id or False,
+                "currentdate": datetime.now(),
+                "arguments": json.dumps(arguments),
+                "pages": json.dumps(pages),
+                "done": "[]",
+            }
+        )
+
+    @api.model
+    def find(self, user_id, token):
+        return self.search([("token", "=", token), ("user_id", "=", user_id)], limit=1)
+
+    def get_arguments(self):
+        self.ensure_one()
+        return dict(json.loads(self.arguments), currentdate=self.currentdate)
+
+    def get_status(self):
+        self.ensure_one()
+        pages = json.loads(self.pages)
+        done = json.loads(self.done)
+        return {
+            "session": self.token,
+            "pages": pages,
+            "done": [pages.index(p) for p in done],
+            "remaining": [i for i, p in enumerate(pages) if p not in done],
+        }
+
+    def mark_done(self, pages):
+        """
+        Registers that the pages were sent completely.
+        """
+        for rec in self:
+            done = json.loads(rec.done)
+            done.extend(p for p in pages if p not in done)
+            rec.done = json.dumps(done)
+
+    @api.autovacuum
+    def _gc_sessions(self):
+        self.search(
+            [("create_date", "<", datetime.now() - timedelta(hours=self.expiry))]
+        ).unlink()
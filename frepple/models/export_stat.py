@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 by frePPLe bv
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+from datetime import datetime, timedelta
+
+from odoo import api, fields, models
+
+
+class ExportStat(models.Model):
+    """
+    Performance statistics of a section of the frePPLe export.
+    """
+
+    _name = "frepple.export.stat"
+    _description = "Performance statistics of the frePPLe export"
+    _rec_name = "section"
+    _order = "start desc, id"
+
+    # Number of days after which the statistics are deleted
+    expiry = 30
+
+    company_id = fields.Many2one("res.company", "Company", ondelete="cascade")
+    mode = fields.Integer("Export mode")
+    start = fields.Datetime("Export start", index=True)
+    section = fields.Char("Section", required=True)
+    duration = fields.Float("Duration (s)", digits=(16, 3))
+    queries = fields.Integer("SQL queries")
+    query_time = fields.Float("SQL time (s)", digits=(16, 3))
+    calls = fields.Integer("Data reads")
+    rows = fields.Integer("Rows read")
+    size = fields.Integer("XML size (characters)")
+
+    @api.model
+    def record(self, company_id, mode, start, stats):
+        """
+        Stores the statistics of all sections of an export.
+        """
+        return self.create(
+            [
+                {
+                    "company_id": company_id or False,
+                    "mode": mode,
+                    "start": start,
+                    "section": s["section"],
+                    "duration": s["duration"],
+                    "queries": s["queries"],
+                    "query_time": s["query_time"],
+                    "calls": s["calls"],
+                    "rows": s["rows"],
+                    "size": s["size"],
+                }
+                for s in stats
+            ]
+        )
+
+    @api.autovacuum
+    def _gc_stats(self):
+        self.search(
+            [("start", "<", datetime.now() - timedelta(days=self.expiry))]
+        ).unlink()
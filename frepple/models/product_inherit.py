@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 by frePPLe bv
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+from psycopg2 import errors
+
+from odoo import api, fields, models
+
+
+class ProductNaming(models.Model):
+    """
+    Cached check whether frePPLe can use short item names in a language.
+
+    Short names are possible when the internal reference of the products, or
+    the name when no internal reference is defined, is unique. Checking this
+    requires an aggregation over all products. The result is stored per
+    language together with the generation it was computed at.
+
+    The generation is a database sequence, which is incremented after the
+    commit of every transaction that changes products. Since a sequence isn't
+    transactional this doesn't lock any rows. A stored result is only valid
+    while the generation is unchanged. It is computed and stored in a separate
+    transaction, so a long running export never stores a result from an old
+    snapshot.
+    """
+
+    _name = "frepple.product.naming"
+    _description = "Uniqueness of the frePPLe item names"
+    _rec_name = "lang"
+
+    lang = fields.Char("Language", required=True)
+    short_names = fields.Boolean("Use short names")
+    generation = fields.Integer("Generation")
+
+    _sql_constraints = [
+        ("lang_uniq", "unique(lang)", "Only one record per language is allowed"),
+    ]
+
+    def init(self):
+        self.env.cr.execute(
+            "create sequence if not exists frepple_product_naming_generation"
+        )
+
+    @api.model
+    def get_generation(self, cr):
+        cr.execute("select last_value from frepple_product_naming_generation")
+        return cr.fetchone()[0]
+
+    @api.model
+    def check_short_names(self, cr, lang):
+        cr.execute(
+            """
+            select 1
+            from product_product
+            inner join product_template on product_product.product_tmpl_id = product_template.id
+            where product_template.type not in ('service', 'consu')
+            group by coalesce(product_product.default_code,
+            product_template.name->>%s,
+            product_template.name->>'en_US')
+            having count(*) > 1
+            limit 1
+            """,
+            (lang, lang),
+        )
+        return not cr.fetchone()
+
+    @api.model
+    def use_short_names(self, lang):
+        lang = lang or "en_US"
+        if self.env.cr.precommit.data.get("frepple.product.naming.reset", False):
+            # Products changed in this transaction
+            return self.check_short_names(self.env.cr, lang)
+
+        # A stored result is only visible when it was committed before our
+        # snapshot. It is still valid if no products changed since then.
+        self.env.cr.execute(
+            """
+            select short_names from frepple_product_naming
+            where lang = %s and generation = %s
+            """,
+            (lang, self.get_generation(self.env.cr)),
+        )
+        for i in self.env.cr.fetchall():
+            return i[0]
+
+        # Our snapshot can be older than the last product change: the result
+        # is only used by this transaction.
+        short_names = self.check_short_names(self.env.cr, lang)
+        self.store_short_names(lang)
+        return short_names
+
+    @api.model
+    def store_short_names(self, lang):
+        try:
+            with self.pool.cursor() as cr:
+                generation = self.get_generation(cr)
+                short_names = self.check_short_names(cr, lang)
+                if self.get_generation(cr) != generation:
+                    # Products were changed meanwhile
+                    return
+                cr.execute(
+                    """
+                    insert into frepple_product_naming
+                      (lang, short_names, generation,
+                       create_uid, create_date, write_uid, write_date)
+                    values (%s, %s, %s,
+                      %s, now() at time zone 'utc', %s, now() at time zone 'utc')
+                    on conflict (lang) do update
+                      set short_names = excluded.short_names,
+                      generation = excluded.generation
+                      where frepple_product_naming.generation is distinct from excluded.generation
+                    """,
+                    (lang, short_names, generation, self.env.uid, self.env.uid),
+                )
+        except errors.SerializationFailure:
+            # Stored concurrently by another transaction
+            pass
+
+    @api.model
+    def reset(self):
+        data = self.env.cr.precommit.data
+        if data.get("frepple.product.naming.reset", False):
+            return
+        # Remember the reset until the end of the transaction
+        data["frepple.product.naming.reset"] = True
+        cr = self.env.cr
+
+        @cr.postcommit.add
+        def invalidate():
+            # The changes are visible to all new snapshots now
+            cr.execute("select nextval('frepple_product_naming_generation')")
+
+
+class ProductProduct_Inherit(models.Model):
+    _inherit = "product.product"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env["frepple.product.naming"].reset()
+        return super().create(vals_list)
+
+    def write(self, vals):
+        if "default_code" in vals or "product_tmpl_id" in vals:
+            self.env["frepple.product.naming"].reset()
+        return super().write(vals)
+
+    def unlink(self):
+        self.env["frepple.product.naming"].reset()
+        return super().unlink()
+
+
+class ProductTemplate_Inherit(models.Model):
+    _inherit = "product.template"
+
+    def write(self, vals):
+        # The user interface writes the detailed_type field, and the type
+        # field is recomputed from it without calling write.
+        if "name" in vals or "type" in vals or "detailed_type" in vals:
+            self.env["frepple.product.naming"].reset()
+        return super().write(vals)
+
+    def unlink(self):
+        self.env["frepple.product.naming"].reset()
+        return super().unlink()
+
+    def update_field_translations(self, field_name, translations, digest=None):
+        if field_name == "name":
+            self.env["frepple.product.naming"].reset()
+        return super().update_field_translations(
+            field_name, translations, digest=digest
+        )
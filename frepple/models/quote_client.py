@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 by frePPLe bv
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from odoo import exceptions
+
+from ..controllers.frepplexml import encode_jwt
+
+
+class QuoteClient:
+    """
+    Client for the quoting service of the frePPLe server of the user company.
+
+    All clients of the process share a session with a pool of connections
+    to the frePPLe servers. The web token of a user is reused until shortly
+    before it expires.
+
+    The planned demands are cached, until frePPLe publishes a new plan or
+    for at most frepple.quote_cache_ttl seconds (default 600, 0 disables the
+    cache). The same demand quoted again is then answered without a request.
+    """
+
+    # Timeouts in seconds to connect and to wait for the response. The read
+    # timeout can be set with frepple.quote_timeout, and needs to stay below
+    # the limit_time_real of the odoo workers.
+    timeout = (10, 60)
+
+    # Number of seconds a web token is valid
+    token_validity = 600
+
+    # Shared session, and cache of the web tokens
+    session = None
+    session_lock = threading.Lock()
+    tokens = {}
+
+    # Cache of the planned demands: key -> (time, planned demand)
+    cache = {}
+
+    # Number of cached demands above which expired demands are removed
+    cache_size = 10000
+
+    def __init__(self, env):
+        self.login = env.user.login
+        self.webtoken_key = env.user.company_id.webtoken_key
+        if not self.webtoken_key:
+            raise exceptions.UserError("FrePPLe company web token not configured")
+
+        base_url = env.user.company_id.frepple_server
+        if not base_url:
+            raise exceptions.UserError("frePPLe web server not configured")
+        if not base_url.endswith("/"):
+            base_url += "/"
+        scenario_url = base_url[:-1].rsplit("/", 1)
+        if "scenario" in scenario_url[-1].lower():
+            self.base_url = scenario_url[0] + "/"
+            self.scenario = scenario_url[-1]
+        else:
+            self.base_url = base_url
+            self.scenario = "default"
+        self.base_url = self.base_url.replace("localhost", "host.docker.internal")
+
+        params = env["ir.config_parameter"].sudo()
+        try:
+            self.timeout = (
+                self.timeout[0],
+                int(params.get_param("frepple.quote_timeout", self.timeout[1])),
+            )
+        except ValueError:
+            pass
+
+        try:
+            self.cache_ttl = int(params.get_param("frepple.quote_cache_ttl", 600))
+        except ValueError:
+            self.cache_ttl = 0
+        # The plan version is updated by every upload of a frePPLe plan
+        self.cache_key = (
+            env.cr.dbname,
+            self.base_url,
+            self.scenario,
+            params.get_param("frepple.plan_version", ""),
+            env.user.tz,
+        )
+
+    @classmethod
+    def get_session(cls):
+        with cls.session_lock:
+            if not cls.session:
+                cls.session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10)
+                cls.session.mount("http://", adapter)
+                cls.session.mount("https://", adapter)
+            return cls.session
+
+    def get_token(self):
+        key = (self.base_url, self.login, self.webtoken_key)
+        now = round(time.time())
+        token = self.tokens.get(key, None)
+        if not token or token[1] < now + 60:
+            expiry = now + self.token_validity
+            webtoken = encode_jwt(dict(exp=expiry, user=self.login), self.webtoken_key)
+            if not isinstance(webtoken, str):
+                webtoken = webtoken.decode("ascii")
+            token = (webtoken, expiry)
+            self.tokens[key] = token
+        return token[0]
+
+    def get_url(self, action):
+        if "8000" in self.base_url:
+            # Rather ugly logic to recognize development layouts
+            return "%squote/%s/" % (self.base_url.replace("8000", "8002"), action)
+        return "%ssvc/%s/quote/%s/" % (self.base_url, self.scenario, action)
+
+    def post(self, demands, action="quote"):
+        """
+        Sends a list of demands to the quoting service in a single request,
+        and returns the response.
+        The action is either "quote" or "inquiry".
+        """
+        try:
+            return self.get_session().post(
+                self.get_url(action),
+                headers={
+                    "Authorization": "Bearer %s" % self.get_token(),
+                    "Content-Type": "application/json",
+                },
+                json={"demands": demands},
+                timeout=self.timeout,
+            )
+        except requests.Timeout:
+            raise exceptions.UserError(
+                "The frePPLe quoting module didn't respond in time"
+            )
+        except Exception:
+            raise exceptions.UserError(
+                "The connection with the frePPLe quoting module could not be established"
+            )
+
+    def quote(self, demands, action="quote"):
+        """
+        Quotes a list of demands, and returns the status code of the request
+        and the list of planned demands.
+        Demands found in the cache are not sent to frePPLe. Demands that
+        frePPLe couldn't plan are not in the result.
+        """
+        now = time.time()
+        keys = []
+        planned = {}
+        todo = []
+        for demand in demands:
+            key = self.cache_key + (action, json.dumps(demand, sort_keys=True))
+            keys.append(key)
+            cached = self.cache.get(key, None)
+            if cached and cached[0] > now - self.cache_ttl:
+                planned[key] = cached[1]
+            else:
+                todo.append((key, demand))
+
+        status_code = 200
+        if todo:
+            frepple_response = self.post([demand for key, demand in todo], action)
+            status_code = frepple_response.status_code
+            if status_code == 200:
+                try:
+                    response_json = frepple_response.json()
+                except Exception:
+                    raise exceptions.UserError("Invalid response from frePPLe")
+                response_demands = {
+                    str(d.get("name")): d for d in response_json.get("demands") or []
+                }
+                if self.cache_ttl and len(self.cache) > self.cache_size:
+                    for key, cached in list(self.cache.items()):
+                        if cached[0] <= now - self.cache_ttl:
+                            self.cache.pop(key, None)
+                for key, demand in todo:
+                    d = response_demands.get(str(demand["name"]), None)
+                    if d:
+                        planned[key] = d
+                        if self.cache_ttl:
+                            self.cache[key] = (now, d)
+        return status_code, [planned[key] for key in keys if key in planned]
@@ -49,6 +49,16 @@ class ResCompany(models.Model):
         default=True,
         help="When checked frepple respects the reservations. When unchecked frepple can reallocate material.",
     )
+    history_days = fields.Integer(
+        "History days",
+        default=0,
+        help="Number of days in the past for which closed orders, leaves and supplier records are sent to frePPLe. Zero means no limit.",
+    )
+    horizon_days = fields.Integer(
+        "Horizon days",
+        default=0,
+        help="Number of days in the future for which calendars and leaves are sent to frePPLe. Zero means no limit.",
+    )
 
     @api.model
     def getFreppleURL(self, navbar=True, _url="/"):
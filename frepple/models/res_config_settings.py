@@ -53,3 +53,5 @@ class ResConfigSettings(models.TransientModel):
         related="company_id.disclose_stack_trace",
         readonly=False,
     )
+    history_days = fields.Integer(related="company_id.history_days", readonly=False)
+    horizon_days = fields.Integer(related="company_id.horizon_days", readonly=False)
@@ -2,12 +2,10 @@ from dateutil import tz
 import os
 import logging
 from odoo import models, api, fields, exceptions
-import requests
-import time
 import datetime
 
-from ..controllers.frepplexml import encode_jwt
 from .quote import Quote
+from .quote_client import QuoteClient
 
 logger = logging.getLogger(__name__)
 
@@ -34,31 +32,11 @@ class SaleOrder(models.Model):
         # Check if we can use short names
         # To use short names, the internal reference (or the name when no internal reference is defined)
         # needs to be unique
-        use_short_names = True
-
-        self.env.cr.execute(
-            """
-            select count(*) from
-            (
-            select coalesce(product_product.default_code,
-            product_template.name->>%s,
-            product_template.name->>'en_US'), count(*)
-            from product_product
-            inner join product_template on product_product.product_tmpl_id = product_template.id
-            where product_template.type not in ('service', 'consu')
-            group by coalesce(product_product.default_code,
-            product_template.name->>%s,
-            product_template.name->>'en_US')
-            having count(*) > 1
-            ) t
-                """,
-            (self.env.user.lang, self.env.user.lang),
+        return (
+            self.env["frepple.product.naming"]
+            .sudo()
+            .use_short_names(self.env.user.lang)
         )
-        for i in self.env.cr.fetchall():
-            if i[0] > 0:
-                use_short_names = False
-                break
-        return use_short_names
 
     def getfrePPLeItemName(self, product, use_short_names):
         if product.code:
@@ -79,10 +57,11 @@ class SaleOrder(models.Model):
 
         use_short_names = self.use_product_short_names()
 
+        # -----[ BUILD THE REQUEST BODY ]-----
+        # The lines of all sales orders are sent in a single request
+        request_demands = {}
         for sale_order in self:
-
-            # -----[ BUILD THE REQUEST BODY ]-----
-            request_body = {"demands": []}
+            request_demands[sale_order.id] = []
             for line in sale_order.order_line:
                 if line.product_id.type == "product":
                     product_name = self.getfrePPLeItemName(
@@ -99,7 +78,7 @@ class SaleOrder(models.Model):
 
                     due_date = sale_order_user_tz.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
 
-                    request_body["demands"].append(
+                    request_demands[sale_order.id].append(
                         {
                             "name": "%s %s" % (sale_order.name, line.id),
                             "quantity": int(line.product_uom_qty),
@@ -130,80 +109,39 @@ class SaleOrder(models.Model):
                         }
                     )
 
-            # -----[ CREATE AUTH TOKEN ]-----
-            encode_params = dict(
-                exp=round(time.time()) + 600, user=sale_order.env.user.login
-            )
-            user_company_webtoken = sale_order.env.user.company_id.webtoken_key
-            if not user_company_webtoken:
-                raise exceptions.UserError("FrePPLe company web token not configured")
-
-            base_url = sale_order.env.user.company_id.frepple_server
-            if not base_url.endswith("/"):
-                base_url += "/"
-            if not base_url:
-                raise exceptions.UserError("frePPLe web server not configured")
-
-            webtoken = encode_jwt(encode_params, user_company_webtoken)
-            if not isinstance(webtoken, str):
-                webtoken = webtoken.decode("ascii")
+        # -----[ PERFORM THE REQUEST ]-----
+        # Choose between quote or inquiry.
+        response_status_code, planned = QuoteClient(self.env).quote(
+            [d for demands in request_demands.values() for d in demands],
+            action="quote",
+        )
+        # response_status_code, planned = QuoteClient(self.env).quote(
+        #     [d for demands in request_demands.values() for d in demands],
+        #     action="inquiry",
+        # )
 
-            # -----[ PERFORM THE REQUEST ]-----
+        if response_status_code == 401:
+            raise exceptions.UserError("User is not authorized to use FrePPLe")
+        responses = {d.get("name"): d for d in planned}
 
-            headers = {
-                "Authorization": "Bearer " + str(webtoken),
-                "Content-Type": "application/json",
+        for sale_order in self:
+            response_json = {
+                "demands": [
+                    responses[d["name"]]
+                    for d in request_demands[sale_order.id]
+                    if d["name"] in responses
+                ]
             }
-
-            # Choose between quote or inquiry.
-            action = "quote"
-            # action = "inquiry"
-
-            scenario_url = base_url[:-1].rsplit("/", 1)
-            is_scenario = "scenario" in scenario_url[-1].lower()
-
-            if is_scenario:
-                base_url = scenario_url[0] + "/"
-                scenario = scenario_url[-1]
-            else:
-                scenario = "default"
-
-            try:
-                base_url = base_url.replace("localhost", "host.docker.internal")
-                frepple_response = requests.post(
-                    (
-                        ("%ssvc/%s/quote/%s/" % (base_url, scenario, action))
-                        if "8000" not in base_url
-                        else (
-                            "%squote/%s/"
-                            % (
-                                base_url.replace("8000", "8002"),
-                                action,
-                            )
-                        )  # Rather ugly logic to recognize development layouts
-                    ),
-                    headers=headers,
-                    json=request_body,
-                )
-            except Exception:
-                raise exceptions.UserError(
-                    "The connection with the frePPLe quoting module could not be established"
-                )
-
-            response_status_code = frepple_response.status_code
-            if response_status_code == 401:
-                raise exceptions.UserError("User is not authorized to use FrePPLe")
-
-            try:
-                response_json = frepple_response.json()
-            except Exception:
-                raise exceptions.UserError("Invalid response from frePPLe")
-            if not response_json.get("demands"):
+            if not response_json["demands"]:
                 raise exceptions.UserError(
                     "FrePPLe was unable to plan the sales order line(s)"
                 )
 
-            html_response = Quote.generate_html(response_json)
+            html_response = Quote.generate_html(
+                response_json,
+                max_rows=Quote.max_pegging_rows,
+                frepple_server=self.env.user.company_id.frepple_server,
+            )
             sale_order.message_post(body=html_response, body_is_html=True)
 
             # If multiple lines, we need to get the furthest in time
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 by frePPLe bv
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import json
+
+from odoo import api, fields, models
+
+
+class SyncCursor(models.Model):
+    """
+    Persisted high-water mark of the incremental export of an entity.
+
+    The keys field stores a json dictionary with the odoo id as key and the
+    list of frePPLe object names exported for that record as value. It is
+    used to detect which objects need to be removed from frePPLe.
+
+    The state of an export is first stored as pending, with the token sent to
+    the client in the response. It only replaces the current state when the
+    client confirms it loaded the data, by passing that token in its next
+    request. Until then, the next export sends the same changes again.
+    """
+
+    _name = "frepple.sync.cursor"
+    _description = "Incremental export state of the frePPLe connector"
+    _rec_name = "entity"
+
+    company_id = fields.Many2one("res.company", "Company", ondelete="cascade")
+    mode = fields.Integer("Export mode", default=1)
+    entity = fields.Char("Entity", required=True)
+    last_write_date = fields.Datetime("Last write date")
+    keys = fields.Text("Exported keys")
+    pending_token = fields.Char("Pending token", index=True)
+    pending_write_date = fields.Datetime("Pending last write date")
+    pending_keys = fields.Text("Pending exported keys")
+
+    _sql_constraints = [
+        (
+            "company_entity_uniq",
+            "unique(company_id, mode, entity)",
+            "Only one synchronization cursor per company, mode and entity is allowed",
+        )
+    ]
+
+    @api.model
+    def get_cursors(self, company_id, mode):
+        """
+        Returns a dictionary entity -> (last write date, keys dictionary).
+        """
+        return {
+            rec.entity: (
+                rec.last_write_date,
+                json.loads(rec.keys) if rec.keys else {},
+            )
+            for rec in self.search(
+                [("company_id", "=", company_id), ("mode", "=", mode)]
+            )
+        }
+
+    @api.model
+    def set_cursor(self, company_id, mode, entity, last_write_date, keys, token):
+        """
+        Stores the state of an export, to be confirmed with the token.
+        """
+        rec = self.search(
+            [
+                ("company_id", "=", company_id),
+                ("mode", "=", mode),
+                ("entity", "=", entity),
+            ],
+            limit=1,
+        )
+        vals = {
+            "pending_token": token,
+            "pending_write_date": last_write_date,
+            "pending_keys": json.dumps(keys),
+        }
+        if rec:
+            rec.write(vals)
+        else:
+            vals.update({"company_id": company_id, "mode": mode, "entity": entity})
+            self.create(vals)
+
+    @api.model
+    def confirm(self, company_id, mode, token):
+        """
+        Makes the pending state of the export with this token the current one.
+        """
+        if not token:
+            return
+        for rec in self.search(
+            [
+                ("company_id", "=", company_id),
+                ("mode", "=", mode),
+                ("pending_token", "=", token),
+            ]
+        ):
+            rec.write(
+                {
+                    "last_write_date": rec.pending_write_date,
+                    "keys": rec.pending_keys,
+                    "pending_token": False,
+                    "pending_write_date": False,
+                    "pending_keys": False,
+                }
+            )